@@ -0,0 +1,159 @@
+"""
+Synthetic OPC UA captures for the benchmarks: the requests of a client to
+the server of the reference test bench and their responses, joined halfway
+by an attacker, with a share of the frames mirrored twice. Every block has
+the same size, so the blocks are laid out as arrays and any number of
+packets is written in a few seconds.
+"""
+
+import struct
+
+import numpy as np
+
+SERVER = (0xE45F012E1AB6, 0xC0A8A465, 4840)
+CLIENT = (0xE45F012E1BC1, 0xC0A8A466, 49374)
+ATTACKER = (0x00095BBD6406, 0xC0A8A4C8, 51514)
+READ_REQUEST, READ_RESPONSE = 631, 634
+PACKETS_PER_SECOND = 1000
+CHUNK_PACKETS = 1 << 20
+
+# The offsets of the fields in an Enhanced Packet Block: the frame is an
+# Ethernet, IPv4 and TCP header followed by a 32-byte MSG chunk
+BLOCK_SIZE = 120
+FRAME_SIZE = 86
+PAYLOAD_SIZE = 32
+FIELDS = {
+    'ts_high': (12, '<u4'),
+    'ts_low': (16, '<u4'),
+    'mac_dst': (28, '>u8'),
+    'mac_src': (34, '>u8'),
+    'ip_src': (54, '>u4'),
+    'ip_dst': (58, '>u4'),
+    'sport': (62, '>u2'),
+    'dport': (64, '>u2'),
+    'seq': (66, '>u4'),
+    'ack': (70, '>u4'),
+    'request_id': (102, '<u4'),
+    'service': (108, '<u2'),
+}
+
+
+def section_header() -> bytes:
+    """The little-endian Section Header Block and Ethernet interface, in microseconds."""
+    shb = struct.pack('<IIIHHqI', 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28)
+    idb = struct.pack('<IIHHII', 1, 20, 1, 0, 0xFFFF, 20)
+    return shb + idb
+
+
+def block_template() -> np.ndarray:
+    """The bytes shared by every Enhanced Packet Block."""
+    frame = (
+        bytes(12)
+        + struct.pack('!H', 0x0800)
+        + struct.pack(
+            '!BBHHHBBH4x4x', 0x45, 0, FRAME_SIZE - 14, 0, 0x4000, 64, 6, 0
+        )
+        + struct.pack('!4x4x4xBBHHH', 0x50, 0x18, 0xFFFF, 0, 0)
+        + b'MSGF'
+        + struct.pack('<IIIII', PAYLOAD_SIZE, 1, 1, 0, 0)
+        + bytes([1, 0])
+        + bytes(6)
+    )
+    block = (
+        struct.pack('<II', 6, BLOCK_SIZE)
+        + struct.pack('<IIIII', 0, 0, 0, FRAME_SIZE, FRAME_SIZE)
+        + frame
+        + bytes(2)
+        + struct.pack('<I', BLOCK_SIZE)
+    )
+    return np.frombuffer(block, dtype=np.uint8)
+
+
+def exchanges(first: int, count: int, exchanges_total: int, rng) -> dict:
+    """The fields of `count` request and response pairs, from the exchange `first`."""
+    exchange = np.arange(first, first + count, dtype=np.int64)
+    # The attacker sends every other request of the second half
+    attacker = (exchange >= exchanges_total // 2) & (exchange % 2 == 1)
+    # The position of each request on its connection, for its sequence numbers
+    position = np.where(
+        attacker,
+        (exchange - exchanges_total // 2) // 2,
+        exchange - np.maximum(exchange - exchanges_total // 2, 0) // 2,
+    )
+    host = {
+        name: np.where(attacker, ATTACKER[i], CLIENT[i])
+        for i, name in enumerate(('mac', 'ip', 'port'))
+    }
+    period = 2 / PACKETS_PER_SECOND
+    request_time = exchange * period
+    response_time = request_time + rng.uniform(0.1, 0.9, count) * period
+    client_seq = position * PAYLOAD_SIZE + 1
+    server_seq = position * PAYLOAD_SIZE + 1
+    request_id = position + 1
+
+    def pair(request, response):
+        return np.stack([request, response], axis=1).reshape(-1)
+
+    return {
+        'time': pair(request_time, response_time),
+        'mac_src': pair(host['mac'], np.full(count, SERVER[0])),
+        'mac_dst': pair(np.full(count, SERVER[0]), host['mac']),
+        'ip_src': pair(host['ip'], np.full(count, SERVER[1])),
+        'ip_dst': pair(np.full(count, SERVER[1]), host['ip']),
+        'sport': pair(host['port'], np.full(count, SERVER[2])),
+        'dport': pair(np.full(count, SERVER[2]), host['port']),
+        'seq': pair(client_seq, server_seq),
+        'ack': pair(server_seq, client_seq + PAYLOAD_SIZE),
+        'request_id': pair(request_id, request_id),
+        'service': pair(
+            np.full(count, READ_REQUEST), np.full(count, READ_RESPONSE)
+        ),
+    }
+
+
+def write_capture(
+    path: str, packets: int, *, redundant: float = 0.05, seed: int = 0
+) -> int:
+    """Write a synthetic capture of the reference test bench.
+
+    Args:
+        path: The PCAPNG file.
+        packets: The number of distinct packets.
+        redundant: The share of the packets mirrored twice, with the same timestamp.
+        seed: The seed of the response times and of the mirrored packets.
+
+    Returns:
+        The number of packets written, mirrors included.
+    """
+    rng = np.random.default_rng(seed)
+    template = block_template()
+    exchanges_total = packets // 2
+    written = 0
+    with open(path, 'wb') as file:
+        file.write(section_header())
+        for first in range(0, exchanges_total, CHUNK_PACKETS // 2):
+            count = min(CHUNK_PACKETS // 2, exchanges_total - first)
+            repeats = 1 + (rng.random(2 * count) < redundant)
+            fields = {
+                name: np.repeat(values, repeats)
+                for name, values in exchanges(
+                    first, count, exchanges_total, rng
+                ).items()
+            }
+            ticks = np.round(fields.pop('time') * 1e6).astype(np.uint64)
+            fields['ts_high'] = ticks >> 32
+            fields['ts_low'] = ticks & 0xFFFFFFFF
+            blocks = np.tile(template, (len(ticks), 1))
+            for name, (offset, dtype) in FIELDS.items():
+                size = np.dtype(dtype).itemsize
+                # The MAC addresses are the low 6 bytes of 8-byte integers
+                skip = 2 if name.startswith('mac') else 0
+                blocks[:, offset : offset + size - skip] = (
+                    fields[name]
+                    .astype(dtype)
+                    .view(np.uint8)
+                    .reshape(-1, size)[:, skip:]
+                )
+            file.write(blocks.tobytes())
+            written += len(blocks)
+    return written
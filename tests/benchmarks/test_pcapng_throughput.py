@@ -0,0 +1,64 @@
+import os
+import time
+
+import scapy.all as scapy
+from pytest import mark
+
+from uanalyser.preprocessing.file_handling import (
+    iter_pcapng_records,
+    map_pcapng_file,
+)
+from uanalyser.preprocessing.pcapng import iter_frames, map_file
+
+ASSETS = [
+    'tests/assets/0-dos_attack_example.pcapng',
+    'tests/assets/example.pcapng',
+]
+REPEAT = 5
+
+
+def walk_frames(file_path):
+    with map_file(file_path) as buffer:
+        return sum(1 for _ in iter_frames(buffer))
+
+
+READERS = {
+    'rdpcap': lambda file_path: len(scapy.rdpcap(file_path)),
+    'raw scapy records': lambda file_path: sum(
+        1 for _ in iter_pcapng_records(file_path)
+    ),
+    'mapped records': lambda file_path: sum(
+        1 for _ in map_pcapng_file(file_path)
+    ),
+    'mapped frames': walk_frames,
+}
+
+
+def best_time(reader, file_path):
+    """The best time of a few runs of a reader, and the packets it read."""
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        packets = reader(file_path)
+        best = min(best, time.perf_counter() - start)
+    return best, packets
+
+
+@mark.benchmark
+@mark.parametrize('file_path', ASSETS)
+def test_pcapng_throughput(file_path):
+    size = os.path.getsize(file_path) / 2**20
+    results = {
+        name: best_time(reader, file_path) for name, reader in READERS.items()
+    }
+
+    print(f'\n{file_path} ({size:.1f} MiB)')
+    for name, (seconds, packets) in results.items():
+        print(
+            f'  {name:<18} {seconds * 1e3:8.1f} ms'
+            f' {size / seconds:8.1f} MiB/s {packets / seconds:12.0f} packets/s'
+        )
+
+    assert len({packets for _, packets in results.values()}) == 1
+    assert results['mapped records'][0] < results['rdpcap'][0]
+    assert results['mapped frames'][0] < results['mapped records'][0]
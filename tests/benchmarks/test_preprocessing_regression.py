@@ -0,0 +1,270 @@
+"""
+The benchmarks of the preprocessing hot paths on synthetic captures, see
+`write_capture`, checked against the stored baseline of each stage and size.
+
+The sizes are set by `UANALYSER_BENCH_PACKETS`, a comma-separated list of
+numbers of packets (10k to 10M), and the baseline is rewritten with the
+measures of the run when `UANALYSER_BENCH_UPDATE` is 1. The times of the
+baseline are stored in units of a calibration workload timed in the same
+run, see `measure`, so they are compared on the speed of the host running
+the benchmarks and not of the one which recorded them. The stages which
+keep every packet as a scapy packet or a Python list are skipped above
+their `STAGE_LIMITS`, as they do not fit in memory on larger captures.
+"""
+
+import json
+import math
+import os
+import struct
+import tempfile
+import time
+import tracemalloc
+
+import main
+import numpy as np
+from pytest import mark
+
+from tests.benchmarks.captures import write_capture
+from uanalyser.preprocessing.decoder import int_to_mac
+from uanalyser.preprocessing.file_handling import (
+    map_pcapng_file,
+    open_pcapng_file,
+)
+from uanalyser.preprocessing.operations import (
+    COMM_TYPES,
+    RedundancyFilter,
+    calculate_round_trip_time,
+    calculate_throughput_and_packets,
+    classify_communication,
+    clear_redundant_data,
+)
+from uanalyser.preprocessing.packet_table import build_packet_table
+from uanalyser.preprocessing.profile import AnalysisProfile
+from uanalyser.preprocessing.rtt import match_round_trip_times
+
+SIZES = [
+    int(size)
+    for size in os.environ.get(
+        'UANALYSER_BENCH_PACKETS', '10000,100000'
+    ).split(',')
+]
+UPDATE = os.environ.get('UANALYSER_BENCH_UPDATE') == '1'
+BASELINE = os.environ.get(
+    'UANALYSER_BENCH_BASELINE',
+    os.path.join(os.path.dirname(__file__), 'baseline.json'),
+)
+REPEAT = 3
+# A stage regresses when it is slower or takes more memory than its
+# baseline by both the ratio and the slack, which absorbs the noise of the
+# shortest stages
+TIME_TOLERANCE = 1.5
+TIME_SLACK = 0.01
+MEMORY_TOLERANCE = 1.25
+MEMORY_SLACK = 1.0
+STAGE_LIMITS = {
+    'open_pcapng_file': 10_000,
+    'clear_redundant_data': 10_000,
+    'calculate_throughput_and_packets': 1_000_000,
+    'calculate_round_trip_time': 1_000_000,
+}
+PROFILE = AnalysisProfile(duration=None)
+
+
+def table_to_chronology(table):
+    """The packet table in the `chronology_packets` list of the reference implementations."""
+    return [
+        [index, time, int_to_mac(src), int_to_mac(dst), COMM_TYPES[code], flag]
+        for index, time, src, dst, code, flag in zip(
+            table['index'].tolist(),
+            table['time'].tolist(),
+            table['mac_src'].tolist(),
+            table['mac_dst'].tolist(),
+            table['comm_type'].tolist(),
+            table['opcua'].tolist(),
+        )
+    ]
+
+
+def main_end_to_end(file_path):
+    """Run `main` on a capture which is not in the cache yet."""
+    cache = main.CACHE
+    with tempfile.TemporaryDirectory() as cache_dir:
+        main.CACHE = cache_dir
+        try:
+            return main.main(file_path, profile=PROFILE, plots=False)
+        finally:
+            main.CACHE = cache
+
+
+def stages(file_path, packets):
+    """The stages of the preprocessing, each with its inputs prepared."""
+    servers, clients, ports = (
+        list(PROFILE.servers_ip),
+        list(PROFILE.clients_ip),
+        list(PROFILE.ports),
+    )
+
+    def within(name):
+        return packets <= STAGE_LIMITS.get(name, math.inf)
+
+    def table():
+        return build_packet_table(
+            map_pcapng_file(file_path),
+            servers,
+            clients,
+            ports,
+            max_duration=None,
+            redundancy=RedundancyFilter(),
+        )
+
+    yield 'build_packet_table', table
+    rows = table()
+    distinct = rows[~rows['redundant']]
+    yield 'classify_communication', lambda: classify_communication(
+        rows['ip_src'], rows['ip_dst'], rows['proto'], servers, clients
+    )
+    yield 'match_round_trip_times', lambda: match_round_trip_times(
+        distinct, ports
+    )
+    if within('calculate_throughput_and_packets'):
+        chronology = table_to_chronology(distinct)
+        lengths = dict(zip(rows['index'].tolist(), rows['length'].tolist()))
+        period = math.ceil(distinct['time'][-1])
+        yield 'calculate_throughput_and_packets', lambda: (
+            calculate_throughput_and_packets(lengths, chronology, period)
+        )
+    if within('calculate_round_trip_time'):
+        chronology = table_to_chronology(distinct)
+        yield 'calculate_round_trip_time', lambda: calculate_round_trip_time(
+            chronology, 'C-S'
+        )
+    if within('open_pcapng_file'):
+        yield 'open_pcapng_file', lambda: open_pcapng_file(file_path)
+    if within('clear_redundant_data'):
+        capture = open_pcapng_file(file_path)
+        yield 'clear_redundant_data', lambda: clear_redundant_data(capture)
+    yield 'main', lambda: main_end_to_end(file_path)
+
+
+def calibration_workload():
+    """Decode and count fixed records in Python, and sort them with NumPy, as the stages do."""
+    data = np.random.default_rng(0).bytes(1 << 20)
+    unpack = struct.Struct('<IHH').unpack_from
+    counts = {}
+    for offset in range(0, len(data) - 8, 8):
+        address, port, _ = unpack(data, offset)
+        counts[port] = counts.get(port, 0) + (address & 1)
+    np.sort(np.frombuffer(data, dtype=np.uint32))
+    return counts
+
+
+def timed(stage):
+    """The time of one run of a stage, in seconds."""
+    start = time.perf_counter()
+    stage()
+    return time.perf_counter() - start
+
+
+def measure(stage):
+    """The best time of a few runs of a stage, in seconds and in units of the
+    `calibration_workload` timed between them, and its peak of memory in MiB.
+
+    The calibration is timed next to each run so a burst of load on the host
+    slows both alike and leaves the units as they were.
+    """
+    best = calibration = float('inf')
+    for _ in range(REPEAT):
+        calibration = min(calibration, timed(calibration_workload))
+        best = min(best, timed(stage))
+    tracemalloc.start()
+    try:
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': best,
+        'units': best / calibration,
+        'peak_mib': peak / 2**20,
+    }
+
+
+def baseline_seconds(base, result):
+    """The time of a stage of the baseline on the host, from its calibration units."""
+    return base['units'] * result['seconds'] / result['units']
+
+
+def regressions(results, baseline):
+    """The stages slower or heavier than their baseline."""
+    failed = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        seconds = baseline_seconds(base, result)
+        if result['seconds'] > max(
+            seconds * TIME_TOLERANCE, seconds + TIME_SLACK
+        ):
+            failed.append(
+                f'{name}: {result["seconds"] * 1e3:.1f} ms'
+                f' (baseline {seconds * 1e3:.1f} ms)'
+            )
+        if result['peak_mib'] > max(
+            base['peak_mib'] * MEMORY_TOLERANCE,
+            base['peak_mib'] + MEMORY_SLACK,
+        ):
+            failed.append(
+                f'{name}: {result["peak_mib"]:.1f} MiB'
+                f' (baseline {base["peak_mib"]:.1f} MiB)'
+            )
+    return failed
+
+
+def load_baseline():
+    """The baseline stages with calibration units; absolute seconds are not portable."""
+    if not os.path.exists(BASELINE):
+        return {}
+    with open(BASELINE) as file:
+        return {
+            name: base
+            for name, base in json.load(file).items()
+            if 'units' in base
+        }
+
+
+@mark.benchmark
+@mark.parametrize('packets', SIZES)
+def test_preprocessing_against_baseline(tmp_path, packets):
+    file_path = str(tmp_path / '0-synthetic_read.pcapng')
+    written = write_capture(file_path, packets)
+    size = os.path.getsize(file_path) / 2**20
+
+    results = {
+        f'{name}[{packets}]': measure(stage)
+        for name, stage in stages(file_path, packets)
+    }
+
+    baseline = load_baseline()
+    print(f'\n{written} packets ({size:.1f} MiB)')
+    for name, result in results.items():
+        base = baseline.get(name)
+        reference = (
+            f' (baseline {baseline_seconds(base, result) * 1e3:8.1f} ms'
+            f' {base["peak_mib"]:8.1f} MiB)'
+            if base
+            else ' (no baseline)'
+        )
+        print(
+            f'  {name:<44} {result["seconds"] * 1e3:10.1f} ms'
+            f' {written / result["seconds"]:12.0f} packets/s'
+            f' {result["peak_mib"]:8.1f} MiB{reference}'
+        )
+
+    if UPDATE:
+        baseline.update(results)
+        with open(BASELINE, 'w') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write('\n')
+        return
+    failed = regressions(results, baseline)
+    assert not failed, 'Regressions:\n' + '\n'.join(failed)
@@ -0,0 +1,87 @@
+import os
+import time
+
+import matplotlib.pyplot as plt
+from plot.rendering import FIGURE_SIZE
+from pytest import mark
+
+import uanalyser.plot.graphics as graphics
+from uanalyser.plot.graphics import render_captures
+
+CAPTURES = 4
+WORKERS = min(CAPTURES, os.cpu_count() or 1)
+# The saving of the images dominates at 600 dpi, so the templates are only
+# required not to be slower than new figures beyond the noise
+TOLERANCE = 1.25
+
+
+def seconds_per_capture(render, captures):
+    start = time.perf_counter()
+    render(captures)
+    return (time.perf_counter() - start) / len(captures)
+
+
+def new_pyplot_figure(name, *, show=False):
+    """A figure as before the templates: a new pyplot figure for every chart,
+    closed by `finish_figure` once saved."""
+    return plt.subplots(figsize=FIGURE_SIZE)
+
+
+def render_with_new_figures(captures, output_dir, monkeypatch):
+    """Render as before the templates: a new figure for every chart."""
+    with monkeypatch.context() as patch:
+        patch.setattr(graphics, 'new_figure', new_pyplot_figure)
+        render_captures(
+            captures, preset='publication', workers=1, output_dir=output_dir
+        )
+
+
+@mark.benchmark
+def test_render_wall_time_per_capture(tmp_path, monkeypatch, attack_charts):
+    captures = [
+        attack_charts._replace(output_name=f'capture-{i}')
+        for i in range(CAPTURES)
+    ]
+    output_dir = str(tmp_path)
+    results = {
+        'publication, new figures': seconds_per_capture(
+            lambda captures: render_with_new_figures(
+                captures, output_dir, monkeypatch
+            ),
+            captures,
+        ),
+        'publication, templates': seconds_per_capture(
+            lambda captures: render_captures(
+                captures,
+                preset='publication',
+                workers=1,
+                output_dir=output_dir,
+            ),
+            captures,
+        ),
+        'preview, templates': seconds_per_capture(
+            lambda captures: render_captures(
+                captures, preset='preview', workers=1, output_dir=output_dir
+            ),
+            captures,
+        ),
+        f'preview, workers={WORKERS}': seconds_per_capture(
+            lambda captures: render_captures(
+                captures,
+                preset='preview',
+                workers=WORKERS,
+                output_dir=output_dir,
+            ),
+            captures,
+        ),
+    }
+
+    print(f'\n{CAPTURES} captures, 4 charts each')
+    for name, seconds in results.items():
+        print(f'  {name:<26} {seconds * 1e3:8.1f} ms per capture')
+
+    assert not plt.get_fignums()
+    assert (
+        results['publication, templates']
+        < results['publication, new figures'] * TOLERANCE
+    )
@@ -0,0 +1,52 @@
+import statistics
+import subprocess
+import sys
+import time
+
+from pytest import mark
+
+RUNS = 5
+# The startup budget of the light commands, in seconds: the interpreter, typer
+# and the modules of the command, without scapy, pandas or matplotlib
+STARTUP_BUDGET = 0.5
+COMMANDS = {
+    'attack (CLI)': [
+        sys.executable,
+        'uanalyser/cli/cli.py',
+        'attack',
+        'tests/assets/0-dos_attack_example.pcapng',
+    ],
+    'import main': [
+        sys.executable,
+        '-c',
+        'import sys; sys.path.insert(0, "uanalyser"); import main',
+    ],
+    'import scapy.all (before)': [sys.executable, '-c', 'import scapy.all'],
+    'import the plotting libraries (before)': [
+        sys.executable,
+        '-c',
+        'import pandas, matplotlib.pyplot, plotly.graph_objects',
+    ],
+}
+
+
+def startup_time(command):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+@mark.benchmark
+def test_startup_time():
+    results = {
+        name: startup_time(command) for name, command in COMMANDS.items()
+    }
+
+    print()
+    for name, seconds in results.items():
+        print(f'{name:40s} {seconds * 1000:8.1f} ms')
+    assert results['attack (CLI)'] < STARTUP_BUDGET
+    assert results['import main'] < STARTUP_BUDGET
@@ -0,0 +1,28 @@
+from pytest import fixture
+
+from uanalyser.plot.graphics import Charts
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+
+
+@fixture(scope='session')
+def attack_charts():
+    """The charts of the analysis of the attack example."""
+    analysis = analyse_capture(
+        ATTACK_EXAMPLE, '192.168.164.101', ['192.168.164.102'], [4840]
+    )
+    table = analysis.table[~analysis.table['redundant']]
+    attack = {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE'}
+    attack['Relative time'], attack['Packet index'] = analysis.attack_start
+    throughput_kbps = analysis.throughput_kbps.tolist()
+    return Charts(
+        attack,
+        '0-dos_attack_example',
+        list(range(1, len(throughput_kbps) + 1)),
+        throughput_kbps,
+        analysis.opcua_packets_per_second.astype(int).tolist(),
+        analysis.rtts['C-S'],
+        analysis.rtts['A-S'],
+        len(table),
+    )
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from pytest import fixture, mark, raises
+
+from uanalyser.plot.performance import load_performance_data
+from uanalyser.preprocessing.alignment import (
+    NETWORK_COLUMNS,
+    TELEMETRY_COLUMNS,
+    align_telemetry,
+    correlate_corpus,
+    cross_correlation,
+    lagged_correlations,
+    network_series,
+)
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+PERFORMANCE_EXAMPLE = 'tests/assets/0-dos_attack_example.csv'
+
+
+@fixture(scope='module')
+def network():
+    analysis = analyse_capture(
+        ATTACK_EXAMPLE, '192.168.164.101', ['192.168.164.102'], [4840]
+    )
+    return analysis, network_series(analysis)
+
+
+def make_telemetry(times, cpu):
+    return pd.DataFrame(
+        {
+            'Timestamp': times,
+            'CPU (%)': cpu,
+            'Memory (%)': np.full(len(times), 3.75),
+        }
+    )
+
+
+def test_network_series(network):
+    analysis, series = network
+    distinct = analysis.table[~analysis.table['redundant']]
+
+    assert list(series.columns) == ['time', *NETWORK_COLUMNS]
+    assert series['throughput_kbps'].tolist() == (
+        analysis.throughput_kbps.tolist()
+    )
+    assert series['attack_packets'].sum() == np.count_nonzero(
+        distinct['comm_type'] == 3
+    )
+    rtts = np.array(analysis.rtts['C-S'])
+    seconds = rtts[:, 1].astype(int)
+    assert np.isclose(series['rtt_cs'][30], rtts[seconds == 30, 2].mean())
+    # The RTTs of the last, partial second are after the last bucket
+    assert series['rtt_cs'].count() == len(
+        np.unique(seconds[seconds < len(series)])
+    )
+
+
+@mark.parametrize('method', ['interpolate', 'asof', 'mean'])
+def test_methods_agree_on_a_linear_telemetry(method):
+    times = np.arange(0, 10, 0.125)
+    network = pd.DataFrame({'time': np.arange(10.0)})
+
+    joined = align_telemetry(
+        network, make_telemetry(times, times * 2), method=method
+    )
+
+    # The mean over a bucket is the value at its middle, minus half a sample
+    expected = np.arange(10) * 2 + 1 - (0.125 if method == 'mean' else 0)
+    assert np.allclose(joined['CPU (%)'][:9], expected[:9])
+    assert (joined['Memory (%)'][:9] == 3.75).all()
+
+
+def test_offset_and_uncovered_buckets():
+    network = pd.DataFrame({'time': np.arange(5.0)})
+    telemetry = make_telemetry(np.arange(100, 103, 0.5), np.arange(6.0))
+
+    joined = align_telemetry(network, telemetry, offset=100, method='asof')
+
+    assert joined['CPU (%)'].tolist()[:3] == [1.0, 3.0, 5.0]
+    assert joined['CPU (%)'][3:].isna().all()
+
+
+def test_invalid_method():
+    with raises(ValueError):
+        align_telemetry(
+            pd.DataFrame({'time': [0.0]}),
+            make_telemetry([0.0], [1.0]),
+            method='ffill',
+        )
+
+
+def test_cross_correlation_matches_corrcoef():
+    generator = np.random.default_rng(3)
+    x = generator.normal(size=300)
+    y = 0.5 * np.roll(x, 4) + generator.normal(scale=0.5, size=300)
+    y[10] = np.nan
+
+    correlations = cross_correlation(x, y, 6)
+
+    assert np.nanargmax(correlations) - 6 == 4
+    valid = ~np.isnan(y)
+    assert np.isclose(correlations[6], np.corrcoef(x[valid], y[valid])[0, 1])
+    assert np.isnan(cross_correlation(x, np.ones(300), 2)).all()
+
+
+def test_telemetry_follows_the_attack(network):
+    _, series = network
+    times = np.arange(0, len(series), 0.125)
+    attack = np.repeat(series['attack_packets'].to_numpy(np.float64), 8)
+    # A CPU use following the attack traffic 2 s later
+    telemetry = make_telemetry(times, 5 + np.roll(attack, 16) / 100)
+
+    joined = align_telemetry(series, telemetry, method='mean')
+    correlations = lagged_correlations(joined, max_lag=5)
+
+    assert correlations['CPU (%)'].idxmax() == 2.0
+    assert correlations['Memory (%)'].isna().all()
+
+
+def test_correlate_corpus(network):
+    _, series = network
+    telemetry = load_performance_data(PERFORMANCE_EXAMPLE)
+
+    corpus = correlate_corpus(
+        {'a': (series, telemetry), 'b': (series, telemetry)}
+    )
+
+    assert list(corpus.index) == ['a', 'b']
+    assert list(corpus.columns) == [
+        f'{column} {value}'
+        for column in TELEMETRY_COLUMNS
+        for value in ('r', 'peak lag', 'peak r')
+    ]
+    assert corpus.loc['a'].equals(corpus.loc['b'])
+    assert abs(corpus.loc['a', 'CPU (%) peak r']) >= abs(
+        corpus.loc['a', 'CPU (%) r']
+    )
+
+
+def test_correlate_a_window_on_the_clock_of_the_telemetry(network):
+    _, series = network
+    times = np.arange(0, len(series), 0.125)
+    attack = np.repeat(series['attack_packets'].to_numpy(np.float64), 8)
+    # The telemetry starts with the capture, not with the window
+    telemetry = make_telemetry(times, 5 + np.roll(attack, 16) / 100)
+    window = network_series(
+        analyse_capture(
+            ATTACK_EXAMPLE,
+            '192.168.164.101',
+            ['192.168.164.102'],
+            [4840],
+            start=20,
+        )
+    )
+
+    corpus = correlate_corpus(
+        {'aligned': (window, telemetry, 20.0), 'shifted': (window, telemetry)},
+        max_lag=5,
+    )
+
+    assert corpus.loc['aligned', 'CPU (%) peak lag'] == 2.0
+    assert corpus.loc['shifted', 'CPU (%) peak lag'] != 2.0
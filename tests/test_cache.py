@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+from uanalyser.plot.performance import COLUMNAR_SUFFIX
+from uanalyser.preprocessing.cache import (
+    CACHE_SUFFIXES,
+    evict_tables,
+    load_table,
+    store_table,
+)
+from uanalyser.preprocessing.index import INDEX_SUFFIX
+from uanalyser.preprocessing.packet_table import PACKET_DTYPE
+
+
+def test_store_and_load_table(tmp_path):
+    table = np.zeros(10, dtype=PACKET_DTYPE)
+    table['index'] = np.arange(10)
+
+    store_table('key', table, str(tmp_path))
+    loaded = load_table('key', str(tmp_path))
+
+    assert np.array_equal(loaded, table)
+    assert not loaded.flags.writeable
+
+
+def test_load_missing_table(tmp_path):
+    assert load_table('missing', str(tmp_path)) is None
+
+
+def test_evict_least_recently_used_tables(tmp_path):
+    table = np.zeros(100, dtype=PACKET_DTYPE)
+    for age, key in enumerate(['old', 'used', 'new']):
+        store_table(key, table, str(tmp_path))
+        path = tmp_path / f'{key}.npy'
+        os.utime(path, ns=(age * 10**9, age * 10**9))
+    size = os.path.getsize(tmp_path / 'new.npy')
+
+    # Loading a table marks it as the most recently used
+    load_table('used', str(tmp_path))
+    deleted = evict_tables(str(tmp_path), 2 * size)
+
+    assert [os.path.basename(path) for path in deleted] == ['old.npy']
+    assert sorted(os.listdir(tmp_path)) == ['new.npy', 'used.npy']
+
+
+def test_evict_every_file_the_cache_owns(tmp_path):
+    table = np.zeros(100, dtype=PACKET_DTYPE)
+    store_table('table', table, str(tmp_path))
+    size = os.path.getsize(tmp_path / 'table.npy')
+    names = ['table.npy', f'capture{INDEX_SUFFIX}', f'data{COLUMNAR_SUFFIX}']
+    for age, name in enumerate(names):
+        path = tmp_path / name
+        path.write_bytes(bytes(size))
+        os.utime(path, ns=(age * 10**9, age * 10**9))
+    (tmp_path / 'corpus.sqlite').write_bytes(bytes(size))
+    (tmp_path / 'partial.tmp').write_bytes(bytes(size))
+
+    deleted = evict_tables(str(tmp_path), size)
+
+    assert COLUMNAR_SUFFIX in CACHE_SUFFIXES
+    assert [os.path.basename(path) for path in deleted] == names[:2]
+    assert sorted(os.listdir(tmp_path)) == [
+        'corpus.sqlite',
+        names[2],
+        'partial.tmp',
+    ]
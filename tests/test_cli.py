@@ -1,8 +1,282 @@
-# from typer.testing import CliRunner
+import os
+import shutil
+import subprocess
+import sys
+from types import SimpleNamespace
 
-# runner = CliRunner()
+from typer.testing import CliRunner
 
-# def test_analyse_package_cli_must_return_0_in_stdout():
-#     result = runner.invoke(analyse_package)
-#     assert result.exit_code == 0
-#     assert result.stdout == "['normal_traffic']\n"
+from uanalyser.cli import cli
+from uanalyser.cli.cli import app
+
+runner = CliRunner()
+CLI = 'uanalyser/cli/cli.py'
+HEAVY_MODULES = ('scapy.layers.inet', 'pandas', 'matplotlib', 'plotly')
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+
+
+def test_attack_prints_the_attack_of_each_file():
+    result = runner.invoke(
+        app,
+        ['attack', 'path/0-normal_traffic.pcapng', 'path/2-MITM_arp.pcapng'],
+    )
+
+    assert result.exit_code == 0
+    assert result.stdout.splitlines() == [
+        'path/0-normal_traffic.pcapng\tNone\tNORMAL TRAFFIC',
+        'path/2-MITM_arp.pcapng\tSign & Encrypt\tMITM ARP',
+    ]
+
+
+def test_attack_of_an_invalid_name_fails():
+    result = runner.invoke(app, ['attack', 'path/example.pcapng'])
+
+    assert result.exit_code == 1
+    assert 'Error: Invalid file name format.' in result.output
+
+
+def test_attack_does_not_import_the_heavy_dependencies():
+    code = (
+        'import runpy, sys\n'
+        f'sys.argv = ["cli", "attack", "path/0-normal_traffic.pcapng"]\n'
+        'try:\n'
+        f'    runpy.run_path("{CLI}", run_name="__main__")\n'
+        'except SystemExit:\n'
+        '    pass\n'
+        f'print([name for name in {HEAVY_MODULES} if name in sys.modules])'
+    )
+
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == '[]'
+
+
+def test_importing_main_does_not_import_the_heavy_dependencies():
+    code = (
+        'import sys\n'
+        'sys.path.insert(0, "uanalyser")\n'
+        'import main\n'
+        f'print([name for name in {HEAVY_MODULES} if name in sys.modules])'
+    )
+
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '[]'
+
+
+def copy_capture(directory):
+    """A copy of the attack example, which is not in the cache yet."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, os.path.basename(ATTACK_EXAMPLE))
+    shutil.copy(ATTACK_EXAMPLE, path)
+    return path
+
+
+def test_analyse_without_plots(tmp_path):
+    pcapng_file = copy_capture(tmp_path / 'captures')
+
+    result = runner.invoke(
+        app,
+        [
+            'analyse',
+            pcapng_file,
+            '--no-plots',
+            '--start',
+            '10',
+            '--end',
+            '40',
+            '--output-dir',
+            str(tmp_path / 'output'),
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines() == [
+        f'{pcapng_file}\t1777 packets\t30.0 s\t0-dos_attack_example'
+    ]
+    assert not os.listdir(tmp_path / 'output')
+
+
+def test_plot_renders_again_from_the_cache(tmp_path):
+    pcapng_file = copy_capture(tmp_path / 'captures')
+    options = ['--duration', '20', '--output-dir', str(tmp_path / 'output')]
+
+    result = runner.invoke(app, ['plot', pcapng_file, *options])
+    assert result.exit_code == 1
+    assert 'is not in the cache' in result.output
+
+    result = runner.invoke(
+        app, ['analyse', pcapng_file, '--no-plots', *options]
+    )
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(
+        app,
+        ['plot', pcapng_file, '--preset', 'preview', '--format', 'html']
+        + options,
+    )
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines() == [
+        f'{tmp_path}/output/0-dos_attack_example.html'
+    ]
+
+
+def test_invalid_options(tmp_path):
+    result = runner.invoke(
+        app, ['analyse', ATTACK_EXAMPLE, '--end', '10', '--duration', '5']
+    )
+    assert result.exit_code == 2
+    assert 'Give either --end or --duration.' in result.output
+
+    result = runner.invoke(
+        app, ['analyse', ATTACK_EXAMPLE, '--format', 'svg', '--no-plots']
+    )
+    assert result.exit_code == 1
+    assert "Invalid chart backend: 'svg'" in result.output
+
+
+def test_batch_reports_each_file(tmp_path):
+    copy_capture(tmp_path / 'captures')
+    shutil.copy(ATTACK_EXAMPLE, tmp_path / 'captures' / '3-unknown.pcapng')
+
+    result = runner.invoke(
+        app,
+        [
+            'batch',
+            str(tmp_path / 'captures'),
+            '--workers',
+            '1',
+            '--no-plots',
+            '--duration',
+            '20',
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert '0-dos_attack_example\n' in result.stdout
+    assert '3-unknown.pcapng\tfailed: Invalid attack type.' in result.output
+
+
+def test_bench_runs_the_benchmarks(monkeypatch):
+    commands = []
+
+    def run(command, cwd, env):
+        commands.append((command, cwd, env))
+        return SimpleNamespace(returncode=0)
+
+    monkeypatch.setattr(cli.subprocess, 'run', run)
+    monkeypatch.delenv('UANALYSER_BENCH_UPDATE', raising=False)
+
+    result = runner.invoke(app, ['bench', 'startup', 'pcapng'])
+
+    assert result.exit_code == 0
+    ((command, cwd, env),) = commands
+    assert 'UANALYSER_BENCH_UPDATE' not in env
+    assert command[1:] == [
+        '-m',
+        'pytest',
+        '-m',
+        'benchmark',
+        '-s',
+        '-k',
+        'startup or pcapng',
+        os.path.join(cwd, 'tests', 'benchmarks'),
+    ]
+
+    result = runner.invoke(
+        app,
+        [
+            'bench',
+            'preprocessing',
+            '--packets',
+            '1000000',
+            '--update-baseline',
+        ],
+    )
+
+    assert result.exit_code == 0
+    _, _, env = commands[-1]
+    assert env['UANALYSER_BENCH_PACKETS'] == '1000000'
+    assert env['UANALYSER_BENCH_UPDATE'] == '1'
+
+
+def test_analyse_exports_the_results(tmp_path):
+    pcapng_file = copy_capture(tmp_path / 'captures')
+    export_dir = tmp_path / 'metrics'
+
+    result = runner.invoke(
+        app,
+        [
+            'analyse',
+            pcapng_file,
+            '--no-plots',
+            '--export-dir',
+            str(export_dir),
+            '--export-format',
+            'csv',
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines()[1:] == [
+        f'{export_dir}/{table}/0-dos_attack_example.csv'
+        for table in ('per_second', 'rtts', 'summary', 'services', 'floods')
+    ]
+
+    result = runner.invoke(
+        app,
+        [
+            'analyse',
+            pcapng_file,
+            '--export-dir',
+            'x',
+            '--export-format',
+            'xml',
+        ],
+    )
+    assert result.exit_code == 1
+    assert "Invalid export format: 'xml'" in result.output
+
+
+def test_batch_skips_the_unchanged_files_of_the_corpus(tmp_path):
+    copy_capture(tmp_path / 'captures')
+    corpus_file = str(tmp_path / 'corpus.sqlite')
+    options = [
+        'batch',
+        str(tmp_path / 'captures'),
+        '--workers',
+        '1',
+        '--no-plots',
+        '--duration',
+        '20',
+        '--corpus',
+        corpus_file,
+    ]
+
+    result = runner.invoke(app, options)
+    assert result.exit_code == 0, result.output
+    assert '0-dos_attack_example\n' in result.stdout
+
+    result = runner.invoke(app, options)
+    assert result.exit_code == 0, result.output
+    assert '0-dos_attack_example.pcapng: unchanged' in result.stdout
+
+    result = runner.invoke(app, ['corpus', corpus_file, '--by', 'attack'])
+    assert result.exit_code == 0, result.output
+    header, row = result.stdout.splitlines()
+    assert header.split('\t')[:3] == [
+        'attack_name',
+        'captures',
+        'throughput_peak_kbps',
+    ]
+    assert row.startswith('DOS ATTACK EXAMPLE\t1\t')
+
+    result = runner.invoke(app, ['corpus', corpus_file, '--by', 'flow'])
+    assert result.exit_code == 2
+    assert "Invalid comparison: 'flow'" in result.output
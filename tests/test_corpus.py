@@ -0,0 +1,169 @@
+import math
+import os
+
+from pytest import fixture, raises
+
+from uanalyser.preprocessing.corpus import (
+    CorpusIndex,
+    file_identity,
+    profile_key,
+)
+from uanalyser.preprocessing.export import SUMMARY_SCHEMA, CaptureResult
+from uanalyser.preprocessing.profile import AnalysisProfile
+
+PROFILE = AnalysisProfile()
+
+
+def capture(directory, name, attack_type, attack_name, **summary):
+    """The results of a capture file, with a summary made up of the given values."""
+    path = os.path.join(directory, f'{name}.pcapng')
+    with open(path, 'wb') as file:
+        file.write(name.encode())
+    values = dict.fromkeys(SUMMARY_SCHEMA, 0)
+    values.update(
+        capture=name,
+        file=path,
+        attack_type=attack_type,
+        attack_name=attack_name,
+        attack_start_index=None,
+        attack_start_time=math.nan,
+        **summary,
+    )
+    return CaptureResult(values, None, None)
+
+
+@fixture
+def corpus(tmp_path):
+    results = [
+        capture(
+            tmp_path,
+            '0-dos',
+            'None',
+            'DOS',
+            rtt_cs_count=1,
+            rtt_cs_mean=2.0,
+            rtt_cs_max=2.0,
+            throughput_peak_kbps=10.0,
+            throughput_mean_kbps=5.0,
+        ),
+        capture(
+            tmp_path,
+            '1-dos',
+            'Sign',
+            'DOS',
+            rtt_cs_count=1,
+            rtt_cs_mean=4.0,
+            rtt_cs_max=4.0,
+            throughput_peak_kbps=30.0,
+            throughput_mean_kbps=7.0,
+        ),
+        capture(
+            tmp_path,
+            '2-dos',
+            'Sign',
+            'FLOOD',
+            rtt_cs_count=3,
+            rtt_cs_mean=8.0,
+            rtt_cs_max=9.0,
+            throughput_peak_kbps=20.0,
+            throughput_mean_kbps=9.0,
+        ),
+    ]
+    with CorpusIndex(str(tmp_path / 'index' / 'corpus.sqlite')) as index:
+        for result in results:
+            index.update(result, PROFILE)
+        yield index, results
+
+
+def test_the_summaries_are_kept(corpus):
+    index, results = corpus
+
+    summaries = index.summaries()
+
+    assert summaries.dtypes.astype(str).to_dict() == SUMMARY_SCHEMA
+    assert summaries['capture'].tolist() == ['0-dos', '1-dos', '2-dos']
+    assert summaries['attack_start_index'].isna().all()
+    assert summaries['attack_start_time'].isna().all()
+
+
+def test_rtt_by_security_mode(corpus):
+    index, _ = corpus
+
+    rtts = index.rtt_by_security_mode()
+
+    assert rtts.index.tolist() == ['None', 'Sign']
+    assert rtts['captures'].tolist() == [1, 2]
+    # Weighted by the number of RTTs of each capture
+    assert rtts['rtt_cs_mean'].tolist() == [2.0, 7.0]
+    assert rtts['rtt_cs_max'].tolist() == [2.0, 9.0]
+
+
+def test_throughput_by_attack(corpus):
+    index, _ = corpus
+
+    throughput = index.throughput_by_attack()
+
+    assert throughput.index.tolist() == ['DOS', 'FLOOD']
+    assert throughput['captures'].tolist() == [2, 1]
+    assert throughput['throughput_peak_kbps'].tolist() == [30.0, 20.0]
+    assert throughput['peak_attack_type'].tolist() == ['Sign', 'Sign']
+    assert throughput['throughput_mean_kbps'].tolist() == [6.0, 9.0]
+
+
+def test_only_the_changed_files_are_stale(corpus):
+    index, results = corpus
+    files = [result.summary['file'] for result in results]
+
+    assert index.stale_files(files, PROFILE) == []
+
+    with open(files[1], 'ab') as file:
+        file.write(b'more packets')
+    assert index.stale_files(files, PROFILE) == [files[1]]
+    assert index.stale_files(files, PROFILE._replace(bucket=0.5)) == files
+
+    index.update(results[1], PROFILE)
+    assert index.stale_files(files, PROFILE) == []
+
+
+def test_an_update_replaces_the_summary(corpus):
+    index, results = corpus
+    result = results[0]
+    result.summary['rtt_cs_mean'] = 3.0
+
+    index.update(result, PROFILE)
+
+    summaries = index.summaries()
+    assert len(summaries) == 3
+    assert summaries['rtt_cs_mean'][0] == 3.0
+
+
+def test_the_missing_files_are_removed(corpus):
+    index, results = corpus
+    os.remove(results[2].summary['file'])
+
+    assert index.remove_missing() == [
+        os.path.abspath(results[2].summary['file'])
+    ]
+    assert index.summaries()['capture'].tolist() == ['0-dos', '1-dos']
+
+
+def test_the_index_outlives_its_connection(tmp_path, corpus):
+    index, _ = corpus
+    path = str(tmp_path / 'index' / 'corpus.sqlite')
+
+    with CorpusIndex(path) as reopened:
+        assert reopened.summaries().equals(index.summaries())
+
+
+def test_file_identity(tmp_path):
+    path = tmp_path / 'capture.pcapng'
+    path.write_bytes(b'1234')
+
+    assert file_identity(str(path)) == (4, os.stat(path).st_mtime_ns)
+    with raises(FileNotFoundError, match='No such file or directory'):
+        file_identity(str(tmp_path / 'missing.pcapng'))
+
+
+def test_profile_key_changes_with_the_profile():
+    assert profile_key(PROFILE) == profile_key(AnalysisProfile())
+    assert profile_key(PROFILE) != profile_key(PROFILE._replace(ports=[4841]))
@@ -0,0 +1,102 @@
+import base64
+import re
+
+import numpy as np
+from pytest import raises
+
+from uanalyser.plot.dashboard import dashboard_figure, encode_array
+from uanalyser.plot.graphics import Charts, render_charts
+from uanalyser.plot.performance import load_performance_data
+
+
+def decode_array(spec):
+    return np.frombuffer(base64.b64decode(spec['bdata']), spec['dtype'])
+
+
+def test_encode_array_round_trips_and_narrows_the_integers():
+    values = np.random.default_rng(0).normal(size=1000)
+    assert np.array_equal(decode_array(encode_array(values)), values)
+
+    spec = encode_array(np.arange(5, dtype=np.int64))
+    assert spec['dtype'] == 'i4'
+    assert decode_array(spec).tolist() == [0, 1, 2, 3, 4]
+    assert encode_array(np.array([2**40]))['dtype'] == 'f8'
+    assert encode_array(np.array([1.5], dtype='>f4'))['dtype'] == 'f4'
+    assert decode_array(encode_array(np.array([1.5], dtype='>f4')))[0] == 1.5
+
+
+def test_the_report_is_self_contained_with_webgl_traces(
+    attack_charts, tmp_path
+):
+    charts = attack_charts._replace(
+        performance_data=load_performance_data(
+            'tests/assets/0-dos_attack_example.csv'
+        )
+    )
+
+    (path,) = render_charts(charts, output_dir=tmp_path, backend='html')
+
+    assert path == f'{tmp_path}/0-dos_attack_example.html'
+    html = open(path).read()
+    assert '<script src=' not in html
+    assert 'scattergl' in html
+    assert '"bdata"' in html
+    # The performance chart and its two traces are in the report
+    figure = dashboard_figure(charts)
+    assert [trace['type'] for trace in figure['data']].count('scattergl') == 7
+    assert figure['data'][-1]['y']['dtype'] == 'f4'
+
+
+def test_the_series_of_the_report_are_the_analysis(attack_charts):
+    figure = dashboard_figure(attack_charts)
+    traces = {
+        (trace['name'], trace['yaxis']): trace for trace in figure['data']
+    }
+
+    throughput = traces['Throughput (KBps)', 'y']
+    assert np.allclose(
+        decode_array(throughput['y']), attack_charts.throughput_kbps
+    )
+    packets = traces['RTT Cliente-Servidor', 'y3']
+    rtts = np.asarray(attack_charts.rtts_client_server)
+    assert (
+        decode_array(packets['x']).tolist() == rtts[:, 0].astype(int).tolist()
+    )
+    assert np.allclose(decode_array(packets['y']), rtts[:, 2], rtol=1e-6)
+    per_second = traces['RTT Cliente-Servidor', 'y4']
+    seconds = decode_array(per_second['x'])
+    first = rtts[rtts[:, 1].astype(int) == seconds[0], 2]
+    assert np.isclose(decode_array(per_second['y'])[0], first.mean())
+
+
+def test_a_million_rtts_are_embedded_as_binary(tmp_path):
+    size = 1_000_000
+    generator = np.random.default_rng(0)
+    rtts = np.column_stack(
+        [
+            np.arange(size),
+            np.arange(size) / 10000,
+            generator.gamma(2, 1.0, size),
+        ]
+    ).tolist()
+    attack = {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE'}
+    charts = Charts(attack, 'huge', [1, 2], [1.0, 2.0], [1, 2], rtts, [], size)
+
+    (path,) = render_charts(charts, output_dir=tmp_path, backend='html')
+
+    html = open(path).read()
+    # 4 bytes per index and per RTT, base64 encoded, plus plotly.js, and
+    # no lists of numbers
+    assert len(html) < 8 * size * 4 / 3 + 10_000_000
+    assert not re.search(r'(\d+\.\d+,){1000}', html)
+
+
+def test_the_budget_of_points_applies_to_the_report(attack_charts):
+    figure = dashboard_figure(attack_charts, max_points=100)
+    packets = [trace for trace in figure['data'] if trace['yaxis'] == 'y3']
+    assert all(len(decode_array(trace['x'])) <= 100 for trace in packets)
+
+
+def test_invalid_backend(attack_charts, tmp_path):
+    with raises(ValueError, match="Invalid chart backend: 'svg'"):
+        render_charts(attack_charts, output_dir=tmp_path, backend='svg')
@@ -0,0 +1,126 @@
+import numpy as np
+from pytest import mark, raises
+
+from uanalyser.plot.decimation import decimate, lttb_indices, minmax_indices
+from uanalyser.plot.graphics import (
+    plot_round_trip_time_per_packet,
+    plot_round_trip_time_per_second,
+)
+
+ATTACK = {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE'}
+
+
+def make_rtts(size, seed=0):
+    """Noisy RTTs with a few spikes, as [index, relative time, rtt]."""
+    generator = np.random.default_rng(seed)
+    rtts = generator.gamma(2, 0.001, size)
+    rtts[generator.choice(size, 5, replace=False)] = 0.5
+    indexes = np.sort(generator.choice(size * 4, size, replace=False))
+    return [
+        [int(index), index / 1000, float(rtt)]
+        for index, rtt in zip(indexes, rtts)
+    ]
+
+
+def test_minmax_keeps_the_extremes_of_each_column():
+    x = np.random.default_rng(1).uniform(0, 1000, 100000)
+    y = np.sin(x) + np.random.default_rng(2).normal(0, 0.1, len(x))
+
+    kept = minmax_indices(x, y, 200)
+
+    assert len(kept) <= 200
+    assert np.all(np.diff(x[kept]) >= 0)
+    assert {y.argmin(), y.argmax()} <= set(kept.tolist())
+    columns = np.minimum((x - x.min()) / np.ptp(x) * 100, 99).astype(int)
+    for column in (0, 37, 99):
+        inside = np.flatnonzero(columns == column)
+        assert inside[y[inside].argmax()] in kept
+        assert inside[y[inside].argmin()] in kept
+
+
+def test_lttb_keeps_the_budget_and_the_ends():
+    x = np.arange(10000)
+    y = np.where(x == 5000, 10.0, np.sin(x / 100))
+
+    kept = lttb_indices(x, y, 300)
+
+    assert len(kept) == 300
+    assert kept[0] == 0 and kept[-1] == 9999
+    assert np.all(np.diff(kept) > 0)
+    assert 5000 in kept
+
+
+@mark.parametrize('method', ['minmax', 'lttb'])
+def test_decimate_sorts_by_x(method):
+    rtts = make_rtts(5000)[::-1]
+
+    decimated = decimate(rtts, 100, method)
+
+    assert len(decimated) <= 100
+    assert [rtt[0] for rtt in decimated] == sorted(rtt[0] for rtt in decimated)
+    assert all(rtt in rtts for rtt in decimated)
+
+
+def test_short_series_are_kept():
+    rtts = make_rtts(50)
+
+    assert decimate(rtts, 100) is rtts
+    assert decimate(rtts, None, 'lttb') is rtts
+
+
+@mark.parametrize(
+    'max_points, method', [(1, 'minmax'), (2, 'lttb'), (10, 'median')]
+)
+def test_invalid_decimation(max_points, method):
+    with raises(ValueError):
+        decimate(make_rtts(100), max_points, method)
+
+
+def read_image(path):
+    with open(path, 'rb') as fdesc:
+        return fdesc.read()
+
+
+def test_rtt_per_packet_plot_decimates_to_the_budget(tmp_path):
+    rtts = make_rtts(200000)
+    attacker_rtts = make_rtts(50000, seed=1)
+    options = {'preset': 'preview', 'output_dir': str(tmp_path)}
+
+    budget = plot_round_trip_time_per_packet(
+        rtts,
+        800000,
+        ATTACK,
+        'budget',
+        attacker_rtts=attacker_rtts,
+        max_points=500,
+        **options,
+    )
+    reference = plot_round_trip_time_per_packet(
+        decimate(rtts, 500),
+        800000,
+        ATTACK,
+        'reference',
+        attacker_rtts=decimate(attacker_rtts, 500),
+        **options,
+    )
+
+    assert read_image(budget) == read_image(reference)
+
+
+def test_rtt_per_second_plot_decimates_the_means(tmp_path):
+    rtts = make_rtts(200000)
+    seconds = list(range(1, 801))
+    options = {'preset': 'preview', 'output_dir': str(tmp_path)}
+
+    full = plot_round_trip_time_per_second(
+        rtts, seconds, ATTACK, 'full', **options
+    )
+    budget = plot_round_trip_time_per_second(
+        rtts, seconds, ATTACK, 'budget', max_points=100, **options
+    )
+    same_budget = plot_round_trip_time_per_second(
+        rtts, seconds, ATTACK, 'same', max_points=1000, **options
+    )
+
+    assert read_image(budget) != read_image(full)
+    assert read_image(same_budget) == read_image(full)
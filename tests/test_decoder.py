@@ -0,0 +1,120 @@
+import numpy as np
+from pytest import fixture, mark
+from scapy.all import IP, TCP, Ether, rdpcap
+
+from uanalyser.preprocessing.file_handling import iter_pcapng_records
+from uanalyser.preprocessing.operations import (
+    COMM_TYPES,
+    classify_communication,
+    define_communication_type,
+    detect_opcua_attack,
+    ip_array,
+    is_opcua_packet,
+)
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+SERVER_IP = '192.168.164.101'
+OPCUA_PORTS = [4840, 4841, 49320, 62541, 4897, 53530, 48050, 4885, 4855, 26543]
+
+
+@fixture(scope='module')
+def packets_and_records():
+    packets = rdpcap(ATTACK_EXAMPLE)
+    records = list(iter_pcapng_records(ATTACK_EXAMPLE))
+    return packets, records
+
+
+def test_records_match_packets_count(packets_and_records):
+    packets, records = packets_and_records
+
+    assert len(records) == len(packets)
+
+
+def test_records_match_packets_time_and_length(packets_and_records):
+    packets, records = packets_and_records
+
+    for packet, record in zip(packets, records):
+        assert record.time == float(packet.time)
+        assert record.length == len(packet)
+
+
+@mark.parametrize('clients_ip', [['192.168.164.102'], ['192.168.164.192'], []])
+def test_define_communication_type_parity(packets_and_records, clients_ip):
+    packets, records = packets_and_records
+
+    for packet, record in zip(packets, records):
+        assert define_communication_type(
+            record, SERVER_IP, clients_ip
+        ) == define_communication_type(packet, SERVER_IP, clients_ip)
+
+
+@mark.parametrize('clients_ip', [['192.168.164.102'], ['192.168.164.192'], []])
+def test_detect_opcua_attack_parity(packets_and_records, clients_ip):
+    packets, records = packets_and_records
+
+    for packet, record in zip(packets, records):
+        assert detect_opcua_attack(
+            record, SERVER_IP, clients_ip
+        ) == detect_opcua_attack(packet, SERVER_IP, clients_ip)
+
+
+def test_is_opcua_packet_parity(packets_and_records):
+    packets, records = packets_and_records
+
+    for packet, record in zip(packets, records):
+        if record.is_ipv4 and record.proto not in (6, 17):
+            # scapy has no ports to compare for other IP protocols
+            continue
+        assert is_opcua_packet(record, OPCUA_PORTS) == is_opcua_packet(
+            packet, OPCUA_PORTS
+        )
+
+
+def record_columns(records):
+    return (
+        np.array([record.ip_src for record in records], dtype=np.uint32),
+        np.array([record.ip_dst for record in records], dtype=np.uint32),
+        np.array([record.proto for record in records], dtype=np.uint8),
+    )
+
+
+@mark.parametrize('clients_ip', [['192.168.164.102'], ['192.168.164.192'], []])
+def test_batch_classifiers_parity(packets_and_records, clients_ip):
+    packets, records = packets_and_records
+    columns = record_columns(records)
+
+    codes = classify_communication(*columns, SERVER_IP, clients_ip)
+    attacks = codes == COMM_TYPES.index('Attacker to Server')
+
+    assert [COMM_TYPES[code] for code in codes] == [
+        define_communication_type(packet, SERVER_IP, clients_ip)
+        for packet in packets
+    ]
+    assert attacks.tolist() == [
+        detect_opcua_attack(packet, SERVER_IP, clients_ip)
+        for packet in packets
+    ]
+
+
+def test_batch_classifiers_many_servers():
+    servers = ['10.0.0.1', '10.0.0.2']
+    clients = ['10.0.1.1', '10.0.1.2', '10.0.1.3']
+    ip_src = ip_array(['10.0.1.3', '10.0.0.2', '10.0.9.9', '10.0.0.1'])
+    ip_dst = ip_array(['10.0.0.2', '10.0.1.1', '10.0.0.1', '10.0.9.9'])
+
+    codes = classify_communication(
+        ip_src, ip_dst, [6, 6, 6, 6], servers, clients
+    )
+
+    assert [COMM_TYPES[code] for code in codes] == [
+        'Client to Server',
+        'Server to Client',
+        'Attacker to Server',
+        'Server to Attacker',
+    ]
+
+
+def test_server_address_is_not_a_substring_match():
+    packet = Ether() / IP(src='10.0.0.1', dst='10.0.0.9') / TCP()
+
+    assert define_communication_type(packet, '10.0.0.10', []) == 'Unknown'
@@ -0,0 +1,197 @@
+import os
+
+import numpy as np
+import pandas as pd
+from pytest import fixture, importorskip, mark, raises
+
+from uanalyser.preprocessing.export import (
+    EXPORT_FORMATS,
+    EXPORT_TABLES,
+    FLOOD_SCHEMA,
+    PER_SECOND_SCHEMA,
+    RTT_SCHEMA,
+    SERVICE_SCHEMA,
+    SUMMARY_SCHEMA,
+    capture_result,
+    export_result,
+    read_exports,
+)
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+ATTACK = {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE'}
+
+
+def needs_writer(format):
+    if format == 'parquet':
+        importorskip('pyarrow')
+
+
+@fixture(scope='module')
+def analysis():
+    return analyse_capture(
+        ATTACK_EXAMPLE, '192.168.164.101', ['192.168.164.102'], [4840]
+    )
+
+
+@fixture(scope='module')
+def result(analysis):
+    return capture_result(
+        analysis, ATTACK, file=ATTACK_EXAMPLE, capture='0-dos_attack_example'
+    )
+
+
+def test_the_tables_have_the_schema(result):
+    assert result.per_second.dtypes.astype(str).to_dict() == PER_SECOND_SCHEMA
+    assert result.rtts.dtypes.astype(str).to_dict() == RTT_SCHEMA
+    assert list(result.summary) == list(SUMMARY_SCHEMA)
+    assert result.services.dtypes.astype(str).to_dict() == SERVICE_SCHEMA
+    assert result.floods.dtypes.astype(str).to_dict() == FLOOD_SCHEMA
+
+
+def test_the_tables_are_the_analysis(analysis, result):
+    assert np.allclose(
+        result.per_second['throughput_kbps'], analysis.throughput_kbps
+    )
+    for flow in ('C-S', 'A-S'):
+        rtts = result.rtts[result.rtts['flow'] == flow]
+        assert rtts[['packet_index', 'time', 'rtt_ms']].values.tolist() == [
+            list(map(float, rtt)) for rtt in analysis.rtts[flow]
+        ]
+
+    summary = result.summary
+    assert (
+        summary['attack_start_time'],
+        summary['attack_start_index'],
+    ) == analysis.attack_start
+    assert summary['throughput_peak_kbps'] == analysis.throughput_kbps.max()
+    assert summary['rtt_as_count'] == len(analysis.rtts['A-S'])
+    assert summary['rtt_cs_mean'] == np.mean(
+        [rtt for _, _, rtt in analysis.rtts['C-S']]
+    )
+
+    services = result.services.set_index('service')
+    assert services['packets'].sum() == summary['packets'] - np.count_nonzero(
+        analysis.table['service'][~analysis.table['redundant']] <= 0
+    )
+    for service, rtts in analysis.service_rtts.items():
+        assert services.loc[service, 'rtt_count'] == len(rtts)
+        assert services.loc[service, 'rtt_max_ms'] == max(
+            rtt for _, _, rtt in rtts
+        )
+
+
+def test_the_sources_flooding_the_server_are_exported(analysis):
+    table = analysis.table.copy()
+    # Turn the requests of the client in one second into channel openings
+    to_server = ~table['redundant'] & (table['dport'] == 4840)
+    second = np.floor(table['time'][to_server][0])
+    requests = np.flatnonzero(to_server & (np.floor(table['time']) == second))
+    table['service'][requests] = 446
+
+    result = capture_result(
+        analysis._replace(table=table),
+        ATTACK,
+        file='flood.pcapng',
+        capture='flood',
+    )
+
+    assert result.floods.values.tolist() == [
+        ['flood', second, '192.168.164.102', len(requests)]
+    ]
+    assert 'OpenSecureChannelRequest' in result.services['service'].tolist()
+
+
+def test_a_capture_without_attack(analysis):
+    quiet = analysis._replace(
+        attack_start=None, rtts={'C-S': analysis.rtts['C-S'], 'A-S': []}
+    )
+
+    result = capture_result(
+        quiet, ATTACK, file='quiet.pcapng', capture='quiet'
+    )
+
+    assert np.isnan(result.summary['attack_start_time'])
+    assert result.summary['attack_start_index'] is None
+    assert result.summary['rtt_as_count'] == 0
+    assert np.isnan(result.summary['rtt_as_mean'])
+    assert result.rtts.dtypes.astype(str).to_dict() == RTT_SCHEMA
+
+
+@mark.parametrize('format', ['parquet', 'csv', 'json'])
+def test_exports_are_read_back_with_the_schema(
+    tmp_path, analysis, result, format
+):
+    needs_writer(format)
+    quiet = capture_result(
+        analysis._replace(attack_start=None),
+        ATTACK,
+        file='quiet.pcapng',
+        capture='quiet',
+    )
+
+    paths = export_result(result, tmp_path, format=format)
+    export_result(quiet, tmp_path, format=format)
+    # Exporting again replaces the files of the capture
+    export_result(result, tmp_path, format=format)
+
+    assert [os.path.relpath(path, tmp_path) for path in paths] == [
+        os.path.join(table, f'0-dos_attack_example{EXPORT_FORMATS[format]}')
+        for table in EXPORT_TABLES
+    ]
+    summary = read_exports(tmp_path, format=format)
+    assert summary['capture'].tolist() == ['0-dos_attack_example', 'quiet']
+    assert summary.dtypes.astype(str).to_dict() == SUMMARY_SCHEMA
+    assert summary['attack_start_index'].isna().tolist() == [False, True]
+    per_second = read_exports(tmp_path, 'per_second', format=format)
+    assert len(per_second) == 2 * len(result.per_second)
+    pd.testing.assert_frame_equal(
+        per_second.iloc[: len(result.per_second)], result.per_second
+    )
+    rtts = read_exports(tmp_path, 'rtts', format=format)
+    pd.testing.assert_frame_equal(rtts.iloc[: len(result.rtts)], result.rtts)
+    services = read_exports(tmp_path, 'services', format=format)
+    pd.testing.assert_frame_equal(
+        services.iloc[: len(result.services)], result.services
+    )
+    floods = read_exports(tmp_path, 'floods', format=format)
+    assert floods.empty
+    assert floods.dtypes.astype(str).to_dict() == FLOOD_SCHEMA
+
+
+@mark.parametrize('format', ['parquet', 'csv', 'json'])
+def test_the_none_attack_type_is_read_back(tmp_path, result, format):
+    needs_writer(format)
+    export_result(result, tmp_path, format=format)
+
+    summary = read_exports(tmp_path, format=format)
+
+    assert summary['attack_type'].tolist() == ['None']
+    assert summary['attack_name'].tolist() == ['DOS ATTACK EXAMPLE']
+
+
+def test_the_results_without_rtts_are_exported_without_them(tmp_path, result):
+    paths = export_result(result._replace(rtts=None), tmp_path)
+
+    assert [os.path.basename(os.path.dirname(path)) for path in paths] == [
+        'per_second',
+        'summary',
+        'services',
+        'floods',
+    ]
+    # CSV is the default, as it needs no optional dependency
+    assert all(path.endswith('.csv') for path in paths)
+
+
+def test_reading_an_empty_export(tmp_path):
+    rtts = read_exports(tmp_path, 'rtts')
+
+    assert rtts.empty
+    assert rtts.dtypes.astype(str).to_dict() == RTT_SCHEMA
+
+
+def test_invalid_format_and_table(tmp_path, result):
+    with raises(ValueError, match="Invalid export format: 'xml'"):
+        export_result(result, tmp_path, format='xml')
+    with raises(ValueError, match="Invalid export table: 'packets'"):
+        read_exports(tmp_path, 'packets', format='csv')
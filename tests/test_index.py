@@ -0,0 +1,97 @@
+import os
+import shutil
+
+import numpy as np
+from pytest import mark
+
+from uanalyser.preprocessing.index import (
+    build_index,
+    index_path,
+    iter_index_records,
+    load_index,
+    record_flow_id,
+)
+from uanalyser.preprocessing.pcapng import iter_block_records, seek_time
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+EXAMPLE = 'tests/assets/example.pcapng'
+SERVER_IP = '192.168.164.101'
+CLIENTS_IPS = ['192.168.164.102']
+
+
+@mark.parametrize('file_path', [ATTACK_EXAMPLE, EXAMPLE])
+def test_index_matches_records(file_path):
+    index = build_index(file_path, flows=True)
+    records = list(iter_block_records(file_path))
+
+    assert index.packets['time'].tolist() == [
+        record.time for record in records
+    ]
+    assert index.packets['flow'].tolist() == [
+        record_flow_id(record) for record in records
+    ]
+    rows = np.arange(0, len(records), 97)
+    assert list(iter_index_records(file_path, index, rows)) == [
+        records[row] for row in rows
+    ]
+
+
+@mark.parametrize('start', [0, 12.5, 30, 10000])
+def test_index_seek_matches_block_scan(start):
+    index = build_index(ATTACK_EXAMPLE)
+    state, first_index, _ = seek_time(ATTACK_EXAMPLE, start)
+
+    assert index.seek(start) == (
+        (state, first_index) if state is not None else (None, 0)
+    )
+
+
+def test_sidecar_is_reused_and_invalidated(tmp_path):
+    capture = tmp_path / 'capture.pcapng'
+    shutil.copy(ATTACK_EXAMPLE, capture)
+
+    index = load_index(str(capture))
+    sidecar = index_path(str(capture))
+    assert os.path.exists(sidecar)
+    written = os.stat(sidecar).st_mtime_ns
+    assert len(load_index(str(capture)).packets) == len(index.packets)
+    assert os.stat(sidecar).st_mtime_ns == written
+
+    # Keep the first packets only: the capture changes, and so does its index
+    offset = int(index.packets['offset'][100])
+    with open(capture, 'r+b') as fdesc:
+        fdesc.truncate(offset)
+    assert len(load_index(str(capture)).packets) == 100
+
+    # A sidecar without the flows is rebuilt when they are requested
+    assert load_index(str(capture), flows=True).packets['flow'].any()
+
+
+def test_sidecar_in_index_dir(tmp_path):
+    load_index(EXAMPLE, index_dir=str(tmp_path))
+
+    assert [path.name for path in tmp_path.iterdir()] == [
+        os.path.basename(index_path(EXAMPLE, str(tmp_path)))
+    ]
+
+
+@mark.parametrize('shards', [1, 3])
+@mark.parametrize('start', [0, 20])
+def test_indexed_analysis_matches_scan(tmp_path, shards, start):
+    options = {'shards': shards, 'start': start, 'max_duration': 30}
+    scanned = analyse_capture(
+        ATTACK_EXAMPLE, SERVER_IP, CLIENTS_IPS, [4840], **options
+    )
+    indexed = analyse_capture(
+        ATTACK_EXAMPLE,
+        SERVER_IP,
+        CLIENTS_IPS,
+        [4840],
+        use_index=True,
+        index_dir=str(tmp_path),
+        **options,
+    )
+
+    assert np.array_equal(indexed.table, scanned.table)
+    assert indexed.rtts == scanned.rtts
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+from pytest import raises
+
+from uanalyser.lazy import LazyModule, lazy_import, scapy
+
+
+def test_the_module_is_imported_on_first_access():
+    code = (
+        'import sys\n'
+        'sys.path.insert(0, "uanalyser")\n'
+        'from lazy import lazy_import\n'
+        'json = lazy_import("json")\n'
+        'before = "json" in sys.modules\n'
+        'json.dumps\n'
+        'print(before, "json" in sys.modules)'
+    )
+
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True
+    )
+
+    assert result.stdout.strip() == 'False True'
+
+
+def test_patched_attributes_are_seen(monkeypatch):
+    import json
+
+    lazy_json = lazy_import('json')
+    assert lazy_json.dumps is json.dumps
+
+    monkeypatch.setattr(json, 'dumps', lambda value: 'patched')
+    assert lazy_json.dumps(1) == 'patched'
+
+
+def test_the_names_are_looked_up_in_each_module():
+    module = LazyModule('json', 'statistics')
+
+    assert module.loads('2') == 2
+    assert module.mean([1, 3]) == 2
+    with raises(AttributeError, match="module 'json' has no attribute"):
+        module.missing
+
+
+def test_the_dunder_lookups_do_not_import():
+    module = LazyModule('not.a.module')
+
+    assert not hasattr(module, '__wrapped__')
+
+
+def test_the_scapy_names_of_the_analyser():
+    from scapy.layers.inet import IP
+    from scapy.utils import RawPcapNgReader
+
+    assert scapy.IP is IP
+    assert scapy.RawPcapNgReader is RawPcapNgReader
+    # The layers are registered, so the frames are dissected
+    packet = scapy.Ether(bytes(scapy.Ether() / scapy.IP() / scapy.TCP()))
+    assert packet.haslayer(scapy.TCP)
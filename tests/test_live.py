@@ -0,0 +1,121 @@
+import numpy as np
+
+from uanalyser.preprocessing.live import (
+    LiveMonitor,
+    follow_pcapng_records,
+    run_live,
+)
+from uanalyser.preprocessing.operations import (
+    classify_communication,
+    classify_record,
+)
+from uanalyser.preprocessing.pcapng import iter_block_records
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+SERVER_IP = '192.168.164.101'
+CLIENTS_IPS = ['192.168.164.102']
+OPCUA_PORTS = [4840, 4841, 49320, 62541, 4897, 53530, 48050, 4885, 4855, 26543]
+
+
+def take_until_idle(records):
+    taken = []
+    for record in records:
+        if record is None:
+            return taken
+        taken.append(record)
+
+
+def test_follow_growing_pcapng_file(tmp_path):
+    with open(ATTACK_EXAMPLE, 'rb') as file:
+        content = file.read()
+    growing = tmp_path / 'growing.pcapng'
+    # Cut in the middle of a block, as a capture being written
+    growing.write_bytes(content[:100001])
+
+    records = follow_pcapng_records(str(growing), poll_interval=0)
+    first = take_until_idle(records)
+    with open(growing, 'ab') as file:
+        file.write(content[100001:])
+    second = take_until_idle(records)
+
+    assert first
+    assert first + second == list(iter_block_records(ATTACK_EXAMPLE))
+
+
+def test_follow_stops_after_idle_timeout(tmp_path):
+    growing = tmp_path / 'growing.pcapng'
+    growing.write_bytes(b'')
+
+    records = list(
+        follow_pcapng_records(str(growing), poll_interval=0, idle_timeout=0)
+    )
+
+    assert records == [None]
+
+
+def test_monitor_matches_offline_analysis():
+    monitor = LiveMonitor(SERVER_IP, CLIENTS_IPS, OPCUA_PORTS, window=70)
+    for record in iter_block_records(ATTACK_EXAMPLE):
+        monitor.add(record)
+    snapshot = monitor.snapshot()
+    analysis = analyse_capture(
+        ATTACK_EXAMPLE, SERVER_IP, CLIENTS_IPS, OPCUA_PORTS, max_duration=None
+    )
+    buckets = len(analysis.throughput_kbps)
+
+    assert snapshot.attack_start == analysis.attack_start
+    assert np.allclose(
+        snapshot.throughput_kbps[-buckets - 1 : -1], analysis.throughput_kbps
+    )
+    assert np.array_equal(
+        snapshot.opcua_packets_per_second[-buckets - 1 : -1],
+        analysis.opcua_packets_per_second,
+    )
+    for flow, rtts in analysis.rtts.items():
+        assert snapshot.rtts[flow] == [[time, rtt] for _, time, rtt in rtts]
+
+
+def test_monitor_classifies_as_the_packet_table():
+    monitor = LiveMonitor(SERVER_IP, CLIENTS_IPS + ['10.0.0.9'], OPCUA_PORTS)
+    records = list(iter_block_records(ATTACK_EXAMPLE))
+
+    codes = [
+        classify_record(record, monitor._servers, monitor._clients)
+        for record in records
+    ]
+
+    assert (
+        codes
+        == classify_communication(
+            [record.ip_src for record in records],
+            [record.ip_dst for record in records],
+            [record.proto if record.is_ipv4 else 0 for record in records],
+            SERVER_IP,
+            CLIENTS_IPS + ['10.0.0.9'],
+        ).tolist()
+    )
+
+
+def test_monitor_window_is_bounded():
+    monitor = LiveMonitor(SERVER_IP, CLIENTS_IPS, OPCUA_PORTS, window=5)
+    snapshots = []
+    run_live(iter_block_records(ATTACK_EXAMPLE), monitor, snapshots.append)
+
+    for snapshot in snapshots:
+        assert len(snapshot.throughput_kbps) == 5
+        for rtts in snapshot.rtts.values():
+            assert all(snapshot.time - time <= 5 for time, _ in rtts)
+
+
+def test_run_live_stops_when_asked():
+    monitor = LiveMonitor(SERVER_IP, CLIENTS_IPS, OPCUA_PORTS)
+
+    ticks = run_live(
+        iter_block_records(ATTACK_EXAMPLE),
+        monitor,
+        lambda snapshot: snapshot.under_attack,
+    )
+
+    assert ticks == 17
+    assert monitor.now < 34
@@ -0,0 +1,149 @@
+import struct
+
+import scapy.all as scapy
+from pytest import mark, raises
+
+from uanalyser.preprocessing.file_handling import (
+    iter_pcapng_records,
+    map_pcapng_file,
+)
+from uanalyser.preprocessing.pcapng import (
+    BLOCK_EPB,
+    BLOCK_IDB,
+    BLOCK_SHB,
+    BYTE_ORDER_MAGIC,
+    iter_block_records,
+    iter_frames,
+    iter_packet_blocks,
+    map_file,
+    scan_reader_states,
+)
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+EXAMPLE = 'tests/assets/example.pcapng'
+
+
+def make_block(endian, block_type, body):
+    body += bytes(-len(body) % 4)
+    length = len(body) + 12
+    return (
+        struct.pack(endian + 'II', block_type, length)
+        + body
+        + struct.pack(endian + 'I', length)
+    )
+
+
+def make_section(endian, tsresols, packets):
+    """A section with an interface per timestamp resolution and its packets, as (interface, ticks, frame)."""
+    blocks = [
+        make_block(
+            endian,
+            BLOCK_SHB,
+            struct.pack(endian + 'IHHq', BYTE_ORDER_MAGIC, 1, 0, -1),
+        )
+    ]
+    for tsresol in tsresols:
+        options = b''
+        if tsresol is not None:
+            options = struct.pack(endian + 'HHB3xHH', 9, 1, tsresol, 0, 0)
+        blocks.append(
+            make_block(
+                endian,
+                BLOCK_IDB,
+                struct.pack(endian + 'HHI', 1, 0, 0xFFFF) + options,
+            )
+        )
+    for interface, ticks, frame in packets:
+        header = struct.pack(
+            endian + 'IIIII',
+            interface,
+            ticks >> 32,
+            ticks & 0xFFFFFFFF,
+            len(frame),
+            len(frame),
+        )
+        blocks.append(make_block(endian, BLOCK_EPB, header + frame))
+    return b''.join(blocks)
+
+
+@mark.parametrize('file_path', [ATTACK_EXAMPLE, EXAMPLE])
+def test_mapped_records_match_scapy_reader(file_path):
+    assert list(map_pcapng_file(file_path)) == list(
+        iter_pcapng_records(file_path)
+    )
+
+
+def test_sections_byte_orders_and_resolutions(tmp_path):
+    frames = [
+        bytes(record.frame)
+        for record, _ in zip(iter_block_records(EXAMPLE), range(4))
+    ]
+    capture = tmp_path / 'sections.pcapng'
+    capture.write_bytes(
+        make_section('<', [None], [(0, 1708604341759345, frames[0])])
+        # Nanoseconds and 2^-10 seconds, in a big-endian section
+        + make_section(
+            '>',
+            [9, 0x80 | 10],
+            [
+                (0, 1708604342000000500, frames[1]),
+                (1, 1749610846208 + 512, frames[2]),
+            ],
+        )
+        + make_section('<', [6], [(0, 1708604343250000, frames[3])])
+    )
+
+    mapped = list(map_pcapng_file(str(capture)))
+
+    assert [bytes(record.frame) for record in mapped] == frames
+    assert [record.time for record in mapped] == [
+        1708604341.759345,
+        1708604342.0000005,
+        1708604342.5,
+        1708604343.25,
+    ]
+    # Scapy reads the same frames, though not the resolutions of this section
+    assert [bytes(packet) for packet in scapy.rdpcap(str(capture))] == frames
+
+    # Resuming in the big-endian section keeps its interfaces
+    states, first_indexes, _ = scan_reader_states(str(capture), [200])
+    assert first_indexes == [1]
+    assert [
+        record.time for record in iter_block_records(str(capture), states[0])
+    ] == [record.time for record in mapped[1:]]
+
+
+def test_frames_are_views_of_the_map():
+    with map_file(EXAMPLE) as buffer:
+        frames = list(iter_frames(buffer))
+
+    # The frames keep the map alive after the context
+    frame = frames[0][0]
+    assert isinstance(frame, memoryview) and frame.readonly
+    assert len(frames) == 6129
+    assert bytes(frame) == bytes(next(iter_pcapng_records(EXAMPLE)).frame)
+
+
+def test_truncated_capture_ignores_last_block(tmp_path):
+    *_, (last, _) = iter_packet_blocks(EXAMPLE)
+    with open(EXAMPLE, 'rb') as fdesc:
+        content = fdesc.read(last.offset + 30)
+    capture = tmp_path / 'truncated.pcapng'
+    capture.write_bytes(content)
+
+    assert sum(1 for _ in map_pcapng_file(str(capture))) == 6128
+
+
+def test_invalid_block_length(tmp_path):
+    capture = tmp_path / 'invalid.pcapng'
+    capture.write_bytes(
+        make_section('<', [None], []) + struct.pack('<III', BLOCK_EPB, 14, 0)
+    )
+
+    with raises(ValueError):
+        list(map_pcapng_file(str(capture)))
+
+
+def test_map_missing_file():
+    with raises(FileNotFoundError):
+        map_pcapng_file('path/non_existent_example.pcapng')
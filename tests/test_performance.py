@@ -0,0 +1,108 @@
+import os
+import shutil
+
+import pandas as pd
+from pytest import fixture, raises
+
+from uanalyser.plot.graphics import render_charts
+from uanalyser.plot.performance import (
+    COLUMNAR_SUFFIX,
+    PERFORMANCE_DTYPES,
+    clear_performance_cache,
+    find_performance_data,
+    load_performance_data,
+)
+
+PERFORMANCE_EXAMPLE = 'tests/assets/0-dos_attack_example.csv'
+
+
+@fixture
+def parses(monkeypatch):
+    """Count the CSV files parsed."""
+    clear_performance_cache()
+    parsed = []
+    read_csv = pd.read_csv
+
+    def counting_read_csv(*args, **kwargs):
+        parsed.append(args[0])
+        return read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', counting_read_csv)
+    yield parsed
+    clear_performance_cache()
+
+
+def test_typed_columns(parses):
+    data = load_performance_data(PERFORMANCE_EXAMPLE)
+    reference = pd.read_csv(PERFORMANCE_EXAMPLE)
+
+    assert list(data.columns) == list(PERFORMANCE_DTYPES)
+    assert dict(data.dtypes) == PERFORMANCE_DTYPES
+    assert (data['CPU (%)'] - reference['CPU (%)']).abs().max() < 1e-5
+    assert data['Timestamp'].equals(reference['Timestamp'])
+
+
+def test_parsed_once_until_modified(tmp_path, parses):
+    csv_file = tmp_path / 'capture.csv'
+    shutil.copy(PERFORMANCE_EXAMPLE, csv_file)
+
+    first = load_performance_data(str(csv_file))
+    assert load_performance_data(str(csv_file)) is first
+    assert len(parses) == 1
+
+    stat = os.stat(csv_file)
+    os.utime(csv_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_performance_data(str(csv_file)) is not first
+    assert len(parses) == 2
+
+
+def test_columnar_copy(tmp_path, parses):
+    columnar_dir = tmp_path / 'columnar'
+
+    data = load_performance_data(
+        PERFORMANCE_EXAMPLE, columnar_dir=str(columnar_dir)
+    )
+    assert [path.suffixes for path in columnar_dir.iterdir()] == [
+        ['.perf', '.npz']
+    ]
+    assert COLUMNAR_SUFFIX == '.perf.npz'
+
+    clear_performance_cache()
+    copy = load_performance_data(
+        PERFORMANCE_EXAMPLE, columnar_dir=str(columnar_dir)
+    )
+    assert len(parses) == 1
+    pd.testing.assert_frame_equal(copy, data)
+
+
+def test_missing_columns(tmp_path, parses):
+    csv_file = tmp_path / 'capture.csv'
+    csv_file.write_text('Timestamp,CPU (%)\n0.1,5.0\n')
+
+    with raises(ValueError):
+        load_performance_data(str(csv_file))
+
+
+def test_missing_performance_data(parses):
+    with raises(FileNotFoundError):
+        load_performance_data('tests/assets/missing.csv')
+    assert find_performance_data('missing', data_dir='tests/assets') is None
+
+
+def test_performance_chart(tmp_path, attack_charts, parses):
+    charts = attack_charts._replace(
+        performance_data=find_performance_data(
+            '0-dos_attack_example', data_dir='tests/assets'
+        )
+    )
+
+    paths = render_charts(charts, preset='preview', output_dir=str(tmp_path))
+
+    assert [path.rsplit('-', 1)[1] for path in paths] == [
+        'perf.png',
+        'rttp.png',
+        'rtts.png',
+        'tput.png',
+        'pack.png',
+    ]
+    assert len(parses) == 1
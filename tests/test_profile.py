@@ -0,0 +1,131 @@
+import numpy as np
+from pytest import mark, raises
+
+from uanalyser.preprocessing.profile import (
+    AnalysisProfile,
+    load_profile,
+    make_profile,
+)
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+
+TOML_PROFILE = """
+[topology]
+servers = ['10.0.0.1', '10.0.0.2']
+clients = ['10.0.1.1']
+ports = [4840]
+
+[window]
+start = 30
+end = 90
+bucket = 0.5
+"""
+
+YAML_PROFILE = """
+topology:
+  servers: [10.0.0.1]
+window:
+  duration: .inf
+redundancy:
+  key: payload
+"""
+
+
+def test_load_toml_profile(tmp_path):
+    path = tmp_path / 'cell.toml'
+    path.write_text(TOML_PROFILE)
+
+    assert load_profile(str(path)) == AnalysisProfile(
+        servers_ip=('10.0.0.1', '10.0.0.2'),
+        clients_ip=('10.0.1.1',),
+        ports=(4840,),
+        start=30.0,
+        duration=60.0,
+        bucket=0.5,
+    )
+
+
+def test_load_yaml_profile(tmp_path):
+    path = tmp_path / 'cell.yaml'
+    path.write_text(YAML_PROFILE)
+
+    profile = load_profile(str(path))
+
+    assert profile.servers_ip == ('10.0.0.1',)
+    assert profile.clients_ip == AnalysisProfile().clients_ip
+    assert profile.duration is None and profile.end is None
+    assert profile.redundancy_key == 'payload'
+
+
+def test_overrides_take_precedence_over_file(tmp_path):
+    path = tmp_path / 'cell.toml'
+    path.write_text(TOML_PROFILE)
+
+    profile = load_profile(str(path), duration=10, servers_ip=None)
+
+    assert profile.servers_ip == ('10.0.0.1', '10.0.0.2')
+    assert (profile.start, profile.end) == (30.0, 40.0)
+
+
+@mark.parametrize(
+    'content, message',
+    [
+        ('[network]\nservers = []', "Invalid profile section: 'network'"),
+        ('[window]\nstop = 3', "Invalid key in the 'window' section: 'stop'"),
+        ('[window]\nend = 10\nduration = 10', 'Give either the end'),
+        ('[window]\nstart = 10\nend = 5', 'The window must end after'),
+        ('[redundancy]\nkey = "mac"', "Invalid redundancy key: 'mac'"),
+    ],
+)
+def test_invalid_profile(tmp_path, content, message):
+    path = tmp_path / 'cell.toml'
+    path.write_text(content)
+
+    with raises(ValueError) as error:
+        load_profile(str(path))
+
+    assert error.value.args[0].startswith(message)
+
+
+def test_missing_profile():
+    with raises(FileNotFoundError):
+        load_profile('tests/assets/missing.toml')
+
+
+def test_moving_the_start_keeps_the_duration():
+    profile = make_profile(start=20)
+
+    assert (profile.start, profile.end) == (20.0, 80.0)
+
+
+@mark.parametrize('shards', [1, 3])
+def test_window_matches_full_capture(shards):
+    full = analyse_capture(
+        ATTACK_EXAMPLE,
+        '192.168.164.101',
+        ['192.168.164.102'],
+        [4840],
+        max_duration=None,
+    ).table
+    window = analyse_capture(
+        ATTACK_EXAMPLE,
+        '192.168.164.101',
+        ['192.168.164.102'],
+        [4840],
+        shards=shards,
+        start=20,
+        max_duration=10,
+    ).table
+
+    inside = full[(full['time'] >= 20) & (full['time'] <= 30)]
+    assert np.array_equal(window['index'], inside['index'])
+    assert np.allclose(window['time'], inside['time'] - 20)
+    assert np.array_equal(window['comm_type'], inside['comm_type'])
+
+
+def test_window_after_the_capture():
+    with raises(ValueError):
+        analyse_capture(
+            ATTACK_EXAMPLE, '192.168.164.101', [], [4840], start=3600
+        )
@@ -0,0 +1,82 @@
+import matplotlib.image
+from pytest import raises
+
+from uanalyser.plot.graphics import render_captures, render_charts
+
+SUFFIXES = ['rttp', 'rtts', 'tput', 'pack']
+
+
+def read_images(paths):
+    images = {}
+    for path in paths:
+        with open(path, 'rb') as fdesc:
+            images[path.rsplit('/', 1)[1]] = fdesc.read()
+    return images
+
+
+def test_preview_preset(tmp_path, attack_charts):
+    paths = render_charts(
+        attack_charts, preset='preview', output_dir=str(tmp_path)
+    )
+
+    assert paths == [
+        f'{tmp_path}/0-dos_attack_example-{suffix}.png' for suffix in SUFFIXES
+    ]
+    assert matplotlib.image.imread(paths[0]).shape[:2] == (600, 1200)
+
+
+def test_reused_figures_render_the_same_images(tmp_path, attack_charts):
+    first = read_images(
+        render_charts(
+            attack_charts, preset='preview', output_dir=str(tmp_path)
+        )
+    )
+    other = attack_charts._replace(
+        rtts_attacker_server=[], output_name='other'
+    )
+    render_charts(other, preset='preview', output_dir=str(tmp_path))
+
+    assert (
+        read_images(
+            render_charts(
+                attack_charts, preset='preview', output_dir=str(tmp_path)
+            )
+        )
+        == first
+    )
+
+
+def test_vector_preset(tmp_path, attack_charts):
+    paths = render_charts(
+        attack_charts, preset=(72, 'svg'), output_dir=str(tmp_path)
+    )
+
+    assert all(path.endswith('.svg') for path in paths)
+
+
+def test_parallel_rendering_matches_inline(tmp_path, attack_charts):
+    captures = [
+        attack_charts._replace(output_name=f'capture-{i}') for i in range(3)
+    ]
+    (tmp_path / 'inline').mkdir()
+    (tmp_path / 'parallel').mkdir()
+
+    inline = render_captures(
+        captures, preset='preview', workers=1, output_dir=f'{tmp_path}/inline'
+    )
+    parallel = render_captures(
+        captures,
+        preset='preview',
+        workers=2,
+        output_dir=f'{tmp_path}/parallel',
+    )
+
+    assert [len(paths) for paths in parallel] == [4, 4, 4]
+    assert [read_images(paths) for paths in parallel] == [
+        read_images(paths) for paths in inline
+    ]
+
+
+def test_invalid_preset(attack_charts):
+    with raises(ValueError):
+        render_captures([attack_charts], preset='poster')
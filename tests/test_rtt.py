@@ -0,0 +1,241 @@
+import random
+
+from pytest import raises
+
+from uanalyser.preprocessing.file_handling import iter_pcapng_records
+from uanalyser.preprocessing.operations import define_communication_type
+from uanalyser.preprocessing.rtt import (
+    MAX_KEYED_MISSES,
+    TCP_PSH,
+    RttMatcher,
+)
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+SERVER_IP = '192.168.164.101'
+CLIENTS_IPS = ['192.168.164.102']
+OPCUA_PORTS = [4840, 4841, 49320, 62541, 4897, 53530, 48050, 4885, 4855, 26543]
+
+CLIENT, SERVER = 1, 2
+
+
+def request(
+    matcher, time, seq, length, request_id=-1, flags=TCP_PSH, tag=None
+):
+    return matcher.add(
+        time,
+        CLIENT,
+        50000,
+        SERVER,
+        4840,
+        seq,
+        0,
+        length,
+        flags,
+        request_id,
+        tag=tag,
+    )
+
+
+def response(matcher, time, seq, ack, length, request_id=-1, flags=TCP_PSH):
+    return matcher.add(
+        time, SERVER, 4840, CLIENT, 50000, seq, ack, length, flags, request_id
+    )
+
+
+def test_identified_responses_out_of_order():
+    matcher = RttMatcher([4840])
+    request(matcher, 0.0, 0, 10, request_id=1, tag='publish')
+    request(matcher, 0.5, 10, 10, request_id=2, tag='read')
+
+    assert response(matcher, 1.0, 0, 20, 10, request_id=2) == (
+        'read',
+        0.5,
+        500.0,
+    )
+    assert response(matcher, 2.0, 10, 20, 10, request_id=1) == (
+        'publish',
+        0.0,
+        2000.0,
+    )
+    assert matcher.pending == 0
+
+
+def test_identified_continuation_segments_are_skipped():
+    matcher = RttMatcher([4840])
+    request(matcher, 0.0, 0, 1460, request_id=1, flags=0, tag='write')
+    request(matcher, 0.25, 1460, 100)
+
+    assert response(matcher, 0.5, 0, 1560, 1460, request_id=1, flags=0) == (
+        'write',
+        0.0,
+        500.0,
+    )
+    assert response(matcher, 0.75, 1460, 1560, 100) is None
+
+
+def test_encrypted_identifiers_are_paired_by_ack():
+    # With Sign & Encrypt, the identifiers read are unrelated ciphertext
+    generator = random.Random(0)
+    matcher = RttMatcher([4840])
+    paired = []
+    for exchange in range(100):
+        time, seq = exchange / 10, exchange * 10
+        request(
+            matcher,
+            time,
+            seq,
+            10,
+            request_id=generator.getrandbits(32),
+            tag=exchange,
+        )
+        paired.append(
+            response(
+                matcher,
+                time + 0.05,
+                seq,
+                seq + 10,
+                10,
+                request_id=generator.getrandbits(32),
+            )
+        )
+
+    assert [pair[0] for pair in paired if pair] == list(range(100))
+    assert matcher.pending == 0
+
+
+def test_keyed_connection_falls_back_to_ack():
+    matcher = RttMatcher([4840])
+    request(matcher, 0.0, 0, 10, request_id=1, tag='read')
+    assert response(matcher, 0.5, 0, 10, 10, request_id=1)[0] == 'read'
+
+    paired = []
+    for exchange in range(1, 2 * MAX_KEYED_MISSES + 1):
+        seq = exchange * 10
+        request(matcher, exchange, seq, 10, request_id=100 + exchange)
+        paired.append(
+            response(
+                matcher, exchange + 0.5, seq, seq + 10, 10, request_id=exchange
+            )
+        )
+
+    # The responses are paired with the sequence numbers after the misses
+    assert paired[: MAX_KEYED_MISSES - 1] == [None] * (MAX_KEYED_MISSES - 1)
+    assert all(paired[MAX_KEYED_MISSES:])
+
+
+def test_pipelined_requests_paired_by_ack():
+    matcher = RttMatcher([4840])
+    request(matcher, 0.0, 100, 20, tag='first')
+    request(matcher, 0.25, 120, 30, tag='second')
+
+    assert response(matcher, 0.5, 0, 150, 40) == ('first', 0.0, 500.0)
+    assert response(matcher, 0.75, 40, 150, 40) == ('second', 0.25, 500.0)
+
+
+def test_segmented_request_and_response():
+    matcher = RttMatcher([4840])
+    request(matcher, 0.0, 0, 1460, flags=0, tag='write')
+    request(matcher, 0.25, 1460, 100)
+
+    assert matcher.pending == 1
+    assert response(matcher, 0.5, 0, 1560, 1460, flags=0) == (
+        'write',
+        0.0,
+        500.0,
+    )
+    assert response(matcher, 0.75, 1460, 1560, 100) is None
+
+
+def test_retransmissions_are_ignored():
+    matcher = RttMatcher([4840])
+    request(matcher, 0.0, 0, 10, tag='read')
+    request(matcher, 0.25, 0, 10, tag='retransmission')
+
+    assert response(matcher, 0.5, 0, 10, 10) == ('read', 0.0, 500.0)
+    assert response(matcher, 0.75, 0, 10, 10) is None
+    request(matcher, 1.0, 0, 10, tag='late retransmission')
+    assert matcher.pending == 0
+
+
+def test_sequence_numbers_wrap_around():
+    matcher = RttMatcher([4840])
+    request(matcher, 0.0, 2**32 - 5, 10, tag='read')
+
+    assert response(matcher, 0.5, 0, 5, 10) == ('read', 0.0, 500.0)
+
+
+def test_stale_requests_expire():
+    matcher = RttMatcher([4840], timeout=1.0)
+    request(matcher, 0.0, 0, 10, request_id=1)
+    request(matcher, 0.0, 10, 10, request_id=2)
+
+    assert matcher.expire(0.5) == 0
+    assert matcher.expire(1.5) == 2
+    assert response(matcher, 1.5, 0, 20, 10, request_id=1) is None
+    assert matcher.pending == 0
+
+
+def test_requests_expire_between_sweeps():
+    matcher = RttMatcher([4840], timeout=1.0)
+    request(matcher, 0.0, 0, 10, request_id=1)
+    request(matcher, 0.5, 10, 10, request_id=2)
+    # Sweeps the requests at 1.0, then not before 2.0
+    response(matcher, 1.0, 0, 20, 10, request_id=1)
+
+    assert response(matcher, 1.9, 10, 20, 10, request_id=2) is None
+
+
+def test_memory_is_bounded_on_unbounded_streams():
+    matcher = RttMatcher([4840], timeout=1.0, max_pending=8)
+    for exchange in range(100000):
+        time = exchange / 1000
+        matcher.add(
+            time, exchange, 50000, SERVER, 4840, 0, 0, 10, TCP_PSH, exchange
+        )
+
+        if exchange % 1000 == 0:
+            # The requests of the last two timeouts at most, as stale
+            # requests are swept once per timeout
+            assert matcher.pending <= 2000
+    for request_id in range(20):
+        matcher.add(0.0, CLIENT, 50000, SERVER, 4840, 0, 0, 10, 0, request_id)
+
+    assert (
+        len(matcher._connections[(CLIENT, 50000, SERVER, 4840)].identified)
+        <= 8
+    )
+
+
+def test_duplicated_records_match_deduplicated_table():
+    analysis = analyse_capture(
+        ATTACK_EXAMPLE,
+        SERVER_IP,
+        CLIENTS_IPS,
+        OPCUA_PORTS,
+        max_duration=None,
+        redundancy_key='payload',
+    )
+    flows = {'Client to Server': 'C-S', 'Attacker to Server': 'A-S'}
+    matcher = RttMatcher(OPCUA_PORTS)
+    rtts = {'C-S': [], 'A-S': []}
+    # The capture holds every packet twice, and the matcher skips the copies
+    for record in iter_pcapng_records(ATTACK_EXAMPLE):
+        comm_type = define_communication_type(record, SERVER_IP, CLIENTS_IPS)
+        matched = matcher.add_record(record, tag=flows.get(comm_type))
+        if matched is not None and matched[0] is not None:
+            rtts[matched[0]].append(round(matched[2], 3))
+
+    for flow, flow_rtts in analysis.rtts.items():
+        assert rtts[flow] == [round(rtt, 3) for _, _, rtt in flow_rtts]
+
+
+def test_invalid_rtt_key():
+    with raises(ValueError) as error:
+        analyse_capture(
+            ATTACK_EXAMPLE, SERVER_IP, CLIENTS_IPS, OPCUA_PORTS, rtt_key='ip'
+        )
+
+    assert error.value.args[0] == (
+        "Invalid RTT key: 'ip'. Acceptable values are: ['tcp', 'mac']"
+    )
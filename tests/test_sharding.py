@@ -0,0 +1,157 @@
+import numpy as np
+from pytest import mark, raises
+
+from uanalyser.preprocessing.file_handling import iter_pcapng_records
+from uanalyser.preprocessing.pcapng import iter_block_records
+from uanalyser.preprocessing.sharding import analyse_capture
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+EXAMPLE = 'tests/assets/example.pcapng'
+SERVER_IP = '192.168.164.101'
+CLIENTS_IPS = ['192.168.164.102']
+OPCUA_PORTS = [4840, 4841, 49320, 62541, 4897, 53530, 48050, 4885, 4855, 26543]
+
+
+@mark.parametrize('file_path', [ATTACK_EXAMPLE, EXAMPLE])
+def test_block_records_match_scapy_reader(file_path):
+    assert list(iter_block_records(file_path)) == list(
+        iter_pcapng_records(file_path)
+    )
+
+
+@mark.parametrize('file_path', [ATTACK_EXAMPLE, EXAMPLE])
+@mark.parametrize('shards', [2, 3, 4])
+@mark.parametrize('max_duration', [60, 10, None])
+@mark.parametrize('redundancy_key', ['time', 'payload'])
+@mark.parametrize('rtt_key', ['tcp', 'mac'])
+def test_sharded_analysis_matches_sequential(
+    file_path, shards, max_duration, redundancy_key, rtt_key
+):
+    options = {
+        'max_duration': max_duration,
+        'redundancy_key': redundancy_key,
+        'rtt_key': rtt_key,
+    }
+    sequential = analyse_capture(
+        file_path, SERVER_IP, CLIENTS_IPS, OPCUA_PORTS, **options
+    )
+    sharded = analyse_capture(
+        file_path,
+        SERVER_IP,
+        CLIENTS_IPS,
+        OPCUA_PORTS,
+        shards=shards,
+        workers=2,
+        **options,
+    )
+
+    assert np.array_equal(sharded.table, sequential.table)
+    assert sharded.attack_start == sequential.attack_start
+    assert np.array_equal(sharded.throughput_kbps, sequential.throughput_kbps)
+    assert np.array_equal(
+        sharded.opcua_packets_per_second, sequential.opcua_packets_per_second
+    )
+    assert sharded.rtts == sequential.rtts
+    assert sharded.service_rtts == sequential.service_rtts
+
+
+def test_analyse_capture_missing_file():
+    with raises(FileNotFoundError):
+        analyse_capture('tests/assets/missing.pcapng', SERVER_IP, [], [])
+
+
+def test_analyse_capture_empty_path():
+    with raises(ValueError):
+        analyse_capture('', SERVER_IP, [], [])
+
+
+def test_cached_analysis_matches_fresh(tmp_path):
+    fresh = analyse_capture(
+        ATTACK_EXAMPLE, SERVER_IP, CLIENTS_IPS, OPCUA_PORTS
+    )
+    stored = analyse_capture(
+        ATTACK_EXAMPLE,
+        SERVER_IP,
+        CLIENTS_IPS,
+        OPCUA_PORTS,
+        cache_dir=str(tmp_path),
+    )
+    cached = analyse_capture(
+        ATTACK_EXAMPLE,
+        SERVER_IP,
+        CLIENTS_IPS,
+        OPCUA_PORTS,
+        cache_dir=str(tmp_path),
+    )
+
+    assert len(list(tmp_path.iterdir())) == 1
+    assert isinstance(cached.table, np.memmap)
+    for analysis in (stored, cached):
+        assert np.array_equal(analysis.table, fresh.table)
+        assert analysis.attack_start == fresh.attack_start
+        assert np.array_equal(analysis.throughput_kbps, fresh.throughput_kbps)
+        assert analysis.rtts == fresh.rtts
+
+
+def test_cached_only_does_not_decode_the_capture(tmp_path):
+    options = {'cache_dir': str(tmp_path), 'max_duration': 20}
+    with raises(ValueError, match='is not in the cache'):
+        analyse_capture(
+            ATTACK_EXAMPLE,
+            SERVER_IP,
+            CLIENTS_IPS,
+            OPCUA_PORTS,
+            cached_only=True,
+            **options,
+        )
+    assert not list(tmp_path.iterdir())
+
+    stored = analyse_capture(
+        ATTACK_EXAMPLE, SERVER_IP, CLIENTS_IPS, OPCUA_PORTS, **options
+    )
+    cached = analyse_capture(
+        ATTACK_EXAMPLE,
+        SERVER_IP,
+        CLIENTS_IPS,
+        OPCUA_PORTS,
+        cached_only=True,
+        **options,
+    )
+
+    assert np.array_equal(cached.table, stored.table)
+    assert cached.rtts == stored.rtts
+
+
+def test_cache_key_depends_on_parameters(tmp_path):
+    for clients_ip in (CLIENTS_IPS, []):
+        analyse_capture(
+            ATTACK_EXAMPLE,
+            SERVER_IP,
+            clients_ip,
+            OPCUA_PORTS,
+            cache_dir=str(tmp_path),
+        )
+
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@mark.parametrize('rtt_key', ['tcp', 'mac'])
+def test_cached_table_is_paired_in_shards(tmp_path, rtt_key):
+    options = {'cache_dir': str(tmp_path), 'rtt_key': rtt_key}
+    stored = analyse_capture(
+        ATTACK_EXAMPLE, SERVER_IP, CLIENTS_IPS, OPCUA_PORTS, **options
+    )
+    cached = analyse_capture(
+        ATTACK_EXAMPLE,
+        SERVER_IP,
+        CLIENTS_IPS,
+        OPCUA_PORTS,
+        shards=3,
+        workers=2,
+        **options,
+    )
+
+    assert isinstance(cached.table, np.memmap)
+    assert cached.attack_start == stored.attack_start
+    assert np.array_equal(cached.throughput_kbps, stored.throughput_kbps)
+    assert cached.rtts == stored.rtts
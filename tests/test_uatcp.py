@@ -0,0 +1,242 @@
+import struct
+
+import numpy as np
+from pytest import mark
+
+from uanalyser.preprocessing.operations import (
+    RedundancyFilter,
+    count_services,
+    detect_service_flood,
+)
+from uanalyser.preprocessing.packet_table import build_packet_table
+from uanalyser.preprocessing.pcapng import iter_block_records
+from uanalyser.preprocessing.uatcp import (
+    MessageReassembler,
+    decode_message,
+    read_node_id,
+)
+
+ATTACK_EXAMPLE = 'tests/assets/0-dos_attack_example.pcapng'
+EXAMPLE = 'tests/assets/example.pcapng'
+SERVER_IP = '192.168.164.101'
+CLIENTS_IPS = ['192.168.164.102']
+OPCUA_PORTS = [4840, 4841, 49320, 62541, 4897, 53530, 48050, 4885, 4855, 26543]
+
+
+def chunk(message_type, chunk_type, request_id, service=0, body=b''):
+    """Build a symmetric secure conversation chunk, with a FourByte NodeId."""
+    node_id = struct.pack('<BBH', 1, 0, service) if service else b''
+    size = 24 + len(node_id) + len(body)
+    return (
+        message_type
+        + chunk_type
+        + struct.pack('<IIIII', size, 1, 2, 3, request_id)
+        + node_id
+        + body
+    )
+
+
+def test_opn_message_skips_asymmetric_header():
+    policy = b'http://opcfoundation.org/UA/SecurityPolicy#None'
+    message = (
+        b'OPNF'
+        + struct.pack('<II', 0, 0)
+        + struct.pack('<i', len(policy))
+        + policy
+        + struct.pack('<ii', -1, -1)
+        + struct.pack('<II', 51, 1)
+        + struct.pack('<BBH', 1, 0, 446)
+    )
+    message = message[:4] + struct.pack('<I', len(message)) + message[8:]
+
+    assert decode_message(message) == (
+        'OPN',
+        'F',
+        len(message),
+        0,
+        1,
+        446,
+    )
+
+
+@mark.parametrize(
+    'encoded, expected',
+    [
+        ('0077', (0, 119, 2)),
+        ('01027702', (2, 631, 4)),
+        ('020300a0860100', (3, 100000, 7)),
+        ('0300', None),
+        ('0100', None),
+    ],
+)
+def test_read_node_id(encoded, expected):
+    assert read_node_id(memoryview(bytes.fromhex(encoded)), 0) == expected
+
+
+def test_invalid_and_short_headers():
+    assert decode_message(b'GET / HTTP/1.1') is None
+    assert decode_message(b'MSGX\x20\x00\x00\x00') is None
+    assert decode_message(b'MSG') is None
+    assert decode_message(chunk(b'MSG', b'F', 7, 631)[:20]).request_id == -1
+
+
+def test_several_chunks_in_one_segment():
+    reassembler = MessageReassembler()
+    segment = chunk(b'MSG', b'F', 1, 631) + chunk(b'MSG', b'F', 2, 673)
+
+    messages = reassembler.feed('client', 0, segment)
+
+    assert [message.service_name for message in messages] == [
+        'ReadRequest',
+        'WriteRequest',
+    ]
+    assert reassembler.buffered == 0
+
+
+def test_chunks_split_over_segments():
+    reassembler = MessageReassembler()
+    segment = chunk(b'MSG', b'F', 1, 631, b'x' * 100) + chunk(
+        b'MSG', b'F', 2, 673
+    )
+
+    assert reassembler.feed('client', 10, segment[:50]) == []
+    assert reassembler.buffered == 50
+    messages = reassembler.feed('client', 60, segment[50:140])
+    assert [message.request_id for message in messages] == [1]
+    messages = reassembler.feed('client', 150, segment[140:])
+    assert [message.request_id for message in messages] == [2]
+    assert reassembler.buffered == 0
+
+
+def test_intermediate_chunks_keep_the_service_of_the_first():
+    reassembler = MessageReassembler()
+    segment = (
+        chunk(b'MSG', b'C', 1, 673, b'x' * 20)
+        + chunk(b'MSG', b'C', 1, body=b'\x01\x00\x77\x02')
+        + chunk(b'MSG', b'F', 1, body=b'\x01\x00\x77\x02')
+    )
+
+    messages = reassembler.feed('client', 0, segment)
+
+    assert [message.service for message in messages] == [673, 0, 0]
+
+
+def encrypted(message_type, chunk_type, seed):
+    """Build a chunk whose sequence header and body are ciphertext."""
+    ciphertext = np.random.default_rng(seed).bytes(40)
+    return (
+        message_type
+        + chunk_type
+        + struct.pack('<III', 16 + len(ciphertext), 1, 2)
+        + ciphertext
+    )
+
+
+def test_encrypted_chunks_have_no_request_nor_service():
+    reassembler = MessageReassembler()
+    chunks = [
+        encrypted(b'MSG', chunk_type, seed)
+        for seed, chunk_type in enumerate([b'C', b'C', b'F'] * 100)
+    ]
+
+    messages = reassembler.feed('client', 0, b''.join(chunks))
+
+    assert len(messages) == len(chunks)
+    assert {(message.request_id, message.service) for message in messages} == {
+        (-1, 0)
+    }
+    assert {decode_message(chunk).request_id for chunk in chunks} == {-1}
+    assert count_services([message.service for message in messages]) == {}
+
+
+def test_encrypted_opn_message():
+    policy = b'http://opcfoundation.org/UA/SecurityPolicy#Basic256Sha256'
+    message = (
+        b'OPNF'
+        + struct.pack('<II', 0, 0)
+        + struct.pack('<i', len(policy))
+        + policy
+        + struct.pack('<ii', -1, -1)
+        + np.random.default_rng(0).bytes(64)
+    )
+    message = message[:4] + struct.pack('<I', len(message)) + message[8:]
+
+    assert decode_message(message)[-2:] == (-1, 0)
+
+
+def test_retransmissions_and_gaps():
+    reassembler = MessageReassembler()
+    first = chunk(b'MSG', b'F', 1, 631)
+    second = chunk(b'MSG', b'F', 2, 673)
+    third = chunk(b'MSG', b'F', 3, 631)
+
+    assert len(reassembler.feed('client', 0, first)) == 1
+    assert reassembler.feed('client', 0, first) == []
+    # A retransmission carrying new bytes at its end
+    messages = reassembler.feed('client', 0, first + second)
+    assert [message.request_id for message in messages] == [2]
+    # After a gap, the reassembly resumes at the next chunk header
+    offset = len(first + second) + 5
+    assert reassembler.feed('client', offset, b'garbage') == []
+    assert reassembler.feed('client', offset + 7, third[:10]) == []
+    messages = reassembler.feed('client', offset + 17, third[10:])
+    assert [message.request_id for message in messages] == [3]
+
+
+def test_corrupted_stream_is_dropped():
+    reassembler = MessageReassembler(max_message_size=1024)
+    oversized = b'MSGF' + struct.pack('<I', 1 << 20)
+
+    assert reassembler.feed('client', 0, oversized) == []
+    assert reassembler.buffered == 0
+    assert reassembler._streams == {}
+
+
+def test_streams_are_bounded():
+    reassembler = MessageReassembler(max_streams=4)
+    for stream in range(100):
+        reassembler.feed(
+            stream, 0, chunk(b'MSG', b'F', 1, 631, b'x' * 10)[:30]
+        )
+
+    assert len(reassembler._streams) == 4
+    assert reassembler.buffered == 4 * 30
+
+
+@mark.parametrize('file_path', [ATTACK_EXAMPLE, EXAMPLE])
+def test_reassembled_services_match_packet_table(file_path):
+    reassembler = MessageReassembler()
+    services = []
+    for record in iter_block_records(file_path):
+        services.extend(
+            message.service for message in reassembler.feed_record(record)
+        )
+    table = build_packet_table(
+        iter_block_records(file_path),
+        SERVER_IP,
+        CLIENTS_IPS,
+        OPCUA_PORTS,
+        max_duration=None,
+        redundancy=RedundancyFilter('payload'),
+    )
+
+    # Every message of the captures fits in one segment, and the copies of
+    # the packets in the captures are skipped as retransmissions
+    assert count_services(services) == count_services(
+        table['service'][~table['redundant']]
+    )
+    assert reassembler.buffered == 0
+
+
+def test_service_flood():
+    times = np.arange(100) / 100
+    sources = np.where(np.arange(100) % 10, 1, 2)
+    services = np.full(100, 461)
+
+    assert detect_service_flood(times, sources, services, threshold=10) == [
+        [0.0, 1, 90]
+    ]
+    assert (
+        detect_service_flood(times, sources, np.full(100, 631), threshold=10)
+        == []
+    )
@@ -1,17 +1,358 @@
-from rich import print
-from rich.console import Console
-from rich.table import Table
-from typer import Argument, run
+"""
+Provides the command line interface of the analyser. Only typer is imported
+upfront: each command imports the modules it needs when it runs, and those
+import scapy, pandas, matplotlib and plotly lazily, so the light commands
+start fast enough to be run per file from shell loops.
 
-from uanalyser.preprocessing.file_handling import extract_attack_name
+The options of the analysis override the fields of the `--profile` file, see
+`load_profile`.
+"""
 
-console = Console()
+import os
+import subprocess
+import sys
 
+from typer import Argument, BadParameter, Exit, Option, Typer, echo
 
-def analyse_package():
-    table = Table(title='Extract attack name')
-    print(extract_attack_name('path/0-normal_traffic.pcapng'))
+# The modules of the analyser import each other from its directory, as when
+# main.py is run
+UANALYSER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if UANALYSER_DIR not in sys.path:
+    sys.path.insert(0, UANALYSER_DIR)
+
+app = Typer(
+    help='Traffic analyser for intrusion detection in OPC UA networks.',
+    no_args_is_help=True,
+)
+
+# The options shared by the commands
+PROFILE = Option(None, '--profile', help='The TOML or YAML profile file.')
+SERVERS = Option(None, '--server', help='An IP address of the OPC UA servers.')
+CLIENTS = Option(None, '--client', help='An IP address of the clients.')
+PORTS = Option(None, '--port', help='An OPC UA port.')
+START = Option(
+    None, help='The start of the window, in seconds after the first packet.'
+)
+END = Option(
+    None,
+    help='The end of the window, in seconds after the first packet; inf for the whole capture.',
+)
+DURATION = Option(
+    None, help='The duration of the window, in seconds, instead of its end.'
+)
+BUCKET = Option(None, help='The width of the time buckets, in seconds.')
+PRESET = Option(
+    None, help="The resolution of the images, 'preview' or 'publication'."
+)
+MAX_POINTS = Option(None, help='The budget of points of each RTT series.')
+FORMAT = Option(
+    'image',
+    '--format',
+    help="'image' for one image per chart, 'html' for one interactive report.",
+)
+PLOTS = Option(
+    True, '--plots/--no-plots', help='Whether to render the charts.'
+)
+EXPORT_DIR = Option(
+    None,
+    help='The directory the tables of the results are written to. Defaults to no export.',
+)
+EXPORT_FORMAT = Option(
+    'csv',
+    help="The format of the tables, 'csv', 'json' or 'parquet' (requires the parquet extra).",
+)
+CORPUS = Option(
+    None,
+    help='The SQLite file of the corpus index the summaries are stored in. Defaults to no index.',
+)
+OUTPUT_DIR = Option(
+    None,
+    help='The directory of the images. Defaults to the output directory of the analyser.',
+)
+
+
+def _profile(
+    profile_file, servers, clients, ports, start, end, duration, bucket
+):
+    """Load the profile of the analysis, overridden by the options."""
+    from preprocessing.profile import load_profile
+
+    # The options override the file, so one cannot replace the other there
+    if end is not None and duration is not None:
+        raise BadParameter('Give either --end or --duration.')
+    try:
+        return load_profile(
+            profile_file,
+            servers_ip=servers or None,
+            clients_ip=clients or None,
+            ports=ports or None,
+            start=start,
+            end=end,
+            duration=duration,
+            bucket=bucket,
+        )
+    except (FileNotFoundError, ValueError) as error:
+        raise BadParameter(str(error))
+
+
+def _run(function, *args, **kwargs):
+    """Run a function of the analyser, exiting with an error message if it fails on its input."""
+    try:
+        return function(*args, **kwargs)
+    except (FileNotFoundError, ImportError, ValueError) as error:
+        echo(f'Error: {error}', err=True)
+        raise Exit(1)
+
+
+def _output_dir(output_dir: str | None) -> dict:
+    """The output directory option of `main`, created if needed, or none to keep its default."""
+    if output_dir is None:
+        return {}
+    os.makedirs(output_dir, exist_ok=True)
+    return {'output_dir': output_dir}
+
+
+def _summary(result) -> str:
+    """One line of the summary of the results of a file, see `main`."""
+    summary = result.summary
+    return (
+        f'{summary["file"]}\t{summary["packets"]} packets\t'
+        f'{summary["duration"]:.1f} s\t{summary["capture"]}'
+    )
+
+
+@app.command()
+def attack(
+    pcapng_files: list[str] = Argument(..., help='The PCAPNG files.'),
+):
+    """Print the attack of each PCAPNG file, decoded from its name, as tab-separated lines."""
+    from preprocessing.file_handling import extract_attack_name
+
+    for pcapng_file in pcapng_files:
+        attack = _run(extract_attack_name, pcapng_file)
+        echo(f'{pcapng_file}\t{attack["Type"]}\t{attack["Name"]}')
+
+
+@app.command()
+def analyse(
+    pcapng_file: str = Argument(..., help='The PCAPNG file.'),
+    profile: str = PROFILE,
+    servers: list[str] = SERVERS,
+    clients: list[str] = CLIENTS,
+    ports: list[int] = PORTS,
+    start: float = START,
+    end: float = END,
+    duration: float = DURATION,
+    bucket: float = BUCKET,
+    workers: int = Option(
+        1, help='The number of shards of the file analysed in parallel.'
+    ),
+    preset: str = PRESET,
+    max_points: int = MAX_POINTS,
+    output_format: str = FORMAT,
+    plots: bool = PLOTS,
+    output_dir: str = OUTPUT_DIR,
+    export_dir: str = EXPORT_DIR,
+    export_format: str = EXPORT_FORMAT,
+    corpus: str = CORPUS,
+    output_name: str = Option(
+        None, help='The name of the output images, without suffix.'
+    ),
+):
+    """Analyse a PCAPNG file and render its charts."""
+    from main import main
+
+    result = _run(
+        main,
+        pcapng_file,
+        profile=_profile(
+            profile, servers, clients, ports, start, end, duration, bucket
+        ),
+        output_name=output_name,
+        shards=workers,
+        preset=preset,
+        max_points=max_points,
+        backend=output_format,
+        plots=plots,
+        export_dir=export_dir,
+        export_format=export_format,
+        corpus=corpus,
+        **_output_dir(output_dir),
+    )
+    echo(_summary(result))
+    for path in result.images + result.exports:
+        echo(path)
+
+
+@app.command()
+def batch(
+    data_dir: str = Argument(..., help='The directory of the PCAPNG files.'),
+    profile: str = PROFILE,
+    servers: list[str] = SERVERS,
+    clients: list[str] = CLIENTS,
+    ports: list[int] = PORTS,
+    start: float = START,
+    end: float = END,
+    duration: float = DURATION,
+    bucket: float = BUCKET,
+    workers: int = Option(
+        None,
+        help='The number of worker processes. Defaults to the number of CPUs.',
+    ),
+    preset: str = PRESET,
+    max_points: int = MAX_POINTS,
+    output_format: str = FORMAT,
+    plots: bool = PLOTS,
+    output_dir: str = OUTPUT_DIR,
+    export_dir: str = EXPORT_DIR,
+    export_format: str = EXPORT_FORMAT,
+    corpus: str = CORPUS,
+):
+    """Analyse all the PCAPNG files of a directory in parallel.
+
+    With a corpus index, the files analysed with the same profile since they
+    last changed are skipped.
+    """
+    from main import process_all_pcapng_files
+
+    results = _run(
+        process_all_pcapng_files,
+        data_dir,
+        profile=_profile(
+            profile, servers, clients, ports, start, end, duration, bucket
+        ),
+        workers=workers,
+        preset=preset,
+        max_points=max_points,
+        backend=output_format,
+        plots=plots,
+        export_dir=export_dir,
+        export_format=export_format,
+        corpus=corpus,
+        **_output_dir(output_dir),
+    )
+    failures = 0
+    for name, result in sorted(results.items()):
+        if isinstance(result, Exception):
+            failures += 1
+            echo(f'{name}\tfailed: {result}', err=True)
+        else:
+            echo(_summary(result))
+    if failures:
+        raise Exit(1)
+
+
+@app.command()
+def plot(
+    pcapng_file: str = Argument(..., help='The PCAPNG file.'),
+    profile: str = PROFILE,
+    servers: list[str] = SERVERS,
+    clients: list[str] = CLIENTS,
+    ports: list[int] = PORTS,
+    start: float = START,
+    end: float = END,
+    duration: float = DURATION,
+    bucket: float = BUCKET,
+    preset: str = PRESET,
+    max_points: int = MAX_POINTS,
+    output_format: str = FORMAT,
+    output_dir: str = OUTPUT_DIR,
+    output_name: str = Option(
+        None, help='The name of the output images, without suffix.'
+    ),
+):
+    """Render the charts of a PCAPNG file again, from its cached packet table.
+
+    The file must have been analysed with the same profile before: it is not
+    decoded again.
+    """
+    from main import main
+
+    result = _run(
+        main,
+        pcapng_file,
+        profile=_profile(
+            profile, servers, clients, ports, start, end, duration, bucket
+        ),
+        output_name=output_name,
+        preset=preset,
+        max_points=max_points,
+        backend=output_format,
+        cached_only=True,
+        **_output_dir(output_dir),
+    )
+    for path in result.images + result.exports:
+        echo(path)
+
+
+@app.command()
+def corpus(
+    corpus_file: str = Argument(
+        ..., help='The SQLite file of the corpus index.'
+    ),
+    by: str = Option(
+        'mode',
+        help="'mode' for the RTTs of each security mode, 'attack' for the throughput of each attack, 'capture' for the summary of each capture.",
+    ),
+):
+    """Compare the captures of a corpus index, as tab-separated lines."""
+    from preprocessing.corpus import CorpusIndex
+
+    if not os.path.isfile(corpus_file):
+        raise BadParameter(f'No such file or directory: "{corpus_file}".')
+    queries = {
+        'mode': CorpusIndex.rtt_by_security_mode,
+        'attack': CorpusIndex.throughput_by_attack,
+        'capture': CorpusIndex.summaries,
+    }
+    if by not in queries:
+        raise BadParameter(
+            f"Invalid comparison: '{by}'. Acceptable values are: {list(queries)}"
+        )
+    with CorpusIndex(corpus_file) as index:
+        table = queries[by](index)
+    echo(table.to_csv(sep='\t', float_format='%.3f').rstrip('\n'))
+
+
+@app.command()
+def bench(
+    names: list[str] = Argument(
+        None, help='Run only the benchmarks matching these names.'
+    ),
+    packets: str = Option(
+        None,
+        help='The sizes of the synthetic captures, as comma-separated numbers of packets. Defaults to 10000,100000.',
+    ),
+    update_baseline: bool = Option(
+        False,
+        '--update-baseline',
+        help='Store the measures as the baseline instead of checking them against it.',
+    ),
+):
+    """Run the benchmarks of the analyser, and print their measures.
+
+    The preprocessing benchmarks fail when a stage regresses past its stored
+    baseline.
+    """
+    from paths import TESTS
+
+    benchmarks = os.path.join(TESTS, 'benchmarks')
+    if not os.path.isdir(benchmarks):
+        raise BadParameter(f'No such file or directory: "{benchmarks}".')
+    command = [sys.executable, '-m', 'pytest', '-m', 'benchmark', '-s']
+    if names:
+        command += ['-k', ' or '.join(names)]
+    env = dict(os.environ)
+    if packets:
+        env['UANALYSER_BENCH_PACKETS'] = packets
+    if update_baseline:
+        env['UANALYSER_BENCH_UPDATE'] = '1'
+    raise Exit(
+        subprocess.run(
+            command + [benchmarks], cwd=os.path.dirname(TESTS), env=env
+        ).returncode
+    )
 
 
 if __name__ == '__main__':
-    run(analyse_package)
+    app()
@@ -0,0 +1,82 @@
+"""
+Provides the lazy imports of the heavy dependencies: scapy, pandas,
+matplotlib and plotly are only imported when a command uses them, so the
+commands that do not, such as extracting the name of an attack, start fast.
+"""
+
+import importlib
+from types import ModuleType
+
+# The minimal scapy modules: the layers dissected by the analyser, which
+# register themselves when imported, then the readers and the sniffer. The
+# names are looked up in this order
+SCAPY_LAYERS = ('scapy.layers.l2', 'scapy.layers.inet')
+SCAPY_MODULES = (
+    'scapy.packet',
+    'scapy.plist',
+    'scapy.utils',
+    'scapy.error',
+    'scapy.sendrecv',
+)
+
+
+class LazyModule(ModuleType):
+    """A module imported on the first access to one of its attributes.
+
+    Several modules can be gathered in one: the attributes are looked up in
+    each of them in order, importing them one by one until one has it, and
+    the `preload` modules are imported before the first lookup.
+
+    Examples:
+        >>> statistics = LazyModule('statistics')
+        >>> statistics
+        <lazy module 'statistics'>
+        >>> statistics.mean([1, 2, 3])
+        2
+    """
+
+    def __init__(self, *names: str, preload: tuple = ()):
+        super().__init__(names[0])
+        self.__names = names
+        self.__preload = preload
+        self.__modules = []
+
+    def __getattr__(self, name: str):
+        # The dunder lookups of copy, pickle or doctest must not import
+        if name.startswith('__'):
+            raise AttributeError(name)
+        # The values are not kept, so the attributes patched on the modules
+        # are seen as with a regular import
+        for module in self.__modules:
+            if hasattr(module, name):
+                return getattr(module, name)
+        for module in self.__preload:
+            importlib.import_module(module)
+        for module in self.__names[len(self.__modules) :]:
+            module = importlib.import_module(module)
+            self.__modules.append(module)
+            if hasattr(module, name):
+                return getattr(module, name)
+        raise AttributeError(
+            f"module '{self.__name__}' has no attribute '{name}'"
+        )
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self.__name__}'>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Import a module on the first access to one of its attributes.
+
+    Args:
+        name: The name of the module.
+
+    Returns:
+        The module, to be used as the imported one.
+    """
+    return LazyModule(name)
+
+
+# The scapy names used by the analyser, such as `scapy.IP` or
+# `scapy.RawPcapNgReader`, without the half a second of `scapy.all`
+scapy = LazyModule(*SCAPY_LAYERS, *SCAPY_MODULES, preload=SCAPY_LAYERS)
@@ -1,164 +1,480 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-import scapy.all as scapy
 from paths import *
 from plot.graphics import *
+from plot.performance import *
+from plot.rendering import *
+from preprocessing.alignment import *
+from preprocessing.corpus import *
+from preprocessing.export import *
 from preprocessing.file_handling import *
+from preprocessing.live import *
 from preprocessing.operations import *
+from preprocessing.packet_table import *
+from preprocessing.profile import *
+from preprocessing.sharding import *
 
-SERVER_IP = '192.168.164.101'
-CLIENTS_IPS = ['192.168.164.102']
-OPCUA_PORTS = [4840, 4841, 49320, 62541, 4897, 53530, 48050, 4885, 4855, 26543]
 # PCAPNG = f'{DATA_PCAPNG}/0-dos_certificate_inf_chain_loop.pcapng'
 
 
-def main(pcapng_file, *, show_plots=False):
+def analyse_profile(pcapng_file, profile, *, shards=1, cached_only=False):
     """
-    Entry point of the program.
+    Analyse a PCAPNG file with the topology, ports and window of a profile.
 
-    This function analyzes a PCAPNG file containing network traffic data.
-    It extracts the attack name, opens the file, and performs various calculations and plotting.
+    The packet table is cached on disk, and the packet-time index of the file is kept in the cache too.
+
+    Args:
+        pcapng_file (str): The PCAPNG file to analyse.
+        profile (AnalysisProfile): The profile of the analysis.
+        shards (int): The number of shards of the file analysed in parallel. Defaults to 1.
+        cached_only (bool): Whether to only start from the cached packet table, without decoding the file. Defaults to False.
 
     Returns:
-        None
+        CaptureAnalysis: The analysis of the file.
+
+    Raises:
+        ValueError: If `cached_only` is set and the packet table of the file with this profile is not cached.
     """
+    return analyse_capture(
+        pcapng_file,
+        profile.servers_ip,
+        profile.clients_ip,
+        profile.ports,
+        shards=shards,
+        start=profile.start,
+        max_duration=profile.duration,
+        redundancy_key=profile.redundancy_key,
+        bucket=profile.bucket,
+        cache_dir=CACHE,
+        cached_only=cached_only,
+        use_index=True,
+        index_dir=CACHE,
+    )
 
-    # Local variables
-    chronology_packets = []
 
-    # Extract the attack name
-    attack = extract_attack_name(pcapng_file)
+def main(
+    pcapng_file,
+    *,
+    profile=None,
+    show_plots=False,
+    output_name=None,
+    shards=1,
+    preset=None,
+    max_points=None,
+    backend='image',
+    plots=True,
+    cached_only=False,
+    output_dir=OUTPUT,
+    export_dir=None,
+    export_format='csv',
+    corpus=None,
+):
+    """
+    Entry point of the program.
 
-    # Open File
-    capture = open_pcapng_file(pcapng_file)
-    # capture = clear_redundant_data(capture)
-    capture_length = len(capture)
-    # capture_length = 20
+    This function analyzes a PCAPNG file containing network traffic data.
+    It extracts the attack name, builds the packet table of the file in a single pass, and performs various calculations and plotting.
 
-    for index in range(capture_length):
-        packet = capture[index]
-        first_packet = capture[0]
+    Args:
+        pcapng_file (str): The PCAPNG file to analyse.
+        profile (AnalysisProfile, optional): The topology, ports and time window of the analysis. Defaults to `AnalysisProfile()`, the first minute of the capture on the reference test bench.
+        show_plots (bool): Flag indicating whether the plots should be shown.
+        output_name (str, optional): The name of the output images, without suffix. Defaults to the name decoded from the attack.
+        shards (int): The number of shards of the file analysed in parallel. Defaults to 1.
+        preset (str | RenderPreset, optional): The resolution and format of the images, 'preview' or 'publication'. Defaults to the publication preset.
+        max_points (int, optional): The budget of points of each RTT series, which are decimated to it keeping their extremes. Defaults to all the points.
+        backend (str): 'image' for one image per chart, or 'html' for one interactive report with all the charts. Defaults to 'image'.
+        plots (bool): Whether to render the charts. Defaults to True; without them, only the analysis is made and its summary returned.
+        cached_only (bool): Whether to only start from the cached packet table, without decoding the file, such as to plot it again. Defaults to False.
+        output_dir (str): The directory of the images. Defaults to the output directory of the analyser.
+        export_dir (str, optional): The directory the tables of the results are written to, see `export_result`. Defaults to no export.
+        export_format (str): The format of the tables, 'csv', 'json' or 'parquet'. Defaults to 'csv'. Parquet requires pyarrow, the `parquet` extra.
+        corpus (str, optional): The SQLite file of the corpus index the summary is stored in, see `CorpusIndex`. Defaults to no index.
 
-        # Cut the traffic in 1 minute (60 seconds)
-        if packet.time - first_packet.time > 60:
-            break
+    Returns:
+        CaptureResult: The results of the analysis: its summary, its series per time bucket, its RTTs, its OPC UA services and the sources flooding the server, with the paths of the images and of the exported tables, see `capture_result`.
 
-        # Calculate the relative time of each packet
-        relative_time = calculate_package_time_difference(packet, first_packet)
+    Raises:
+        ValueError: If an unacceptable preset, backend or export format is provided, or if `cached_only` is set and the file was not analysed with this profile before.
+        ImportError: If the tables are exported to Parquet and pyarrow is missing.
+    """
 
-        # Define the type of the package: request or response
-        comm_type = define_communication_type(packet, SERVER_IP, CLIENTS_IPS)
+    profile = profile or AnalysisProfile()
+    preset = get_preset(preset)
+    if backend not in CHART_BACKENDS:
+        raise ValueError(
+            f"Invalid chart backend: '{backend}'. Acceptable values are: {list(CHART_BACKENDS)}"
+        )
+    if export_dir is not None:
+        check_export_format(export_format)
+    # Without a display, render with the non-interactive backend
+    if plots:
+        use_headless_backend()
 
-        # Clear reduntant data and flag OPC UA packets
-        if index < 1:
-            opcua_flag = is_opcua_packet(packet, OPCUA_PORTS)
-            chronology_packets.append(
-                [index, 0, packet.src, packet.dst, comm_type, opcua_flag]
-            )
-        if not any(
-            relative_time == sublist[1] for sublist in chronology_packets
-        ):
-            opcua_flag = is_opcua_packet(packet, OPCUA_PORTS)
-            chronology_packets.append(
-                [
-                    index,
-                    relative_time,
-                    packet.src,
-                    packet.dst,
-                    comm_type,
-                    opcua_flag,
-                ]
-            )
+    # Extract the attack name
+    attack = extract_attack_name(pcapng_file)
+    # The version of the file analysed, as it may change meanwhile
+    identity = file_identity(pcapng_file) if corpus is not None else None
 
-        # TODO: Add an exception here
-        # Detect the attack
-        if (
-            detect_opcua_attack(packet, SERVER_IP, CLIENTS_IPS)
-            and 'Packet index' not in attack
-        ):
-            attack['Relative time'] = relative_time
-            attack['Packet index'] = index
-
-    # Calculate the throughput in kbps and the packets per second
-    period = chronology_packets[-1][1]
-    throughput_kbps, opcua_packets_per_second = calculate_throughput_and_packets(
-        capture, chronology_packets, period
+    # Build the packet table over the decoded headers of the streamed file,
+    # cutting the traffic to the window of the profile, clear the redundant
+    # data, and calculate the throughput in kbps, the packets per second and
+    # the cycle time, one shard of the file per worker. The packet table is
+    # cached on disk, so the file is only decoded the first time, and the
+    # packet-time index of the file jumps straight to the window
+    analysis = analyse_profile(
+        pcapng_file, profile, shards=shards, cached_only=cached_only
     )
+
+    # Detect the attack
+    if analysis.attack_start is not None:
+        attack['Relative time'], attack['Packet index'] = analysis.attack_start
+
+    table = analysis.table[~analysis.table['redundant']]
+    throughput_kbps = analysis.throughput_kbps.tolist()
+    opcua_packets_per_second = analysis.opcua_packets_per_second.astype(
+        int
+    ).tolist()
     seconds = list(range(1, len(throughput_kbps) + 1))
-    number_of_packets = len(chronology_packets)
+    number_of_packets = len(table)
     filename = GraphUtils.decode_attack_to_file_name(attack)
 
-    # Calculate the cycle time
-    rtts_client_server = calculate_round_trip_time(chronology_packets, 'C-S')
-    rtts_attacker_server = calculate_round_trip_time(chronology_packets, 'A-S')
+    rtts_client_server = analysis.rtts['C-S']
+    rtts_attacker_server = analysis.rtts['A-S']
 
-    # Check if performance data CSV file exists before plotting performance data
-    csv_file = f'{DATA_PERF}/{filename}.csv'
-    if os.path.exists(csv_file):
-        plot_performance_data(
-            seconds, attack, filename, is_twiny=False, show_plots=show_plots
+    # Render the charts, with the performance one only if the performance
+    # data of the host was recorded. It is parsed once per process, and its
+    # columnar copy is kept in the cache
+    images = []
+    if plots:
+        charts = Charts(
+            attack,
+            filename,
+            seconds,
+            throughput_kbps,
+            opcua_packets_per_second,
+            rtts_client_server,
+            rtts_attacker_server,
+            number_of_packets,
+            performance_data=find_performance_data(
+                filename, columnar_dir=CACHE
+            ),
+            output_name=output_name,
+        )
+        images = render_charts(
+            charts,
+            preset=preset,
+            show_plots=show_plots,
+            max_points=max_points,
+            backend=backend,
+            output_dir=output_dir,
         )
 
-    plot_round_trip_time_per_packet(
-        rtts_client_server,
-        number_of_packets,
-        attack,
-        filename,
-        attacker_rtts=rtts_attacker_server,
-        performance=False,
-        show_plots=show_plots,
-    )
-    plot_round_trip_time_per_second(
-        rtts_client_server,
-        seconds,
+        # Don't close the plot window
+        if show_plots:
+            plt.show()
+
+    # Keep the numbers, in tables with the same schema for every capture
+    result = capture_result(
+        analysis,
         attack,
-        filename,
-        attacker_rtts=rtts_attacker_server,
-        performance=False,
-        show_plots=show_plots,
+        file=pcapng_file,
+        capture=output_name or filename,
+        start=profile.start,
+        bucket=profile.bucket,
     )
-    plot_throughput(
-        throughput_kbps,
-        seconds,
-        attack,
-        filename,
-        performance=False,
-        show_plots=show_plots,
+    exports = []
+    if export_dir is not None:
+        exports = export_result(result, export_dir, format=export_format)
+    if corpus is not None:
+        with CorpusIndex(corpus) as index:
+            index.update(result, profile, identity=identity)
+    return result._replace(images=images, exports=exports)
+
+
+def live(pcapng_file=None, *, profile=None, iface=None, window=60, tick=1.0):
+    """
+    Monitor OPC UA traffic as it happens.
+
+    The packets come from a PCAPNG file being written, such as the ring buffer of a capture tool, or straight from a network interface. Every tick, the throughput, the OPC UA packets per second, the mean RTT and the attack signal of the last `window` seconds are printed.
+
+    Args:
+        pcapng_file (str, optional): The PCAPNG file to follow. Defaults to capturing `iface`.
+        profile (AnalysisProfile, optional): The topology, ports, bucket width and redundancy key of the monitoring. Defaults to `AnalysisProfile()`.
+        iface (str, optional): The interface to capture when no file is given. Defaults to the default interface of scapy.
+        window (float): The duration of the sliding window, in seconds.
+        tick (float): The interval between reports, in seconds.
+    """
+    if pcapng_file is not None:
+        source = follow_pcapng_records(pcapng_file)
+    else:
+        source = sniff_records(iface)
+    profile = profile or AnalysisProfile()
+    monitor = LiveMonitor(
+        profile.servers_ip,
+        profile.clients_ip,
+        profile.ports,
+        window=window,
+        bucket=profile.bucket,
+        redundancy_key=profile.redundancy_key,
     )
-    plot_packets_per_second(
-        opcua_packets_per_second,
-        seconds,
-        attack,
-        filename,
-        performance=False,
-        show_plots=show_plots,
+
+    def report(snapshot):
+        rtts = [rtt for _, rtt in snapshot.rtts['C-S']]
+        mean_rtt = sum(rtts) / len(rtts) if rtts else float('nan')
+        print(
+            f'[{snapshot.time:8.1f} s] '
+            f'{snapshot.throughput_kbps[-1]:8.2f} kbps | '
+            f'{int(snapshot.opcua_packets_per_second[-1]):5d} OPC UA packets/s | '
+            f'RTT C-S {mean_rtt:7.2f} ms | '
+            f'{"ATTACK" if snapshot.under_attack else "normal"}'
+        )
+
+    try:
+        run_live(source, monitor, report, tick=tick)
+    except KeyboardInterrupt:
+        pass
+
+
+def unique_output_names(files):
+    """
+    Give each pcapng file a distinct output name.
+
+    The output name is decoded from the attack, so files in different
+    directories, or whose names only differ in case, would overwrite each
+    other's images. Repeated names get a numeric suffix. Files whose name
+    cannot be decoded are left out.
+
+    Args:
+        files (list): The pcapng files.
+
+    Returns:
+        dict: The output name of each file.
+
+    Examples:
+        >>> unique_output_names(['0-DoS.pcapng', 'other/0-dos.pcapng', '1-dos.pcapng', 'example.pcapng'])
+        {'0-DoS.pcapng': '0-dos', 'other/0-dos.pcapng': '0-dos-2', '1-dos.pcapng': '1-dos'}
+    """
+    names = {}
+    counts = {}
+    for pcapng_file in files:
+        try:
+            attack = extract_attack_name(pcapng_file)
+        except ValueError:
+            continue
+        name = GraphUtils.decode_attack_to_file_name(attack)
+        counts[name] = counts.get(name, 0) + 1
+        names[pcapng_file] = (
+            name if counts[name] == 1 else f'{name}-{counts[name]}'
+        )
+    return names
+
+
+def process_all_pcapng_files(
+    data_dir,
+    *,
+    profile=None,
+    workers=None,
+    preset=None,
+    max_points=None,
+    backend='image',
+    plots=True,
+    output_dir=OUTPUT,
+    export_dir=None,
+    export_format='csv',
+    corpus=None,
+):
+    """
+    Process all the pcapng files in a directory in parallel.
+
+    Each file is analysed by `main` in a pool of worker processes, which render
+    their plots with the non-interactive Agg backend. A file that fails is
+    reported and does not stop the batch. The figures of the plots are reused
+    from one file to the next of a worker. The RTTs of each packet are left
+    out of the results sent back by the workers: they are in the exports.
+
+    With a corpus index, the files analysed with the same profile since they
+    last changed are skipped, and the summary of each file analysed is stored
+    in the index as its results come back.
+
+    Args:
+        data_dir (str): The directory containing the pcapng files.
+        profile (AnalysisProfile, optional): The profile of the analysis of every file, see `main`.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        preset (str | RenderPreset, optional): The resolution and format of the images, see `main`.
+        max_points (int, optional): The budget of points of each RTT series, see `main`.
+        backend (str, optional): 'image' or 'html', see `main`.
+        plots (bool, optional): Whether to render the charts, see `main`.
+        output_dir (str, optional): The directory of the images, see `main`.
+        export_dir (str, optional): The directory the tables of the results are written to, see `main`.
+        export_format (str, optional): The format of the tables, see `main`.
+        corpus (str, optional): The SQLite file of the corpus index, see `CorpusIndex`. Defaults to no index.
+
+    Returns:
+        dict: The results returned by `main` for each file name analysed, without their RTTs, or the exception raised while analysing it. The files skipped as up to date in the corpus index are left out.
+    """
+    if export_dir is not None:
+        check_export_format(export_format)
+    profile = profile or AnalysisProfile()
+    files = sorted(
+        item for item in os.listdir(data_dir) if item.endswith('.pcapng')
     )
+    output_names = unique_output_names(files)
+    results = {}
+
+    # Only the workers analyse, and only this process writes to the index
+    index = CorpusIndex(corpus) if corpus is not None else None
+    identities = {}
+    if index is not None:
+        stale = set(
+            index.stale_files(
+                [os.path.join(data_dir, elem) for elem in files], profile
+            )
+        )
+        skipped = [
+            elem for elem in files if os.path.join(data_dir, elem) not in stale
+        ]
+        for elem in skipped:
+            print(f'{elem}: unchanged')
+        files = [elem for elem in files if elem not in skipped]
+        identities = {
+            elem: file_identity(os.path.join(data_dir, elem)) for elem in files
+        }
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=use_headless_backend,
+        initargs=(True,),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _batch_main,
+                os.path.join(data_dir, elem),
+                profile=profile,
+                show_plots=False,
+                output_name=output_names.get(elem),
+                preset=preset,
+                max_points=max_points,
+                backend=backend,
+                plots=plots,
+                output_dir=output_dir,
+                export_dir=export_dir,
+                export_format=export_format,
+            ): elem
+            for elem in files
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            elem = futures[future]
+            try:
+                results[elem] = future.result()
+                status = 'done'
+            except Exception as error:
+                results[elem] = error
+                status = f'failed ({type(error).__name__}: {error})'
+            else:
+                if index is not None:
+                    index.update(
+                        results[elem], profile, identity=identities[elem]
+                    )
+            print(f'[{done}/{len(files)}] {elem}: {status}')
+    if index is not None:
+        index.close()
+
+    failed = [
+        elem
+        for elem, result in results.items()
+        if isinstance(result, Exception)
+    ]
+    print(f'{len(files) - len(failed)} of {len(files)} files processed.')
+    return results
+
+
+def _batch_main(pcapng_file, **options):
+    """
+    Run `main` in a worker of a batch, and send back its results without the RTTs.
+    """
+    return main(pcapng_file, **options)._replace(rtts=None)
+
 
-    # Don't close the plot window
-    if show_plots:
-        plt.show()
+def _capture_series(pcapng_file, profile):
+    """Gather the network metrics, the host telemetry and its offset of a file, **None** without telemetry."""
+    try:
+        attack = extract_attack_name(pcapng_file)
+    except ValueError:
+        return None
+    telemetry = find_performance_data(
+        GraphUtils.decode_attack_to_file_name(attack), columnar_dir=CACHE
+    )
+    if telemetry is None:
+        return None
+    analysis = analyse_profile(pcapng_file, profile)
+    # The buckets of a window start at its start, the telemetry at the start
+    # of the capture
+    return (
+        network_series(analysis, bucket=profile.bucket),
+        telemetry,
+        profile.start,
+    )
 
 
-def process_all_pcapng_files(data_dir):
+def correlate_all_pcapng_files(
+    data_dir,
+    *,
+    profile=None,
+    workers=None,
+    signal='attack_packets',
+    max_lag=10.0,
+    method='interpolate',
+):
     """
-    Process all the pcapng files in a directory.
+    Correlate the network metrics of all the pcapng files in a directory with the telemetry of the host.
+
+    The files are analysed in parallel, as in `process_all_pcapng_files`,
+    their cached packet tables being reused. The files without performance
+    data or whose name cannot be decoded are left out.
 
     Args:
         data_dir (str): The directory containing the pcapng files.
+        profile (AnalysisProfile, optional): The profile of the analysis of every file, see `main`.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        signal (str): The network metric correlated with the telemetry, one of `NETWORK_COLUMNS`.
+        max_lag (float): The largest lag of the correlations, in seconds.
+        method (str): How the telemetry is resampled on the time buckets, see `align_telemetry`.
 
     Returns:
-        None
+        pd.DataFrame: One row per file, see `correlate_corpus`.
     """
-    files = os.listdir(data_dir)
-    files = [item for item in files if item.endswith('.pcapng')]
-
-    for elem in files:
-        # global PCAPNG
-        # PCAPNG = os.path.join(data_dir, elem)
-        pcapng_file = os.path.join(data_dir, elem)
-        # print(f'Processing {pcapng_file}')
-        print(pcapng_file.split('/')[-1])
-        # main(pcapng_file, show_plots=False)
+    profile = profile or AnalysisProfile()
+    files = sorted(
+        item for item in os.listdir(data_dir) if item.endswith('.pcapng')
+    )
+    captures = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                _capture_series, os.path.join(data_dir, elem), profile
+            ): elem
+            for elem in files
+        }
+        for future in as_completed(futures):
+            elem = futures[future]
+            try:
+                series = future.result()
+            except Exception as error:
+                print(f'{elem}: failed ({type(error).__name__}: {error})')
+                continue
+            if series is not None:
+                captures[elem] = series
+
+    return correlate_corpus(
+        dict(sorted(captures.items())),
+        signal=signal,
+        max_lag=max_lag,
+        bucket=profile.bucket,
+        method=method,
+    ).rename_axis('File')
 
 
 if __name__ == '__main__':
@@ -17,6 +17,7 @@ __all__ = [
     'DOCS',
     'DOCS_ASSETS',
     'OUTPUT',
+    'CACHE',
 ]
 
 UANALYSER = os.path.dirname(os.path.abspath(__file__))
@@ -30,3 +31,4 @@ TESTS_ASSETS = os.path.join(TESTS, 'assets')
 DOCS = os.path.join(ROOT, 'docs')
 DOCS_ASSETS = os.path.join(DOCS, 'assets')
 OUTPUT = os.path.join(UANALYSER, 'output')
+CACHE = os.path.join(TEMP, 'uanalyser-cache')
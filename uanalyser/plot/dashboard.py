@@ -0,0 +1,267 @@
+"""
+Provides the interactive output of the charts: one self-contained HTML
+report per capture, drawn by plotly with WebGL traces. The series are
+embedded as base64 typed arrays instead of JSON lists of numbers, so the
+report stays small and fast to open with millions of RTT points.
+"""
+
+from __future__ import annotations
+
+import base64
+
+import numpy as np
+from lazy import lazy_import
+from paths import OUTPUT
+from plot.decimation import decimate
+
+go = lazy_import('plotly.graph_objects')
+pio = lazy_import('plotly.io')
+subplots = lazy_import('plotly.subplots')
+
+# The typed arrays plotly.js decodes, by numpy dtype
+TYPED_ARRAY_DTYPES = {
+    np.dtype(np.float64): 'f8',
+    np.dtype(np.float32): 'f4',
+    np.dtype(np.int32): 'i4',
+    np.dtype(np.uint32): 'u4',
+    np.dtype(np.int16): 'i2',
+    np.dtype(np.uint16): 'u2',
+    np.dtype(np.int8): 'i1',
+    np.dtype(np.uint8): 'u1',
+}
+DASHBOARD_SUFFIX = '.html'
+
+
+def encode_array(values: np.ndarray) -> dict:
+    """Encode a series as a plotly.js typed array.
+
+    The 64-bit integers, which plotly.js cannot decode, are narrowed to 32
+    bits when they fit and widened to 64-bit floats otherwise.
+
+    Args:
+        values: The series.
+
+    Returns:
+        The typed array specification, with the dtype and the base64 little-endian bytes of the series.
+
+    Examples:
+        >>> encode_array(np.array([1.0, 2.0]))
+        {'dtype': 'f8', 'bdata': 'AAAAAAAA8D8AAAAAAAAAQA=='}
+        >>> encode_array([1, 2, 3])['dtype']
+        'i4'
+    """
+    values = np.asarray(values)
+    dtype = values.dtype.newbyteorder('=')
+    if dtype not in TYPED_ARRAY_DTYPES:
+        if dtype.kind in 'iub' and (
+            not values.size
+            or (values.min() >= -(2**31) and values.max() < 2**31)
+        ):
+            dtype = np.dtype(np.int32)
+        else:
+            dtype = np.dtype(np.float64)
+    values = np.ascontiguousarray(values, dtype=dtype.newbyteorder('<'))
+    return {
+        'dtype': TYPED_ARRAY_DTYPES[dtype],
+        'bdata': base64.b64encode(values).decode(),
+    }
+
+
+def dashboard_figure(charts, *, max_points: int | None = None) -> dict:
+    """Build the interactive report of the analysis of a capture.
+
+    The report stacks the throughput, the OPC UA packets per second, the RTT
+    of each exchange and the mean RTT of each second, plus the performance
+    of the host when it was recorded. The RTTs are not normalized as on the
+    static charts: they are drawn in milliseconds on a logarithmic axis.
+
+    Args:
+        charts (Charts): The data of the charts, see `render_charts`.
+        max_points (int): The budget of points of each RTT series, see `decimate`. Defaults to all the points.
+
+    Returns:
+        dict: The plotly figure, with its series encoded by `encode_array`.
+
+    Examples:
+        >>> from plot.graphics import Charts
+        >>> attack = {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE', 'Relative time': 1.5, 'Packet index': 3}
+        >>> charts = Charts(attack, '0-dos_attack_example', [1, 2], [0.5, 1.0], [3, 4], [[1, 0.1, 2.0], [3, 1.2, 4.0]], [], 4)
+        >>> figure = dashboard_figure(charts)
+        >>> [trace['name'] for trace in figure['data']]
+        ['Throughput (KBps)', 'Pacotes OPC UA', 'RTT Cliente-Servidor', 'RTT Invasor-Servidor', 'RTT Cliente-Servidor', 'RTT Invasor-Servidor']
+        >>> figure['data'][2]['x']['dtype'], figure['data'][2]['y']['dtype']
+        ('i4', 'f4')
+    """
+    titles = [
+        'Throughput',
+        'Pacotes por segundo',
+        'Round trip time (pacote)',
+        'Round trip time (tempo)',
+    ]
+    if charts.performance_data is not None:
+        titles.append('Desempenho do host (servidor)')
+    fig = subplots.make_subplots(
+        rows=len(titles),
+        cols=1,
+        subplot_titles=titles,
+        vertical_spacing=0.3 / len(titles),
+    )
+    series = []
+
+    def add(trace, row, x, y):
+        fig.add_trace(trace, row=row, col=1)
+        series.append((x, y))
+
+    seconds = np.asarray(charts.seconds, dtype=np.float64)
+    add(
+        go.Scattergl(
+            name='Throughput (KBps)',
+            mode='lines+markers',
+            line_color='#277DA1',
+        ),
+        1,
+        seconds,
+        np.asarray(charts.throughput_kbps, dtype=np.float64),
+    )
+    add(
+        go.Bar(name='Pacotes OPC UA', marker_color='#f8961e'),
+        2,
+        seconds,
+        np.asarray(charts.opcua_packets_per_second, dtype=np.int32),
+    )
+    for rtts, name, color in (
+        (charts.rtts_client_server, 'RTT Cliente-Servidor', '#43AA8B'),
+        (charts.rtts_attacker_server, 'RTT Invasor-Servidor', '#F8961E'),
+    ):
+        rtts = _rtt_array(decimate(rtts, max_points))
+        add(
+            go.Scattergl(
+                name=name,
+                mode='markers',
+                marker={'color': color, 'size': 4, 'opacity': 0.5},
+                legendgroup=name,
+            ),
+            3,
+            rtts[:, 0].astype(np.int32),
+            rtts[:, 2].astype(np.float32),
+        )
+    for rtts, name, color in (
+        (charts.rtts_client_server, 'RTT Cliente-Servidor', '#43AA8B'),
+        (charts.rtts_attacker_server, 'RTT Invasor-Servidor', '#F8961E'),
+    ):
+        per_second, means = _mean_per_second(_rtt_array(rtts))
+        add(
+            go.Scattergl(
+                name=name,
+                mode='markers',
+                marker={'color': color, 'size': 8, 'opacity': 0.5},
+                legendgroup=name,
+                showlegend=False,
+            ),
+            4,
+            per_second,
+            means,
+        )
+    if charts.performance_data is not None:
+        for column, name, color in (
+            ('CPU (%)', 'CPU', '#90BE6D'),
+            ('Memory (%)', 'RAM', '#277DA1'),
+        ):
+            add(
+                go.Scattergl(name=name, mode='lines', line_color=color),
+                5,
+                charts.performance_data['Timestamp'].to_numpy(),
+                charts.performance_data[column].to_numpy(),
+            )
+
+    attack = charts.attack
+    for row in range(1, len(titles) + 1):
+        x = (
+            attack.get('Packet index')
+            if row == 3
+            else attack.get('Relative time')
+        )
+        if x:
+            fig.add_vline(
+                x=x,
+                line={'color': '#F94144', 'dash': 'dash', 'width': 1},
+                row=row,
+                col=1,
+            )
+    for row, title in enumerate(
+        [
+            'Throughput (KBps)',
+            'Pacotes OPC UA',
+            'Round Trip Time (ms)',
+            'Round Trip Time (ms)',
+            'Performance (%)',
+        ][: len(titles)],
+        start=1,
+    ):
+        fig.update_yaxes(
+            title_text=title,
+            type='log' if row in (3, 4) else None,
+            row=row,
+            col=1,
+        )
+        fig.update_xaxes(
+            title_text='Pacote' if row == 3 else 'Tempo (s)', row=row, col=1
+        )
+    fig.update_layout(
+        title=f'<b>Nome do ataque:</b> {attack["Name"]} - '
+        f'<b>Modo de segurança:</b> {attack["Type"]}',
+        height=350 * len(titles),
+        template='plotly_white',
+    )
+
+    figure = fig.to_dict()
+    for trace, (x, y) in zip(figure['data'], series):
+        trace['x'], trace['y'] = encode_array(x), encode_array(y)
+    return figure
+
+
+def write_dashboard(
+    charts,
+    *,
+    output_dir: str = OUTPUT,
+    max_points: int | None = None,
+    include_plotlyjs: bool | str = True,
+) -> str:
+    """Write the interactive report of the analysis of a capture, see `dashboard_figure`.
+
+    Args:
+        charts (Charts): The data of the charts, see `render_charts`.
+        output_dir (str): The directory of the report.
+        max_points (int): The budget of points of each RTT series, see `decimate`. Defaults to all the points.
+        include_plotlyjs (bool | str): True embeds plotly.js, so the report opens offline; 'cdn' links it instead, see `plotly.io.write_html`.
+
+    Returns:
+        str: The path of the report.
+    """
+    path = f'{output_dir}/{charts.output_name or charts.filename}{DASHBOARD_SUFFIX}'
+    pio.write_html(
+        dashboard_figure(charts, max_points=max_points),
+        path,
+        include_plotlyjs=include_plotlyjs,
+        validate=False,
+        config={'scrollZoom': True},
+    )
+    return path
+
+
+def _rtt_array(rtts: list) -> np.ndarray:
+    """The RTTs as an array of [index, relative time, rtt] rows."""
+    if not len(rtts):
+        return np.empty((0, 3))
+    return np.asarray(rtts, dtype=np.float64)
+
+
+def _mean_per_second(rtts: np.ndarray) -> tuple:
+    """The seconds with RTTs and the mean RTT of each of them."""
+    seconds = rtts[:, 1].astype(np.int64)
+    if not len(seconds):
+        return np.empty(0, dtype=np.int32), np.empty(0)
+    counts = np.bincount(seconds)
+    sums = np.bincount(seconds, weights=rtts[:, 2])
+    present = np.flatnonzero(counts)
+    return present.astype(np.int32), sums[present] / counts[present]
@@ -0,0 +1,157 @@
+"""
+Provides the decimation of the series of the charts: the points of a long
+series are reduced to a budget before being plotted, keeping the ones that
+shape the chart, so huge captures render fast and stay readable.
+"""
+
+import numpy as np
+
+DECIMATION_METHODS = ('minmax', 'lttb')
+
+
+def minmax_indices(
+    x: np.ndarray, y: np.ndarray, max_points: int
+) -> np.ndarray:
+    """Select the lowest and highest point of each column of a series.
+
+    The x range is split in `max_points // 2` columns of the same width, like
+    the pixel columns of a chart, so the spikes and dips of the series are
+    always kept, and so are its global extremes.
+
+    Args:
+        x: The x values of the points.
+        y: The y values of the points.
+        max_points: The maximum number of points to keep, at least 2.
+
+    Returns:
+        The indexes of the points kept, in increasing order of x.
+
+    Raises:
+        ValueError: If `max_points` is lower than 2.
+
+    Examples:
+        >>> x = np.arange(10)
+        >>> y = np.array([5, 1, 5, 5, 9, 5, 5, 0, 5, 5])
+        >>> minmax_indices(x, y, 4).tolist()
+        [1, 4, 7, 9]
+    """
+    if max_points < 2:
+        raise ValueError('The decimation keeps at least 2 points.')
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) <= max_points:
+        return np.argsort(x, kind='stable')
+
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+    columns = max_points // 2
+    span = x[-1] - x[0]
+    if span:
+        column = np.minimum(
+            ((x - x[0]) / span * columns).astype(np.int64), columns - 1
+        )
+    else:
+        column = np.zeros(len(x), dtype=np.int64)
+
+    # Sorted by column then by value, the first and last point of each
+    # column are its lowest and highest
+    by_value = np.lexsort((y, column))
+    starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+    ends = np.r_[starts[1:], len(x)] - 1
+    kept = np.unique(np.concatenate([by_value[starts], by_value[ends]]))
+    return order[kept]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Select the points of a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are kept, and the others are split in
+    `max_points - 2` buckets of the same size. The point kept in a bucket
+    makes the largest triangle with the point kept in the previous bucket and
+    the mean of the next one, which follows the shape of the series with
+    exactly `max_points` points.
+
+    Args:
+        x: The x values of the points.
+        y: The y values of the points.
+        max_points: The number of points to keep, at least 3.
+
+    Returns:
+        The indexes of the points kept, in increasing order of x.
+
+    Raises:
+        ValueError: If `max_points` is lower than 3.
+
+    Examples:
+        >>> x = np.arange(10)
+        >>> y = np.array([5, 1, 5, 5, 9, 5, 5, 0, 5, 5])
+        >>> lttb_indices(x, y, 5).tolist()
+        [0, 1, 4, 7, 9]
+    """
+    if max_points < 3:
+        raise ValueError('The LTTB decimation keeps at least 3 points.')
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) <= max_points:
+        return np.argsort(x, kind='stable')
+
+    order = np.argsort(x, kind='stable')
+    x, y = x[order].astype(np.float64), y[order].astype(np.float64)
+    size = len(x)
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.int64)
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket == max_points - 3:
+            next_x, next_y = x[-1], y[-1]
+        else:
+            next_end = edges[bucket + 2]
+            next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return order[kept]
+
+
+def decimate(
+    points: list, max_points: int | None, method: str = 'minmax'
+) -> list:
+    """Reduce a series of points to a budget before plotting it.
+
+    Args:
+        points: The points, such as the RTTs as [index, relative time, rtt] or [time, rtt]: their first value is the x value and their last the y value.
+        max_points: The maximum number of points to keep. **None** keeps them all.
+        method: 'minmax' for `minmax_indices`, which keeps the extremes, or 'lttb' for `lttb_indices`, which keeps the shape.
+
+    Returns:
+        The points kept, in increasing order of x, or `points` itself if it fits in the budget.
+
+    Raises:
+        ValueError: If an unacceptable method is provided, or if the budget is too low for the method.
+
+    Examples:
+        >>> rtts = [[index, index / 10, 0.002] for index in range(1000)]
+        >>> rtts[500][2] = 0.5
+        >>> decimated = decimate(rtts, 100)
+        >>> len(decimated), [500, 50.0, 0.5] in decimated
+        (100, True)
+        >>> decimate(rtts, 100, 'mean')
+        Traceback (most recent call last):
+        ...
+        ValueError: Invalid decimation method: 'mean'. Acceptable values are: ['minmax', 'lttb']
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(
+            f"Invalid decimation method: '{method}'. Acceptable values are: {list(DECIMATION_METHODS)}"
+        )
+    if max_points is None or len(points) <= max_points:
+        return points
+
+    x = np.array([point[0] for point in points])
+    y = np.array([point[-1] for point in points])
+    select = minmax_indices if method == 'minmax' else lttb_indices
+    return [points[index] for index in select(x, y, max_points)]
@@ -1,10 +1,28 @@
+from __future__ import annotations
+
 import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from matplotlib.ticker import FuncFormatter
+from lazy import lazy_import
 from paths import *
+from plot.dashboard import write_dashboard
+from plot.decimation import decimate
+from plot.rendering import (
+    RenderPreset,
+    finish_figure,
+    get_preset,
+    new_figure,
+    save_figure,
+    use_headless_backend,
+)
+
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+ticker = lazy_import('matplotlib.ticker')
+
+CHART_BACKENDS = ('image', 'html')
 
 
 class GraphUtils:
@@ -134,61 +152,43 @@ class GraphUtils:
 
 
 def performance_data_axle(
-    ax: plt.Axes, filename: str, performance: bool, *, twin: bool = True
+    ax: plt.Axes, performance_data: pd.DataFrame | None, *, twin: bool = True
 ) -> plt.Axes:
     """Plot performance data alongside the main graph.
 
     Args:
         ax (matplotlib.axes.Axes): The main axis object.
-        filename (str): The name of the file.
-        performance (bool): Flag indicating whether performance data should be plotted.
-        twin (bool): Flag indicating whether the performance data should be plotted on the same axis.
+        performance_data (pd.DataFrame): The performance data of the host, see `load_performance_data`. **None** plots nothing.
+        twin (bool): Flag indicating whether the performance data should be plotted on a twin axis.
 
     Returns:
         matplotlib.axes.Axes: The modified axis object.
 
     Example:
         >>> import matplotlib.pyplot as plt
-        >>> from plot.graphics import GraphUtils
+        >>> from plot.performance import load_performance_data
         >>> ax = plt.gca()
-        >>> performance_data_axle(ax, '0-dos_function_call_null_deref', performance=True, twin=True)  # doctest: +ELLIPSIS
+        >>> performance_data_axle(ax, load_performance_data('tests/assets/0-dos_attack_example.csv'), twin=True)  # doctest: +ELLIPSIS
         <Axes: >
     """
-    if performance:
-        csv_file = f'{DATA_PERF}/{filename}.csv'
-        try:
-            performance_data = GraphUtils.get_csv_data(csv_file)
-
-            if set(['Timestamp', 'CPU (%)', 'Memory (%)']).issubset(
-                performance_data.columns
-            ):
-                aux = ax.twinx() if twin else ax
-                aux.plot(
-                    performance_data['Timestamp'],
-                    performance_data['CPU (%)'],
-                    color='#90BE6D',
-                    linestyle='-',
-                    label='CPU',
-                )
-                aux.plot(
-                    performance_data['Timestamp'],
-                    performance_data['Memory (%)'],
-                    color='#277DA1',
-                    linestyle='-',
-                    label='RAM',
-                )
-                aux.set_ylabel('Performance (%)', fontsize=9)
-                aux.legend(loc='upper left', fontsize=9)
-            else:
-                print(
-                    f'Performance data in {csv_file} is missing required columns.'
-                )
-        except FileNotFoundError:
-            raise FileNotFoundError(f'File {csv_file} not found.')
-        except Exception as e:
-            raise Exception(
-                f'An error occurred while reading the file {csv_file}: {e}'
-            )
+    if performance_data is not None:
+        aux = ax.twinx() if twin else ax
+        aux.plot(
+            performance_data['Timestamp'],
+            performance_data['CPU (%)'],
+            color='#90BE6D',
+            linestyle='-',
+            label='CPU',
+        )
+        aux.plot(
+            performance_data['Timestamp'],
+            performance_data['Memory (%)'],
+            color='#277DA1',
+            linestyle='-',
+            label='RAM',
+        )
+        aux.set_ylabel('Performance (%)', fontsize=9)
+        aux.legend(loc='upper left', fontsize=9)
     return ax
 
 
@@ -196,26 +196,34 @@ def plot_performance_data(
     seconds: list,
     attack: dict,
     filename: str,
+    performance_data: pd.DataFrame,
     *,
     is_twiny: bool = True,
     show_plots: bool = False,
-) -> None:
+    output_name: str | None = None,
+    preset: str | RenderPreset | None = None,
+    output_dir: str = OUTPUT,
+) -> str:
     """Plot performance data.
 
     Args:
         seconds (list): The list of seconds.
         attack (dict): The dictionary of the attack.
         filename (str): The name of the file.
+        performance_data (pd.DataFrame): The performance data of the host, see `load_performance_data`.
         is_twiny (bool): Flag indicating whether the performance data should be plotted on the same axis.
         show_plots (bool): Flag indicating whether the plot should be shown.
+        output_name (str): The name of the output image, without suffix. Defaults to `filename`.
+        preset (str | RenderPreset): The resolution and format of the image, see `get_preset`. Defaults to the publication preset.
+        output_dir (str): The directory of the output image.
 
     Returns:
-        None
+        str: The path of the image.
 
     Example:
-        >>> plot_performance_data([1, 2, 3, 4, 5, 6], {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE', 'Relative time': 32.341966, 'Packet index': 1966})  # doctest: +SKIP
+        >>> plot_performance_data([1, 2, 3, 4, 5, 6], {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE', 'Relative time': 32.341966, 'Packet index': 1966}, '0-dos_attack_example', performance_data)  # doctest: +SKIP
     """
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    fig, ax1 = new_figure('perf', show=show_plots)
     ax1.plot(seconds, [0] * len(seconds), color='w', linewidth=0.5)
     if 'Relative time' in attack and attack['Relative time']:
         ax1.axvline(
@@ -238,15 +246,14 @@ def plot_performance_data(
     )
 
     ax1.grid(True, linestyle='dotted')
-    ax1 = performance_data_axle(ax1, filename, performance=True, twin=is_twiny)
-    fig.savefig(
-        f'{OUTPUT}/{filename}-perf.png',
-        dpi=600,
+    ax1 = performance_data_axle(ax1, performance_data, twin=is_twiny)
+    path = save_figure(
+        fig,
+        f'{output_dir}/{output_name or filename}-perf',
+        get_preset(preset),
     )
-    if show_plots:
-        plt.show(block=False)
-    else:
-        plt.close(fig)
+    finish_figure(fig, show_plots)
+    return path
 
 
 def plot_packets_per_second(
@@ -254,11 +261,14 @@ def plot_packets_per_second(
     seconds: list,
     attack: dict,
     filename: str,
-    performance: bool = False,
+    performance_data: pd.DataFrame | None = None,
     show_plots: bool = False,
-) -> None:
+    output_name: str | None = None,
+    preset: str | RenderPreset | None = None,
+    output_dir: str = OUTPUT,
+) -> str:
     """Plot the packets per second."""
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    fig, ax1 = new_figure('pack', show=show_plots)
     ax1.bar(
         seconds,
         packets_per_second,
@@ -286,17 +296,16 @@ def plot_packets_per_second(
     )
     ax1.legend(loc='upper left', fontsize=9)
     ax1.grid(True, linestyle='dotted')
-    ax1 = performance_data_axle(ax1, filename, performance)
+    ax1 = performance_data_axle(ax1, performance_data)
     # plt.subplots_adjust(bottom=0.17)
     # plt.show(block=False)
-    fig.savefig(
-        f'{OUTPUT}/{filename}-pack.png',
-        dpi=600,
+    path = save_figure(
+        fig,
+        f'{output_dir}/{output_name or filename}-pack',
+        get_preset(preset),
     )
-    if show_plots:
-        plt.show(block=False)
-    else:
-        plt.close(fig)
+    finish_figure(fig, show_plots)
+    return path
 
 
 def plot_throughput(
@@ -304,9 +313,12 @@ def plot_throughput(
     seconds: list,
     attack: dict,
     filename: str,
-    performance: bool = False,
+    performance_data: pd.DataFrame | None = None,
     show_plots: bool = False,
-) -> None:
+    output_name: str | None = None,
+    preset: str | RenderPreset | None = None,
+    output_dir: str = OUTPUT,
+) -> str:
     """Plot the throughput in kbps.
 
     Args:
@@ -314,16 +326,19 @@ def plot_throughput(
         seconds (list): The list of seconds.
         attack (dict): The dictionary of the attack.
         filename (str): The name of the file.
-        performance (bool): Flag indicating whether performance data should be plotted.
+        performance_data (pd.DataFrame): The performance data of the host to plot along, see `load_performance_data`. Defaults to none.
         show_plots (bool): Flag indicating whether the plot should be shown.
+        output_name (str): The name of the output image, without suffix. Defaults to `filename`.
+        preset (str | RenderPreset): The resolution and format of the image, see `get_preset`. Defaults to the publication preset.
+        output_dir (str): The directory of the output image.
 
     Returns:
-        None
+        str: The path of the image.
 
     Example:
         >>> plot_throughput([0.099609375, 0.099609375, 0.099609375, 0.333984375, 0.0, 13.7861328125,], [1, 2, 3, 4, 5, 6], {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE', 'Relative time': 32.341966, 'Packet index': 1966}, '0-dos_function_call_null_deref')  # doctest: +SKIP
     """
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    fig, ax1 = new_figure('tput', show=show_plots)
     ax1.plot(
         seconds,
         throughput_kbps,
@@ -355,17 +370,16 @@ def plot_throughput(
     )
     ax1.legend(loc='upper left', fontsize=9)
     ax1.grid(True, linestyle='dotted')
-    ax1 = performance_data_axle(ax1, filename, performance)
+    ax1 = performance_data_axle(ax1, performance_data)
     # plt.subplots_adjust(bottom=0.17)
     # plt.show(block=False)
-    fig.savefig(
-        f'{OUTPUT}/{filename}-tput.png',
-        dpi=600,
+    path = save_figure(
+        fig,
+        f'{output_dir}/{output_name or filename}-tput',
+        get_preset(preset),
     )
-    if show_plots:
-        plt.show(block=False)
-    else:
-        plt.close(fig)
+    finish_figure(fig, show_plots)
+    return path
 
 
 def plot_round_trip_time_per_packet(
@@ -378,7 +392,12 @@ def plot_round_trip_time_per_packet(
     attacker_rtts: list = None,
     performance: bool = False,
     show_plots: bool = False,
-) -> None:
+    output_name: str | None = None,
+    preset: str | RenderPreset | None = None,
+    output_dir: str = OUTPUT,
+    max_points: int | None = None,
+    decimation: str = 'minmax',
+) -> str:
     """Plot the round trip time.
 
     Args:
@@ -390,17 +409,23 @@ def plot_round_trip_time_per_packet(
         attacker_rtts (list): The list of attacker round trip times.
         performance (bool): Flag indicating whether performance data should be plotted.
         show_plots (bool): Flag indicating whether the plot should be shown.
+        output_name (str): The name of the output image, without suffix. Defaults to `filename`.
+        preset (str | RenderPreset): The resolution and format of the image, see `get_preset`. Defaults to the publication preset.
+        output_dir (str): The directory of the output image.
+        max_points (int): The budget of points of each series, see `decimate`. Defaults to all the points.
+        decimation (str): How the points are selected when over the budget, 'minmax' to keep the extremes or 'lttb' to keep the shape.
 
     Returns:
-        None
+        str: The path of the image.
 
     Example:
         >>> plot_round_trip_time_per_packet([[16, 20.80455, 3.999999999848569e-05], [102, 21.089922, 0.002322000000003044], [486, 22.965286, 0.0019799999999996487], [872, 24.852685, 0.001992000000001326], [1034, 25.657321, 0.00211699999999837]], 3800, {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE', 'Relative time': 32.341966, 'Packet index': 1966}, scale_factor=300, attacker_rtts=[[2279, 31.794286, 0.00032099999999957163], [2691, 31.851725, 4.4999999996520046e-05], [3051, 35.238601, 0.00015900000000357295], [3094, 35.267045, 5.600000000072214e-05], [3227, 35.275005, 2.9999999995311555e-06]])  # doctest: +SKIP
     """
+    rtts = decimate(rtts, max_points, decimation)
     x_values, y_values = GraphUtils.extract_rtt_plot_values(rtts)
     normalized_y_values = GraphUtils.normalize_values(y_values)
 
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    fig, ax1 = new_figure('rttp', show=show_plots)
     ax1.scatter(
         x_values,
         normalized_y_values,
@@ -413,6 +438,7 @@ def plot_round_trip_time_per_packet(
     )
 
     if attacker_rtts:
+        attacker_rtts = decimate(attacker_rtts, max_points, decimation)
         (
             attacker_x_values,
             attacker_y_values,
@@ -446,7 +472,7 @@ def plot_round_trip_time_per_packet(
     def log_formatter(x, pos):
         return f'{x:.3f}'
 
-    ax1.yaxis.set_major_formatter(FuncFormatter(log_formatter))
+    ax1.yaxis.set_major_formatter(ticker.FuncFormatter(log_formatter))
 
     ax1.grid(True, linestyle='--', alpha=0.7)
     ax1.set_xlabel('Pacote', fontsize=9)
@@ -465,15 +491,14 @@ def plot_round_trip_time_per_packet(
         bbox_to_anchor=(0.5, -0.2), fontsize=9, loc='lower center', ncol=3
     )
     # ax1.grid(True, linestyle='dotted')
-    plt.subplots_adjust(bottom=0.17)
-    fig.savefig(
-        f'{OUTPUT}/{filename}-rttp.png',
-        dpi=600,
+    fig.subplots_adjust(bottom=0.17)
+    path = save_figure(
+        fig,
+        f'{output_dir}/{output_name or filename}-rttp',
+        get_preset(preset),
     )
-    if show_plots:
-        plt.show(block=False)
-    else:
-        plt.close(fig)
+    finish_figure(fig, show_plots)
+    return path
 
 
 def plot_round_trip_time_per_second(
@@ -486,7 +511,12 @@ def plot_round_trip_time_per_second(
     attacker_rtts: list = None,
     performance: bool = False,
     show_plots: bool = False,
-) -> None:
+    output_name: str | None = None,
+    preset: str | RenderPreset | None = None,
+    output_dir: str = OUTPUT,
+    max_points: int | None = None,
+    decimation: str = 'minmax',
+) -> str:
     """Plot the round trip time.
 
     Args:
@@ -498,9 +528,14 @@ def plot_round_trip_time_per_second(
         attacker_rtts (list): The list of attacker round trip times.
         performance (bool): Flag indicating whether performance data should be plotted.
         show_plots (bool): Flag indicating whether the plot should be shown.
+        output_name (str): The name of the output image, without suffix. Defaults to `filename`.
+        preset (str | RenderPreset): The resolution and format of the image, see `get_preset`. Defaults to the publication preset.
+        output_dir (str): The directory of the output image.
+        max_points (int): The budget of points of each series, see `decimate`. Defaults to all the points.
+        decimation (str): How the points are selected when over the budget, 'minmax' to keep the extremes or 'lttb' to keep the shape.
 
     Returns:
-        None
+        str: The path of the image.
 
     Example:
         >>> plot_round_trip_time_per_second([[16, 20.80455, 3.999999999848569e-05], [102, 21.089922, 0.002322000000003044], [486, 22.965286, 0.0019799999999996487], [872, 24.852685, 0.001992000000001326], [1034, 25.657321, 0.00211699999999837]], [1, 2, 3, 4, 5, 6], {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE', 'Relative time': 32.341966, 'Packet index': 1966}, scale_factor=300, attacker_rtts=[[2279, 31.794286, 0.00032099999999957163], [2691, 31.851725, 4.4999999996520046e-05], [3051, 35.238601, 0.00015900000000357295], [3094, 35.267045, 5.600000000072214e-05], [3227, 35.275005, 2.9999999995311555e-06]])  # doctest: +SKIP
@@ -522,13 +557,15 @@ def plot_round_trip_time_per_second(
         ]
 
     rtts_by_second = group_rtts_by_second(rtts)
-    avg_rtts_per_second = calculate_avg_rtts_per_second(rtts_by_second)
+    avg_rtts_per_second = decimate(
+        calculate_avg_rtts_per_second(rtts_by_second), max_points, decimation
+    )
     x_values, y_values = GraphUtils.extract_rtt_plot_values(
         avg_rtts_per_second
     )
     normalized_y_values = GraphUtils.normalize_values(y_values)
 
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    fig, ax1 = new_figure('rtts', show=show_plots)
     ax1.scatter(
         x_values,
         normalized_y_values,
@@ -542,8 +579,10 @@ def plot_round_trip_time_per_second(
 
     if attacker_rtts:
         attacker_rtts_by_second = group_rtts_by_second(attacker_rtts)
-        avg_attacker_rtts_per_second = calculate_avg_rtts_per_second(
-            attacker_rtts_by_second
+        avg_attacker_rtts_per_second = decimate(
+            calculate_avg_rtts_per_second(attacker_rtts_by_second),
+            max_points,
+            decimation,
         )
         (
             attacker_x_values,
@@ -579,7 +618,7 @@ def plot_round_trip_time_per_second(
     def log_formatter(x, pos):
         return f'{x:.3f}'
 
-    ax1.yaxis.set_major_formatter(FuncFormatter(log_formatter))
+    ax1.yaxis.set_major_formatter(ticker.FuncFormatter(log_formatter))
     ax1.grid(True, linestyle='--', alpha=0.7)
     ax1.set_xlabel('Tempo (s)', fontsize=9)
     ax1.set_ylabel('Round Trip Time', fontsize=9)
@@ -596,12 +635,193 @@ def plot_round_trip_time_per_second(
         bbox_to_anchor=(0.5, -0.2), fontsize=9, loc='lower center', ncol=3
     )
     # plt.grid(True, linestyle='dotted')
-    plt.subplots_adjust(bottom=0.17)
-    fig.savefig(
-        f'{OUTPUT}/{filename}-rtts.png',
-        dpi=600,
+    fig.subplots_adjust(bottom=0.17)
+    path = save_figure(
+        fig,
+        f'{output_dir}/{output_name or filename}-rtts',
+        get_preset(preset),
     )
-    if show_plots:
-        plt.show(block=False)
-    else:
-        plt.close(fig)
+    finish_figure(fig, show_plots)
+    return path
+
+
+class Charts(NamedTuple):
+    """The data of the charts of the analysis of a capture, see `render_charts`.
+
+    The RTTs are lists of [index, relative time, rtt]. `performance_data` is
+    the performance data of the host, **None** if it was not recorded, see
+    `find_performance_data`.
+    """
+
+    attack: dict
+    filename: str
+    seconds: list
+    throughput_kbps: list
+    opcua_packets_per_second: list
+    rtts_client_server: list
+    rtts_attacker_server: list
+    number_of_packets: int
+    performance_data: pd.DataFrame | None = None
+    output_name: str | None = None
+
+
+def render_charts(
+    charts: Charts,
+    *,
+    preset: str | RenderPreset | None = None,
+    show_plots: bool = False,
+    output_dir: str = OUTPUT,
+    max_points: int | None = None,
+    decimation: str = 'minmax',
+    backend: str = 'image',
+) -> list:
+    """Render the charts of the analysis of a capture.
+
+    The performance chart is only rendered when the performance data of the
+    host was recorded. The 'html' backend writes all the charts in one
+    interactive report instead of one image each, see `write_dashboard`.
+
+    Args:
+        charts (Charts): The data of the charts.
+        preset (str | RenderPreset): The resolution and format of the images, see `get_preset`. Defaults to the publication preset.
+        show_plots (bool): Flag indicating whether the plots should be shown.
+        output_dir (str): The directory of the output images.
+        max_points (int): The budget of points of each RTT series, see `decimate`. Defaults to all the points.
+        decimation (str): How the RTT points are selected when over the budget, 'minmax' or 'lttb'.
+        backend (str): 'image' for the images of the preset, or 'html' for the interactive report.
+
+    Returns:
+        list: The paths of the images, or of the report.
+
+    Raises:
+        ValueError: If an unacceptable backend is provided.
+    """
+    if backend not in CHART_BACKENDS:
+        raise ValueError(
+            f"Invalid chart backend: '{backend}'. Acceptable values are: {list(CHART_BACKENDS)}"
+        )
+    if backend == 'html':
+        return [
+            write_dashboard(
+                charts, output_dir=output_dir, max_points=max_points
+            )
+        ]
+
+    rtt_options = {'max_points': max_points, 'decimation': decimation}
+    options = {
+        'show_plots': show_plots,
+        'output_name': charts.output_name,
+        'preset': preset,
+        'output_dir': output_dir,
+    }
+    paths = []
+    if charts.performance_data is not None:
+        paths.append(
+            plot_performance_data(
+                charts.seconds,
+                charts.attack,
+                charts.filename,
+                charts.performance_data,
+                is_twiny=False,
+                **options,
+            )
+        )
+    paths.append(
+        plot_round_trip_time_per_packet(
+            charts.rtts_client_server,
+            charts.number_of_packets,
+            charts.attack,
+            charts.filename,
+            attacker_rtts=charts.rtts_attacker_server,
+            **options,
+            **rtt_options,
+        )
+    )
+    paths.append(
+        plot_round_trip_time_per_second(
+            charts.rtts_client_server,
+            charts.seconds,
+            charts.attack,
+            charts.filename,
+            attacker_rtts=charts.rtts_attacker_server,
+            **options,
+            **rtt_options,
+        )
+    )
+    paths.append(
+        plot_throughput(
+            charts.throughput_kbps,
+            charts.seconds,
+            charts.attack,
+            charts.filename,
+            **options,
+        )
+    )
+    paths.append(
+        plot_packets_per_second(
+            charts.opcua_packets_per_second,
+            charts.seconds,
+            charts.attack,
+            charts.filename,
+            **options,
+        )
+    )
+    return paths
+
+
+def render_captures(
+    captures: list,
+    *,
+    preset: str | RenderPreset | None = None,
+    workers: int | None = None,
+    output_dir: str = OUTPUT,
+    max_points: int | None = None,
+    decimation: str = 'minmax',
+    backend: str = 'image',
+) -> list:
+    """Render the charts of several captures in parallel.
+
+    Each capture is rendered by `render_charts` in a pool of worker processes,
+    which use the non-interactive Agg backend and reuse their figures from
+    one capture to the next.
+
+    Args:
+        captures (list): The `Charts` of each capture.
+        preset (str | RenderPreset): The resolution and format of the images, see `get_preset`. Defaults to the publication preset.
+        workers (int): The number of worker processes. Defaults to the number of CPUs. With 1, the captures are rendered in the calling process.
+        output_dir (str): The directory of the output images.
+        max_points (int): The budget of points of each RTT series, see `decimate`. Defaults to all the points.
+        decimation (str): How the RTT points are selected when over the budget, 'minmax' or 'lttb'.
+        backend (str): 'image' or 'html', see `render_charts`.
+
+    Returns:
+        list: The paths of the images of each capture, in the order of `captures`.
+
+    Raises:
+        ValueError: If an unacceptable preset name or backend is provided.
+    """
+    preset = get_preset(preset)
+    if backend not in CHART_BACKENDS:
+        raise ValueError(
+            f"Invalid chart backend: '{backend}'. Acceptable values are: {list(CHART_BACKENDS)}"
+        )
+    options = {
+        'preset': preset,
+        'output_dir': output_dir,
+        'max_points': max_points,
+        'decimation': decimation,
+        'backend': backend,
+    }
+    if workers == 1:
+        return [render_charts(charts, **options) for charts in captures]
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=use_headless_backend,
+        initargs=(True,),
+    ) as executor:
+        futures = [
+            executor.submit(render_charts, charts, **options)
+            for charts in captures
+        ]
+        return [future.result() for future in futures]
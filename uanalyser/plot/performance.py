@@ -0,0 +1,168 @@
+"""
+Provides the performance data of the host (CPU and memory use) plotted along
+the traffic: each CSV file is parsed once per process with typed columns,
+kept in a small LRU cache, and optionally copied to a columnar file that
+loads faster than the CSV the next time.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+from lazy import lazy_import
+from paths import DATA_PERF
+
+pd = lazy_import('pandas')
+
+PERFORMANCE_DTYPES = {
+    'Timestamp': np.float64,
+    'CPU (%)': np.float32,
+    'Memory (%)': np.float32,
+}
+PERFORMANCE_CACHE_SIZE = 32
+COLUMNAR_SUFFIX = '.perf.npz'
+
+
+def load_performance_data(
+    file_path: str, *, columnar_dir: str | None = None
+) -> pd.DataFrame:
+    """Load the performance data of the host from a CSV file.
+
+    The frames are cached by path, size and modification time, so a file is
+    only parsed again when it changes. The cached frames are shared: they
+    must not be modified.
+
+    Args:
+        file_path: The CSV file, with the `PERFORMANCE_DTYPES` columns.
+        columnar_dir: The directory of the columnar copies of the CSV files. **None** always parses the CSV file.
+
+    Returns:
+        The performance data, with the `PERFORMANCE_DTYPES` columns only.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file lacks one of the columns.
+
+    Examples:
+        >>> data = load_performance_data('tests/assets/0-dos_attack_example.csv')
+        >>> len(data), data.dtypes.tolist()
+        (502, [dtype('float64'), dtype('float32'), dtype('float32')])
+        >>> load_performance_data('tests/assets/0-dos_attack_example.csv') is data
+        True
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+    return _load_performance_data(
+        os.path.abspath(file_path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        columnar_dir,
+    )
+
+
+def find_performance_data(
+    filename: str,
+    *,
+    data_dir: str = DATA_PERF,
+    columnar_dir: str | None = None,
+) -> pd.DataFrame | None:
+    """Load the performance data of a capture, if it was recorded.
+
+    Args:
+        filename: The name of the capture, decoded from its attack, see `GraphUtils.decode_attack_to_file_name`.
+        data_dir: The directory of the performance CSV files.
+        columnar_dir: The directory of the columnar copies, see `load_performance_data`.
+
+    Returns:
+        The performance data, or **None** if there is no CSV file for the capture.
+
+    Raises:
+        ValueError: If the file lacks one of the columns.
+
+    Examples:
+        >>> len(find_performance_data('0-dos_attack_example', data_dir='tests/assets'))
+        502
+        >>> find_performance_data('0-normal_traffic', data_dir='tests/assets') is None
+        True
+    """
+    try:
+        return load_performance_data(
+            os.path.join(data_dir, f'{filename}.csv'),
+            columnar_dir=columnar_dir,
+        )
+    except FileNotFoundError:
+        return None
+
+
+def clear_performance_cache() -> None:
+    """Forget the performance data loaded so far."""
+    _load_performance_data.cache_clear()
+
+
+@functools.lru_cache(maxsize=PERFORMANCE_CACHE_SIZE)
+def _load_performance_data(
+    file_path: str, size: int, mtime: int, columnar_dir: str | None
+) -> pd.DataFrame:
+    """Load a CSV file, the size and modification time being part of the cache key."""
+    if columnar_dir is None:
+        return _read_csv(file_path)
+
+    identity = {'file': file_path, 'size': size, 'mtime': mtime}
+    digest = hashlib.sha256(
+        json.dumps(identity, sort_keys=True).encode()
+    ).hexdigest()
+    path = os.path.join(columnar_dir, f'{digest[:32]}{COLUMNAR_SUFFIX}')
+    try:
+        with np.load(path) as content:
+            data = pd.DataFrame(
+                {name: content[name] for name in PERFORMANCE_DTYPES}
+            )
+        # Mark the copy as recently used for the eviction of the cache
+        os.utime(path)
+        return data
+    except (OSError, KeyError, ValueError):
+        pass
+
+    data = _read_csv(file_path)
+    try:
+        _write_columnar(path, data)
+    except OSError:
+        pass
+    return data
+
+
+def _read_csv(file_path: str) -> pd.DataFrame:
+    """Parse a performance CSV file with typed columns."""
+    try:
+        return pd.read_csv(
+            file_path,
+            usecols=list(PERFORMANCE_DTYPES),
+            dtype=PERFORMANCE_DTYPES,
+        )
+    except ValueError:
+        raise ValueError(
+            f'The performance data in "{file_path}" must have the columns: {list(PERFORMANCE_DTYPES)}'
+        )
+
+
+def _write_columnar(path: str, data: pd.DataFrame) -> None:
+    """Write the columnar copy of a frame atomically, so readers never see it half written."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fdesc, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fdesc, 'wb') as temp:
+            np.savez(
+                temp, **{name: data[name].to_numpy() for name in data.columns}
+            )
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
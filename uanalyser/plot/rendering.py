@@ -0,0 +1,172 @@
+"""
+Provides the rendering of the charts: the presets of their resolution and
+format, the non-interactive backend used without a display, and the figures
+reused from one chart to the next instead of being created for each of them.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from typing import NamedTuple
+
+from lazy import lazy_import
+
+matplotlib = lazy_import('matplotlib')
+plt = lazy_import('matplotlib.pyplot')
+
+FIGURE_SIZE = (12, 6)
+HEADLESS_BACKEND = 'Agg'
+
+
+class RenderPreset(NamedTuple):
+    """How the charts are saved.
+
+    `dpi` is the resolution of the raster images and `format` the image
+    format, also used as the suffix of the files, such as 'png', 'svg' or
+    'pdf'.
+    """
+
+    dpi: int
+    format: str = 'png'
+
+
+RENDER_PRESETS = {
+    'preview': RenderPreset(dpi=100),
+    'publication': RenderPreset(dpi=600),
+}
+DEFAULT_PRESET = 'publication'
+
+_templates = {}
+
+
+def get_preset(preset: str | RenderPreset | None = None) -> RenderPreset:
+    """Find a render preset by its name.
+
+    Args:
+        preset: The name of a preset of `RENDER_PRESETS`, or a preset, such as `(300, 'pdf')`. **None** is the `DEFAULT_PRESET`.
+
+    Returns:
+        The preset.
+
+    Raises:
+        ValueError: If an unacceptable preset name is provided.
+
+    Examples:
+        >>> get_preset('preview')
+        RenderPreset(dpi=100, format='png')
+        >>> get_preset((300, 'pdf'))
+        RenderPreset(dpi=300, format='pdf')
+        >>> get_preset('poster')
+        Traceback (most recent call last):
+        ...
+        ValueError: Invalid render preset: 'poster'. Acceptable values are: ['preview', 'publication']
+    """
+    if preset is None:
+        preset = DEFAULT_PRESET
+    if isinstance(preset, tuple):
+        return RenderPreset(*preset)
+    if preset not in RENDER_PRESETS:
+        raise ValueError(
+            f"Invalid render preset: '{preset}'. Acceptable values are: {list(RENDER_PRESETS)}"
+        )
+    return RENDER_PRESETS[preset]
+
+
+def is_headless() -> bool:
+    """Tell whether there is no display to show the charts on.
+
+    Only the X11 and Wayland sessions are looked for: Windows and macOS
+    always have a display.
+
+    Returns:
+        True if no window can be opened.
+    """
+    if sys.platform.startswith(('win', 'darwin')):
+        return False
+    return not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def use_headless_backend(force: bool = False) -> bool:
+    """Switch matplotlib to the non-interactive Agg backend when there is no display.
+
+    Args:
+        force: Whether to switch even if there is a display, such as in worker processes that only save images.
+
+    Returns:
+        True if the Agg backend is used.
+    """
+    if force or is_headless():
+        matplotlib.use(HEADLESS_BACKEND)
+    return matplotlib.get_backend().lower() == HEADLESS_BACKEND.lower()
+
+
+def new_figure(name: str, *, show: bool = False) -> tuple:
+    """Get a figure and its axes to draw a chart on.
+
+    The figures of the charts that are only saved are templates kept per
+    chart name: they are created once per process, outside of pyplot, and
+    cleared for the next chart instead of being created again. The figures
+    of the charts to show are regular pyplot figures.
+
+    Args:
+        name: The name of the chart, such as its file suffix.
+        show: Whether the chart will be shown.
+
+    Returns:
+        The figure and its axes, cleared and with the default margins.
+
+    Examples:
+        >>> fig, ax = new_figure('example')
+        >>> twin = ax.twinx()
+        >>> new_figure('example') == (fig, ax), len(fig.axes)
+        (True, 1)
+    """
+    if show:
+        return plt.subplots(figsize=FIGURE_SIZE)
+
+    fig = _templates.get(name)
+    if fig is None:
+        fig = _templates[name] = plt.Figure(figsize=FIGURE_SIZE)
+        ax = fig.subplots()
+    else:
+        ax = fig.axes[0]
+        for other in fig.axes[1:]:
+            other.remove()
+        ax.clear()
+    fig.subplots_adjust(
+        **{
+            side: matplotlib.rcParams[f'figure.subplot.{side}']
+            for side in ('left', 'right', 'bottom', 'top')
+        }
+    )
+    return fig, ax
+
+
+def save_figure(fig: plt.Figure, path: str, preset: RenderPreset) -> str:
+    """Save a chart with a render preset.
+
+    Args:
+        fig: The figure of the chart.
+        path: The path of the image, without suffix.
+        preset: The render preset.
+
+    Returns:
+        The path of the image, with the suffix of the format of the preset.
+    """
+    path = f'{path}.{preset.format}'
+    fig.savefig(path, dpi=preset.dpi, format=preset.format)
+    return path
+
+
+def finish_figure(fig: plt.Figure, show: bool) -> None:
+    """Show a chart, or release its figure if it is a pyplot figure.
+
+    Args:
+        fig: The figure of the chart, from `new_figure`.
+        show: Whether the chart is shown.
+    """
+    if show:
+        plt.show(block=False)
+    elif fig not in _templates.values():
+        plt.close(fig)
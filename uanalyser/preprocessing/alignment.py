@@ -0,0 +1,311 @@
+"""
+Provides the alignment of the performance telemetry of the host (CPU and
+memory use) with the network metrics of a capture: both are resampled onto
+the same time buckets and joined in one table, whose series are then
+cross-correlated at increasing lags, so the load of the server can be
+related to the attack traffic numerically and not only on a chart.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from lazy import lazy_import
+from preprocessing.operations import COMM_TYPES
+from preprocessing.sharding import CaptureAnalysis
+
+pd = lazy_import('pandas')
+
+NETWORK_COLUMNS = (
+    'throughput_kbps',
+    'opcua_packets',
+    'attack_packets',
+    'rtt_cs',
+    'rtt_as',
+)
+TELEMETRY_COLUMNS = ('CPU (%)', 'Memory (%)')
+ALIGN_METHODS = ('interpolate', 'asof', 'mean')
+
+
+def network_series(
+    analysis: CaptureAnalysis, *, bucket: float = 1.0
+) -> pd.DataFrame:
+    """Gather the network metrics of a capture per time bucket.
+
+    Args:
+        analysis: The analysis of the capture, see `analyse_capture`.
+        bucket: The width of the buckets the analysis was made with, in seconds.
+
+    Returns:
+        One row per bucket with its start `time` and the `NETWORK_COLUMNS`: the throughput, the OPC UA and attack packets, and the mean RTTs of the client and attacker flows in milliseconds (NaN in the buckets without exchange).
+
+    Examples:
+        >>> from preprocessing.sharding import analyse_capture
+        >>> analysis = analyse_capture('tests/assets/0-dos_attack_example.pcapng', '192.168.164.101', ['192.168.164.102'], [4840])
+        >>> network = network_series(analysis)
+        >>> len(network), int(network['attack_packets'].sum()) > 0
+        (59, True)
+    """
+    buckets = len(analysis.throughput_kbps)
+    table = analysis.table[~analysis.table['redundant']]
+    index = _bucket_index(table['time'], bucket)
+    attacks = (
+        table['comm_type'] == COMM_TYPES.index('Attacker to Server')
+    ) & (index < buckets)
+
+    network = pd.DataFrame(
+        {
+            'time': np.arange(buckets) * bucket,
+            'throughput_kbps': analysis.throughput_kbps,
+            'opcua_packets': analysis.opcua_packets_per_second,
+            'attack_packets': np.bincount(index[attacks], minlength=buckets),
+        }
+    )
+    for column, flow in (('rtt_cs', 'C-S'), ('rtt_as', 'A-S')):
+        network[column] = _bucket_means(analysis.rtts[flow], buckets, bucket)
+    return network
+
+
+def align_telemetry(
+    network: pd.DataFrame,
+    telemetry: pd.DataFrame,
+    *,
+    bucket: float = 1.0,
+    offset: float = 0.0,
+    method: str = 'interpolate',
+) -> pd.DataFrame:
+    """Join the telemetry of the host to the network metrics, on their time buckets.
+
+    The telemetry is sampled more often than the buckets, and not on their
+    boundaries. Each bucket gets the telemetry at its middle, interpolated
+    between the samples around it or taken from the nearest sample within
+    half a bucket (`pd.merge_asof`), or the mean of the samples inside it.
+    Buckets the telemetry does not cover get NaN.
+
+    Args:
+        network: The network metrics, see `network_series`.
+        telemetry: The telemetry, with a `Timestamp` column and the `TELEMETRY_COLUMNS`, see `load_performance_data`.
+        bucket: The width of the buckets, in seconds.
+        offset: The time of the first packet of the capture on the clock of the telemetry, in seconds.
+        method: 'interpolate', 'asof' or 'mean'.
+
+    Returns:
+        The network metrics, with the `TELEMETRY_COLUMNS` added.
+
+    Raises:
+        ValueError: If an unacceptable method is provided.
+
+    Examples:
+        >>> network = pd.DataFrame({'time': [0.0, 1.0, 2.0]})
+        >>> telemetry = pd.DataFrame({'Timestamp': [0.0, 1.0, 2.0], 'CPU (%)': [10.0, 20.0, 40.0], 'Memory (%)': [5.0, 5.0, 5.0]})
+        >>> align_telemetry(network, telemetry)['CPU (%)'].tolist()
+        [15.0, 30.0, nan]
+        >>> align_telemetry(network, telemetry, method='mean')['CPU (%)'].tolist()
+        [10.0, 20.0, 40.0]
+    """
+    if method not in ALIGN_METHODS:
+        raise ValueError(
+            f"Invalid alignment method: '{method}'. Acceptable values are: {list(ALIGN_METHODS)}"
+        )
+    telemetry = telemetry.sort_values('Timestamp', kind='stable')
+    times = telemetry['Timestamp'].to_numpy(np.float64) - offset
+    middles = network['time'].to_numpy(np.float64) + bucket / 2
+    joined = network.copy()
+
+    if method == 'interpolate':
+        for column in TELEMETRY_COLUMNS:
+            joined[column] = np.interp(
+                middles,
+                times,
+                telemetry[column].to_numpy(np.float64),
+                left=np.nan,
+                right=np.nan,
+            )
+    elif method == 'asof':
+        samples = telemetry[list(TELEMETRY_COLUMNS)].assign(time=times)
+        nearest = pd.merge_asof(
+            pd.DataFrame({'time': middles}),
+            samples,
+            on='time',
+            direction='nearest',
+            tolerance=bucket / 2,
+        )
+        for column in TELEMETRY_COLUMNS:
+            joined[column] = nearest[column].to_numpy(np.float64)
+    else:
+        index = _bucket_index(times, bucket, start=network['time'].iloc[0])
+        for column in TELEMETRY_COLUMNS:
+            joined[column] = _means(
+                index, telemetry[column].to_numpy(np.float64), len(network)
+            )
+    return joined
+
+
+def cross_correlation(
+    x: np.ndarray, y: np.ndarray, max_lag: int
+) -> np.ndarray:
+    """Correlate two series at increasing lags.
+
+    The Pearson correlation at lag `k` pairs `x[t]` with `y[t + k]`: a peak
+    at a positive lag means that `y` follows `x`. The pairs with a NaN are
+    left out.
+
+    Args:
+        x: The first series.
+        y: The second series, of the same length.
+        max_lag: The largest lag, in samples.
+
+    Returns:
+        The correlation at each lag from `-max_lag` to `max_lag`, NaN where a series is constant or there are fewer than 3 pairs.
+
+    Examples:
+        >>> x = np.random.default_rng(0).normal(size=200)
+        >>> correlations = cross_correlation(x, np.roll(x, 2), 5)
+        >>> int(np.argmax(correlations)) - 5, round(float(correlations.max()), 2)
+        (2, 1.0)
+    """
+    x, y = np.asarray(x, np.float64), np.asarray(y, np.float64)
+    size = len(x)
+    correlations = np.full(2 * max_lag + 1, np.nan)
+    for position, lag in enumerate(range(-max_lag, max_lag + 1)):
+        if abs(lag) >= size:
+            continue
+        first = x[max(0, -lag) : size - max(0, lag)]
+        second = y[max(0, lag) : size - max(0, -lag)]
+        valid = ~(np.isnan(first) | np.isnan(second))
+        if valid.sum() < 3:
+            continue
+        first, second = first[valid], second[valid]
+        first, second = first - first.mean(), second - second.mean()
+        scale = np.sqrt((first * first).sum() * (second * second).sum())
+        if scale:
+            correlations[position] = (first * second).sum() / scale
+    return correlations
+
+
+def lagged_correlations(
+    joined: pd.DataFrame,
+    *,
+    signal: str = 'attack_packets',
+    against: tuple = TELEMETRY_COLUMNS,
+    max_lag: float = 10.0,
+    bucket: float = 1.0,
+) -> pd.DataFrame:
+    """Correlate a network metric with the telemetry of the host, see `cross_correlation`.
+
+    Args:
+        joined: The network metrics joined with the telemetry, see `align_telemetry`.
+        signal: The network metric, one of the `NETWORK_COLUMNS`.
+        against: The columns correlated with the metric.
+        max_lag: The largest lag, in seconds.
+        bucket: The width of the buckets, in seconds.
+
+    Returns:
+        The correlations, indexed by the lag in seconds, one column per column of `against`.
+    """
+    lags = int(round(max_lag / bucket))
+    signal_values = joined[signal].to_numpy(np.float64)
+    return pd.DataFrame(
+        {
+            column: cross_correlation(
+                signal_values, joined[column].to_numpy(np.float64), lags
+            )
+            for column in against
+        },
+        index=pd.Index(np.arange(-lags, lags + 1) * bucket, name='lag'),
+    )
+
+
+def peak_correlations(correlations: pd.DataFrame) -> dict:
+    """Find the strongest correlation of each column, see `lagged_correlations`.
+
+    Args:
+        correlations: The correlations, indexed by lag.
+
+    Returns:
+        For each column, the lag and the correlation of largest magnitude, (NaN, NaN) if there is none.
+
+    Examples:
+        >>> correlations = pd.DataFrame({'CPU (%)': [0.1, -0.2, 0.8]}, index=[-1.0, 0.0, 1.0])
+        >>> peak_correlations(correlations)
+        {'CPU (%)': (1.0, 0.8)}
+    """
+    peaks = {}
+    for column in correlations.columns:
+        values = correlations[column].to_numpy(np.float64)
+        if np.isnan(values).all():
+            peaks[column] = (np.nan, np.nan)
+            continue
+        position = int(np.nanargmax(np.abs(values)))
+        peaks[column] = (
+            float(correlations.index[position]),
+            float(values[position]),
+        )
+    return peaks
+
+
+def correlate_corpus(
+    captures: dict,
+    *,
+    signal: str = 'attack_packets',
+    max_lag: float = 10.0,
+    bucket: float = 1.0,
+    method: str = 'interpolate',
+) -> pd.DataFrame:
+    """Relate a network metric to the telemetry of the host over many captures.
+
+    Args:
+        captures: The network metrics and the telemetry of each capture, as `{name: (network, telemetry)}` or `{name: (network, telemetry, offset)}`, see `network_series`, `load_performance_data` and the `offset` of `align_telemetry`, such as the start of the window of a capture analysed from a later time.
+        signal: The network metric, one of the `NETWORK_COLUMNS`.
+        max_lag: The largest lag, in seconds.
+        bucket: The width of the buckets, in seconds.
+        method: How the telemetry is resampled, see `align_telemetry`.
+
+    Returns:
+        One row per capture, indexed by name, with the correlation at lag 0, the peak lag and the peak correlation of each of the `TELEMETRY_COLUMNS`.
+    """
+    rows = {}
+    for name, (network, telemetry, *offset) in captures.items():
+        joined = align_telemetry(
+            network,
+            telemetry,
+            bucket=bucket,
+            offset=offset[0] if offset else 0.0,
+            method=method,
+        )
+        correlations = lagged_correlations(
+            joined, signal=signal, max_lag=max_lag, bucket=bucket
+        )
+        row = {}
+        for column, (lag, peak) in peak_correlations(correlations).items():
+            row[f'{column} r'] = float(correlations[column].loc[0.0])
+            row[f'{column} peak lag'] = lag
+            row[f'{column} peak r'] = peak
+        rows[name] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def _bucket_index(
+    times: np.ndarray, bucket: float, start: float = 0.0
+) -> np.ndarray:
+    """The time bucket of each time, rounded as in `sum_buckets`."""
+    times = np.asarray(times, dtype=np.float64) - start
+    return np.floor(np.round(times / bucket, 9)).astype(np.int64)
+
+
+def _means(index: np.ndarray, values: np.ndarray, buckets: int) -> np.ndarray:
+    """The mean of the values of each bucket, NaN in the empty ones."""
+    inside = (index >= 0) & (index < buckets)
+    sums = np.bincount(
+        index[inside], weights=values[inside], minlength=buckets
+    )
+    counts = np.bincount(index[inside], minlength=buckets)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _bucket_means(rtts: list, buckets: int, bucket: float) -> np.ndarray:
+    """The mean RTT of each bucket, from [index, relative time, rtt] entries."""
+    if not len(rtts):
+        return np.full(buckets, np.nan)
+    rtts = np.asarray(rtts, dtype=np.float64)
+    return _means(_bucket_index(rtts[:, 1], bucket), rtts[:, 2], buckets)
@@ -0,0 +1,142 @@
+"""
+Provides an on-disk cache of the packet tables, so a capture is only decoded
+once. The tables are stored as `.npy` files, loaded back memory-mapped, and the
+least recently used files are evicted when the cache grows too large, along
+with the packet indexes and performance copies kept in the same directory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+from preprocessing.index import INDEX_SUFFIX
+from preprocessing.packet_table import PACKET_DTYPE
+
+DEFAULT_CACHE_SIZE = 1 << 30
+CACHE_SUFFIX = '.npy'
+# The files the cache owns: the packet tables, the packet indexes and the
+# columnar copies of the performance data (`COLUMNAR_SUFFIX` of
+# `plot.performance`), which `main` all keeps in the cache directory
+CACHE_SUFFIXES = (CACHE_SUFFIX, INDEX_SUFFIX, '.perf.npz')
+
+
+def cache_key(file_path: str, **parameters) -> str:
+    """Build the cache key of the packet table of a capture.
+
+    The key changes whenever the file is modified (its size or modification
+    time changes) or the table is built with other parameters.
+
+    Args:
+        file_path: The PCAPNG file the table is built from.
+        **parameters: The parameters the table is built with, serialisable to JSON.
+
+    Returns:
+        The key, as a hexadecimal string.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+
+    Examples:
+        >>> key = cache_key('tests/assets/example.pcapng', max_duration=60)
+        >>> len(key), key == cache_key('tests/assets/example.pcapng', max_duration=60)
+        (64, True)
+        >>> key == cache_key('tests/assets/example.pcapng', max_duration=None)
+        False
+    """
+    stat = os.stat(file_path)
+    identity = {
+        'file': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'dtype': PACKET_DTYPE.descr,
+        'parameters': parameters,
+    }
+    return hashlib.sha256(
+        json.dumps(identity, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def load_table(key: str, cache_dir: str) -> np.ndarray | None:
+    """Load a packet table from the cache, memory-mapped and read-only.
+
+    Args:
+        key: The key of the table, see `cache_key`.
+        cache_dir: The directory of the cache.
+
+    Returns:
+        The packet table, or **None** if it is not in the cache.
+    """
+    path = os.path.join(cache_dir, key + CACHE_SUFFIX)
+    try:
+        table = np.load(path, mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+    if table.dtype != PACKET_DTYPE:
+        return None
+    # Mark the table as recently used for the eviction
+    os.utime(path)
+    return table
+
+
+def store_table(
+    key: str,
+    table: np.ndarray,
+    cache_dir: str,
+    max_size: int = DEFAULT_CACHE_SIZE,
+) -> None:
+    """Store a packet table in the cache, then evict the oldest files if needed.
+
+    The file is written under a temporary name and renamed, so concurrent
+    readers never see a partial table.
+
+    Args:
+        key: The key of the table, see `cache_key`.
+        table: The packet table.
+        cache_dir: The directory of the cache, created if needed.
+        max_size: The maximum size of the cache, in bytes.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fdesc, temp_path = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+    try:
+        with os.fdopen(fdesc, 'wb') as file:
+            np.save(file, table, allow_pickle=False)
+        os.replace(temp_path, os.path.join(cache_dir, key + CACHE_SUFFIX))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    evict_tables(cache_dir, max_size)
+
+
+def evict_tables(cache_dir: str, max_size: int) -> list[str]:
+    """Delete the least recently used files until the cache fits its size.
+
+    Every file the cache owns counts towards its size, see `CACHE_SUFFIXES`,
+    the files being written excepted.
+
+    Args:
+        cache_dir: The directory of the cache.
+        max_size: The maximum size of the cache, in bytes.
+
+    Returns:
+        The paths of the deleted files.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(CACHE_SUFFIXES):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    deleted = []
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted.append(path)
+    return deleted
@@ -0,0 +1,279 @@
+"""
+Provides the index of a corpus of captures: the summary of the analysis of
+each capture, see `capture_result`, is kept in one SQLite file along with the
+identity of the capture and of the profile it was analysed with. The
+captures that did not change since their analysis are not analysed again, and
+the questions across captures, such as the mean RTT of each security mode,
+are answered by SQL queries instead of opening the charts one by one.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from lazy import lazy_import
+from preprocessing.export import SUMMARY_SCHEMA, CaptureResult
+from preprocessing.profile import AnalysisProfile
+
+pd = lazy_import('pandas')
+
+SQL_TYPES = {
+    'string': 'TEXT',
+    'float64': 'REAL',
+    'int64': 'INTEGER',
+    'Int64': 'INTEGER',
+}
+CORPUS_COLUMNS = {
+    'path': 'TEXT PRIMARY KEY',
+    'size': 'INTEGER NOT NULL',
+    'mtime_ns': 'INTEGER NOT NULL',
+    'profile_key': 'TEXT NOT NULL',
+    'analysed_at': 'REAL NOT NULL',
+    **{name: SQL_TYPES[dtype] for name, dtype in SUMMARY_SCHEMA.items()},
+}
+
+
+def profile_key(profile: AnalysisProfile) -> str:
+    """Build the key of the profile a capture is analysed with.
+
+    Args:
+        profile: The profile.
+
+    Returns:
+        The key, as a hexadecimal string, which changes with any field of the profile.
+
+    Examples:
+        >>> profile_key(AnalysisProfile()) == profile_key(AnalysisProfile())
+        True
+        >>> profile_key(AnalysisProfile()) == profile_key(AnalysisProfile(bucket=0.5))
+        False
+    """
+    return hashlib.sha256(
+        json.dumps(profile._asdict(), sort_keys=True).encode()
+    ).hexdigest()
+
+
+def file_identity(file_path: str) -> tuple:
+    """Identify the version of a capture file.
+
+    Args:
+        file_path: The file.
+
+    Returns:
+        The size of the file, in bytes, and its modification time, in nanoseconds.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+    return stat.st_size, stat.st_mtime_ns
+
+
+class CorpusIndex:
+    """The SQLite index of the summaries of a corpus of captures.
+
+    There is a row per capture file, replaced whenever the file is analysed
+    again. The rows are indexed by attack type and name, the partitions the
+    corpus is compared on.
+
+    Examples:
+        >>> with CorpusIndex(':memory:') as corpus:
+        ...     corpus.is_current('tests/assets/0-dos_attack_example.pcapng', AnalysisProfile())
+        False
+    """
+
+    def __init__(self, path: str):
+        """Open the index, created if it does not exist.
+
+        Args:
+            path: The SQLite file of the index, or ':memory:'.
+        """
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        columns = ', '.join(
+            f'"{name}" {sql_type}' for name, sql_type in CORPUS_COLUMNS.items()
+        )
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS captures ({columns})'
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS captures_attack '
+                'ON captures (attack_type, attack_name)'
+            )
+
+    def __enter__(self) -> 'CorpusIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the index."""
+        self.connection.close()
+
+    def is_current(self, file_path: str, profile: AnalysisProfile) -> bool:
+        """Tell whether the summary of a capture is up to date.
+
+        Args:
+            file_path: The PCAPNG file of the capture.
+            profile: The profile the capture is to be analysed with.
+
+        Returns:
+            True if the file was analysed with the profile and did not change since, False otherwise.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        size, mtime_ns = file_identity(file_path)
+        row = self.connection.execute(
+            'SELECT size, mtime_ns, profile_key FROM captures WHERE path = ?',
+            (os.path.abspath(file_path),),
+        ).fetchone()
+        return row == (size, mtime_ns, profile_key(profile))
+
+    def stale_files(self, files: list, profile: AnalysisProfile) -> list:
+        """Find the captures to analyse again, see `is_current`.
+
+        Args:
+            files: The PCAPNG files of the captures.
+            profile: The profile the captures are to be analysed with.
+
+        Returns:
+            The files whose summary is missing or out of date, in the order of `files`.
+        """
+        return [
+            file_path
+            for file_path in files
+            if not self.is_current(file_path, profile)
+        ]
+
+    def update(
+        self,
+        result: CaptureResult,
+        profile: AnalysisProfile,
+        *,
+        identity: tuple | None = None,
+    ) -> None:
+        """Store the summary of the analysis of a capture.
+
+        Args:
+            result: The results of the analysis, see `main`.
+            profile: The profile the capture was analysed with.
+            identity: The identity of the file when it was analysed, see `file_identity`. Defaults to its current one.
+
+        Raises:
+            FileNotFoundError: If the file of the capture does not exist and no identity is given.
+        """
+        file_path = result.summary['file']
+        size, mtime_ns = identity or file_identity(file_path)
+        row = {
+            'path': os.path.abspath(file_path),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'profile_key': profile_key(profile),
+            'analysed_at': time.time(),
+            **{
+                name: _sql_value(result.summary[name])
+                for name in SUMMARY_SCHEMA
+            },
+        }
+        names = ', '.join(f'"{name}"' for name in row)
+        marks = ', '.join('?' for _ in row)
+        with self.connection:
+            self.connection.execute(
+                f'INSERT OR REPLACE INTO captures ({names}) VALUES ({marks})',
+                tuple(row.values()),
+            )
+
+    def remove_missing(self) -> list:
+        """Forget the captures whose file no longer exists.
+
+        Returns:
+            The paths of the captures forgotten.
+        """
+        paths = [
+            path
+            for (path,) in self.connection.execute('SELECT path FROM captures')
+            if not os.path.exists(path)
+        ]
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM captures WHERE path = ?',
+                [(path,) for path in paths],
+            )
+        return paths
+
+    def query(self, sql: str, parameters: tuple = ()) -> pd.DataFrame:
+        """Run a query on the `captures` table of the index.
+
+        Args:
+            sql: The SQL query.
+            parameters: The parameters of the query.
+
+        Returns:
+            The rows of the result.
+        """
+        return pd.read_sql_query(sql, self.connection, params=parameters)
+
+    def summaries(self) -> pd.DataFrame:
+        """Read the summaries of all the captures.
+
+        Returns:
+            One row per capture, ordered by attack type, attack name and file, with the `SUMMARY_SCHEMA`.
+        """
+        columns = ', '.join(f'"{name}"' for name in SUMMARY_SCHEMA)
+        return self.query(
+            f'SELECT {columns} FROM captures '
+            'ORDER BY attack_type, attack_name, file'
+        ).astype(SUMMARY_SCHEMA)
+
+    def rtt_by_security_mode(self) -> pd.DataFrame:
+        """Compare the RTTs of the security modes over the corpus.
+
+        The means are weighted by the number of RTTs of each capture.
+
+        Returns:
+            One row per security mode (attack type), with its number of captures and the mean and largest RTT of each flow, in milliseconds.
+        """
+        return self.query(
+            'SELECT attack_type, COUNT(*) AS captures, '
+            'SUM(rtt_cs_mean * rtt_cs_count) / SUM(rtt_cs_count) AS rtt_cs_mean, '
+            'MAX(rtt_cs_max) AS rtt_cs_max, '
+            'SUM(rtt_as_mean * rtt_as_count) / SUM(rtt_as_count) AS rtt_as_mean, '
+            'MAX(rtt_as_max) AS rtt_as_max '
+            'FROM captures GROUP BY attack_type ORDER BY attack_type'
+        ).set_index('attack_type')
+
+    def throughput_by_attack(self) -> pd.DataFrame:
+        """Compare the throughput of the attacks over the corpus.
+
+        Returns:
+            One row per attack name, with its number of captures, its largest peak throughput, the security mode of that peak and its mean throughput, in kbps.
+        """
+        return self.query(
+            'SELECT attack_name, COUNT(*) AS captures, '
+            'MAX(throughput_peak_kbps) AS throughput_peak_kbps, '
+            'attack_type AS peak_attack_type, '
+            'AVG(throughput_mean_kbps) AS throughput_mean_kbps '
+            'FROM captures GROUP BY attack_name ORDER BY attack_name'
+        ).set_index('attack_name')
+
+
+def _sql_value(value):
+    """A value of a summary as stored by SQLite, with NaN and missing values as NULL."""
+    if value is None or value is pd.NA:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
@@ -0,0 +1,244 @@
+"""
+Provides a fast decoder of the Ethernet, IPv4, TCP and UDP headers, reading
+the fields straight from the raw frame bytes instead of dissecting the packet
+with scapy, and of the headers of the OPC UA TCP message starting the TCP
+payload (see `uatcp`).
+"""
+
+import socket
+import struct
+from typing import NamedTuple
+
+from preprocessing.uatcp import decode_message
+
+LINKTYPE_ETHERNET = 1
+ETHERTYPE_IPV4 = 0x0800
+VLAN_ETHERTYPES = (0x8100, 0x88A8)
+PROTO_TCP = 6
+PROTO_UDP = 17
+
+_UINT16 = struct.Struct('!H')
+_IPV4 = struct.Struct('!BxH2xHxB2xII')
+_PORTS = struct.Struct('!HH')
+_TCP = struct.Struct('!HHIIBB')
+
+
+class PacketRecord(NamedTuple):
+    """The header fields of a packet needed by the analysis.
+
+    Addresses are integers (see `mac_to_int` and `ip_to_int`) and the fields of
+    the missing layers are 0. `frame` is the raw frame itself, not a copy.
+    `payload_length` is the length of the TCP payload announced by the IPv4
+    header, which may be longer than what the capture kept of it, and
+    `payload_offset` where it starts in the frame. `request_id` is the request
+    identifier of the OPC UA message starting the payload, -1 if there is none,
+    and `service` the identifier of the encoding of its service, 0 if there is
+    none (see `uatcp.SERVICES`).
+    """
+
+    time: float
+    length: int
+    mac_src: int
+    mac_dst: int
+    ethertype: int
+    ip_src: int
+    ip_dst: int
+    proto: int
+    sport: int
+    dport: int
+    tcp_flags: int
+    frame: bytes | memoryview
+    seq: int = 0
+    ack: int = 0
+    payload_length: int = 0
+    payload_offset: int = 0
+    request_id: int = -1
+    service: int = 0
+
+    @property
+    def is_ipv4(self) -> bool:
+        """True if the packet carries an IPv4 header."""
+        return self.ethertype == ETHERTYPE_IPV4
+
+    @property
+    def is_tcp(self) -> bool:
+        """True if the packet carries a TCP header."""
+        return self.is_ipv4 and self.proto == PROTO_TCP
+
+
+def mac_to_int(mac: str) -> int:
+    """Convert a MAC address to its 48-bit integer representation.
+
+    Args:
+        mac: The MAC address, in the `aa:bb:cc:dd:ee:ff` format.
+
+    Returns:
+        The MAC address as an integer.
+
+    Examples:
+        >>> mac_to_int('e4:5f:01:2e:1a:b6')
+        251096692824758
+    """
+    return int(mac.replace(':', ''), 16)
+
+
+def int_to_mac(value: int) -> str:
+    """Convert a 48-bit integer back to a MAC address.
+
+    Args:
+        value: The MAC address as an integer.
+
+    Returns:
+        The MAC address, in the `aa:bb:cc:dd:ee:ff` format.
+
+    Examples:
+        >>> int_to_mac(251096692824758)
+        'e4:5f:01:2e:1a:b6'
+    """
+    return int(value).to_bytes(6, 'big').hex(':')
+
+
+def ip_to_int(ip: str) -> int:
+    """Convert an IPv4 address to its 32-bit integer representation.
+
+    Args:
+        ip: The IPv4 address in dotted notation.
+
+    Returns:
+        The IPv4 address as an integer.
+
+    Examples:
+        >>> ip_to_int('192.168.164.101')
+        3232277605
+    """
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value: int) -> str:
+    """Convert a 32-bit integer back to an IPv4 address.
+
+    Args:
+        value: The IPv4 address as an integer.
+
+    Returns:
+        The IPv4 address in dotted notation.
+
+    Examples:
+        >>> int_to_ip(3232277605)
+        '192.168.164.101'
+    """
+    return socket.inet_ntoa(struct.pack('!I', int(value)))
+
+
+def decode_frame(
+    frame: bytes | memoryview, time: float, linktype: int = LINKTYPE_ETHERNET
+) -> PacketRecord:
+    """Decode the headers of an Ethernet frame.
+
+    VLAN tags are skipped, IPv4 options are honoured and the transport header
+    is only read from the first fragment of a datagram, as scapy does. Headers
+    cut short by the capture length are treated as missing, and frames of other
+    link types than Ethernet only carry their time and length.
+
+    Args:
+        frame: The raw bytes of the frame.
+        time: The capture timestamp of the frame, in seconds.
+        linktype: The link type of the interface that captured the frame.
+
+    Returns:
+        The record of the frame.
+
+    Examples:
+        >>> frame = bytes.fromhex(
+        ...     'e45f012e1ab6e45f012e1bc10800'
+        ...     '4500002800004000400600000a0000010a000002'
+        ...     'c0de12e90000000100000000501800000000000000'
+        ... )
+        >>> record = decode_frame(frame, 1.5)
+        >>> int_to_ip(record.ip_src), int_to_ip(record.ip_dst)
+        ('10.0.0.1', '10.0.0.2')
+        >>> record.sport, record.dport, record.tcp_flags, record.is_tcp
+        (49374, 4841, 24, True)
+        >>> record.seq, record.ack, record.payload_length
+        (1, 0, 0)
+    """
+    view = memoryview(frame)
+    size = len(view)
+    mac_src = mac_dst = ethertype = ip_src = ip_dst = proto = 0
+    sport = dport = tcp_flags = seq = ack = payload_length = 0
+    payload_offset = 0
+    request_id = -1
+    service = 0
+
+    if linktype == LINKTYPE_ETHERNET and size >= 14:
+        mac_dst = int.from_bytes(view[0:6], 'big')
+        mac_src = int.from_bytes(view[6:12], 'big')
+        (ethertype,) = _UINT16.unpack_from(view, 12)
+        offset = 14
+        while ethertype in VLAN_ETHERTYPES and size >= offset + 4:
+            (ethertype,) = _UINT16.unpack_from(view, offset + 2)
+            offset += 4
+
+        if ethertype == ETHERTYPE_IPV4 and size >= offset + 20:
+            (
+                version_ihl,
+                total_length,
+                fragment,
+                proto,
+                ip_src,
+                ip_dst,
+            ) = _IPV4.unpack_from(view, offset)
+            header_length = (version_ihl & 0x0F) * 4
+            transport = offset + header_length
+            first_fragment = not fragment & 0x1FFF
+            if (
+                proto == PROTO_TCP
+                and first_fragment
+                and size >= transport + _TCP.size
+            ):
+                (
+                    sport,
+                    dport,
+                    seq,
+                    ack,
+                    data_offset,
+                    tcp_flags,
+                ) = _TCP.unpack_from(view, transport)
+                payload_offset = transport + (data_offset >> 4) * 4
+                payload_length = max(
+                    0, total_length - header_length - (data_offset >> 4) * 4
+                )
+                message = payload_length and decode_message(
+                    view[payload_offset : payload_offset + payload_length]
+                )
+                if message:
+                    request_id, service = message.request_id, message.service
+            elif (
+                proto == PROTO_UDP
+                and first_fragment
+                and size >= transport + _PORTS.size
+            ):
+                sport, dport = _PORTS.unpack_from(view, transport)
+        elif ethertype == ETHERTYPE_IPV4:
+            ethertype = 0
+
+    return PacketRecord(
+        time,
+        size,
+        mac_src,
+        mac_dst,
+        ethertype,
+        ip_src,
+        ip_dst,
+        proto,
+        sport,
+        dport,
+        tcp_flags,
+        frame,
+        seq,
+        ack,
+        payload_length,
+        payload_offset,
+        request_id,
+        service,
+    )
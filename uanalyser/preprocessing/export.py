@@ -0,0 +1,412 @@
+"""
+Provides the export of the results of an analysis in machine-readable tables:
+the series of each time bucket, the RTT of each request, the messages and RTTs
+of each OPC UA service, the sources flooding the server and a summary of the
+capture, with the same schema for every capture. Each table is written as
+one file per capture in its own directory, so the tables of a whole corpus
+are read back by a single columnar scan instead of analysing the captures
+again.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import NamedTuple
+
+import numpy as np
+from lazy import lazy_import
+from preprocessing.alignment import network_series
+from preprocessing.decoder import int_to_ip
+from preprocessing.operations import count_services, detect_service_flood
+from preprocessing.sharding import CaptureAnalysis
+
+pd = lazy_import('pandas')
+
+PER_SECOND_SCHEMA = {
+    'capture': 'string',
+    'time': 'float64',
+    'throughput_kbps': 'float64',
+    'opcua_packets': 'int64',
+    'attack_packets': 'int64',
+    'rtt_cs': 'float64',
+    'rtt_as': 'float64',
+}
+RTT_SCHEMA = {
+    'capture': 'string',
+    'flow': 'string',
+    'packet_index': 'int64',
+    'time': 'float64',
+    'rtt_ms': 'float64',
+}
+SUMMARY_SCHEMA = {
+    'capture': 'string',
+    'file': 'string',
+    'attack_type': 'string',
+    'attack_name': 'string',
+    'start': 'float64',
+    'bucket': 'float64',
+    'packets': 'int64',
+    'duration': 'float64',
+    'attack_start_time': 'float64',
+    'attack_start_index': 'Int64',
+    'throughput_mean_kbps': 'float64',
+    'throughput_peak_kbps': 'float64',
+    'opcua_packets': 'int64',
+    'attack_packets': 'int64',
+    'rtt_cs_count': 'int64',
+    'rtt_cs_mean': 'float64',
+    'rtt_cs_max': 'float64',
+    'rtt_as_count': 'int64',
+    'rtt_as_mean': 'float64',
+    'rtt_as_max': 'float64',
+}
+SERVICE_SCHEMA = {
+    'capture': 'string',
+    'service': 'string',
+    'packets': 'int64',
+    'rtt_count': 'int64',
+    'rtt_mean_ms': 'float64',
+    'rtt_max_ms': 'float64',
+}
+FLOOD_SCHEMA = {
+    'capture': 'string',
+    'time': 'float64',
+    'source': 'string',
+    'requests': 'int64',
+}
+EXPORT_TABLES = {
+    'per_second': PER_SECOND_SCHEMA,
+    'rtts': RTT_SCHEMA,
+    'summary': SUMMARY_SCHEMA,
+    'services': SERVICE_SCHEMA,
+    'floods': FLOOD_SCHEMA,
+}
+EXPORT_FORMATS = {'parquet': '.parquet', 'csv': '.csv', 'json': '.jsonl'}
+
+
+class CaptureResult(NamedTuple):
+    """The results of the analysis of a capture, see `capture_result`.
+
+    `per_second`, `rtts`, `services` and `floods` are tables with the
+    `PER_SECOND_SCHEMA`, `RTT_SCHEMA`, `SERVICE_SCHEMA` and `FLOOD_SCHEMA`, and
+    `summary` is the row of the capture in the `SUMMARY_SCHEMA`. `images` are
+    the paths of the charts rendered and `exports` the paths of the files
+    written, see `export_result`.
+    """
+
+    summary: dict
+    per_second: pd.DataFrame | None
+    rtts: pd.DataFrame | None
+    services: pd.DataFrame | None = None
+    floods: pd.DataFrame | None = None
+    images: list = []
+    exports: list = []
+
+
+def capture_result(
+    analysis: CaptureAnalysis,
+    attack: dict,
+    *,
+    file: str,
+    capture: str,
+    start: float = 0.0,
+    bucket: float = 1.0,
+) -> CaptureResult:
+    """Gather the results of the analysis of a capture in tables.
+
+    Args:
+        analysis: The analysis of the capture, see `analyse_capture`.
+        attack: The attack of the capture, see `extract_attack_name`.
+        file: The PCAPNG file of the capture.
+        capture: The name of the capture in the tables, such as the output name of its charts.
+        start: The start of the window analysed, in seconds after the first packet.
+        bucket: The width of the time buckets, in seconds.
+
+    Returns:
+        The results, without images nor exports.
+
+    Examples:
+        >>> from preprocessing.sharding import analyse_capture
+        >>> analysis = analyse_capture('tests/assets/0-dos_attack_example.pcapng', '192.168.164.101', ['192.168.164.102'], [4840])
+        >>> attack = {'Type': 'None', 'Name': 'DOS ATTACK EXAMPLE'}
+        >>> result = capture_result(analysis, attack, file='0-dos_attack_example.pcapng', capture='0-dos_attack_example')
+        >>> result.summary['packets'], result.summary['attack_start_index'], result.summary['rtt_cs_count']
+        (3821, 1966, 1275)
+        >>> len(result.per_second), result.rtts['flow'].unique().tolist()
+        (59, ['C-S', 'A-S'])
+        >>> service = result.services.iloc[0]
+        >>> service['service'], int(service['packets']), int(service['rtt_count'])
+        ('ReadRequest', 664, 650)
+        >>> len(result.floods)
+        0
+    """
+    per_second = network_series(analysis, bucket=bucket)
+    per_second.insert(0, 'capture', capture)
+    per_second = per_second.astype(PER_SECOND_SCHEMA)
+
+    rtts = pd.concat(
+        [
+            pd.DataFrame(
+                _rtt_array(analysis.rtts[flow]),
+                columns=['packet_index', 'time', 'rtt_ms'],
+            ).assign(flow=flow)
+            for flow in ('C-S', 'A-S')
+        ],
+        ignore_index=True,
+    )
+    rtts.insert(0, 'capture', capture)
+    rtts = rtts[list(RTT_SCHEMA)].astype(RTT_SCHEMA)
+
+    table = analysis.table[~analysis.table['redundant']]
+    attack_start = analysis.attack_start or (np.nan, None)
+    summary = {
+        'capture': capture,
+        'file': file,
+        'attack_type': attack['Type'],
+        'attack_name': attack['Name'],
+        'start': float(start),
+        'bucket': float(bucket),
+        'packets': len(table),
+        'duration': float(table['time'][-1]) if len(table) else 0.0,
+        'attack_start_time': float(attack_start[0]),
+        'attack_start_index': attack_start[1],
+        'throughput_mean_kbps': _mean(per_second['throughput_kbps']),
+        'throughput_peak_kbps': _max(per_second['throughput_kbps']),
+        'opcua_packets': int(per_second['opcua_packets'].sum()),
+        'attack_packets': int(per_second['attack_packets'].sum()),
+    }
+    for column, flow in (('rtt_cs', 'C-S'), ('rtt_as', 'A-S')):
+        values = rtts.loc[rtts['flow'] == flow, 'rtt_ms']
+        summary[f'{column}_count'] = len(values)
+        summary[f'{column}_mean'] = _mean(values)
+        summary[f'{column}_max'] = _max(values)
+    return CaptureResult(
+        summary,
+        per_second,
+        rtts,
+        _service_table(table, analysis.service_rtts, capture),
+        _flood_table(table, capture, bucket),
+    )
+
+
+def summary_table(summaries: list) -> pd.DataFrame:
+    """Gather summaries of captures in a table with the `SUMMARY_SCHEMA`.
+
+    Args:
+        summaries: The summaries, see `capture_result`.
+
+    Returns:
+        One row per summary.
+    """
+    return pd.DataFrame(summaries, columns=list(SUMMARY_SCHEMA)).astype(
+        SUMMARY_SCHEMA
+    )
+
+
+def export_result(
+    result: CaptureResult, export_dir: str, *, format: str = 'csv'
+) -> list:
+    """Write the tables of the results of a capture.
+
+    Each table is written in its own directory, `{export_dir}/{table}/`, in a
+    file named after the capture, which replaces the one of an earlier
+    analysis atomically. Writing Parquet files requires pyarrow, the `parquet`
+    extra.
+
+    Args:
+        result: The results, see `capture_result`.
+        export_dir: The directory of the exports.
+        format: 'csv', 'json', written as JSON lines, or 'parquet'.
+
+    Returns:
+        The paths of the files, in the order of `EXPORT_TABLES`. The tables the results lack are not written.
+
+    Raises:
+        ValueError: If an unacceptable format is provided.
+        ImportError: If the format is 'parquet' and pyarrow is missing.
+    """
+    check_export_format(format)
+    tables = {
+        'per_second': result.per_second,
+        'rtts': result.rtts,
+        'summary': summary_table([result.summary]),
+        'services': result.services,
+        'floods': result.floods,
+    }
+    paths = []
+    for name, table in tables.items():
+        if table is None:
+            continue
+        directory = os.path.join(export_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory, f'{result.summary["capture"]}{EXPORT_FORMATS[format]}'
+        )
+        _write_table(path, table, format)
+        paths.append(path)
+    return paths
+
+
+def read_exports(
+    export_dir: str, table: str = 'summary', *, format: str = 'csv'
+) -> pd.DataFrame:
+    """Read a table of all the captures exported, see `export_result`.
+
+    Args:
+        export_dir: The directory of the exports.
+        table: One of the `EXPORT_TABLES`.
+        format: The format of the files, see `export_result`.
+
+    Returns:
+        The rows of every capture, in the order of their names, with the schema of the table.
+
+    Raises:
+        ValueError: If an unacceptable table or format is provided.
+        ImportError: If the format is 'parquet' and pyarrow is missing.
+    """
+    check_export_format(format)
+    if table not in EXPORT_TABLES:
+        raise ValueError(
+            f"Invalid export table: '{table}'. Acceptable values are: {list(EXPORT_TABLES)}"
+        )
+    schema = EXPORT_TABLES[table]
+    directory = os.path.join(export_dir, table)
+    suffix = EXPORT_FORMATS[format]
+    files = (
+        sorted(
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.endswith(suffix) and not name.startswith('.')
+        )
+        if os.path.isdir(directory)
+        else []
+    )
+    # The JSON lines of an empty table have no columns to read back
+    frames = [_read_table(path, format) for path in files]
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=list(schema)).astype(schema)
+    return pd.concat(frames, ignore_index=True)[list(schema)].astype(schema)
+
+
+def check_export_format(format: str) -> None:
+    """Check an export format, and that its writer is installed.
+
+    Args:
+        format: The format, see `export_result`.
+
+    Raises:
+        ValueError: If an unacceptable format is provided.
+        ImportError: If the format is 'parquet' and pyarrow is missing.
+
+    Examples:
+        >>> check_export_format('xml')
+        Traceback (most recent call last):
+        ...
+        ValueError: Invalid export format: 'xml'. Acceptable values are: ['parquet', 'csv', 'json']
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Invalid export format: '{format}'. Acceptable values are: {list(EXPORT_FORMATS)}"
+        )
+    if format == 'parquet':
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError(
+                'Parquet exports require pyarrow: install the parquet extra.'
+            )
+
+
+def _write_table(path: str, table: pd.DataFrame, format: str) -> None:
+    """Write a table atomically, so readers never see it half written."""
+    # The hidden temporary files are skipped by the dataset readers
+    fdesc, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.', suffix=EXPORT_FORMATS[format]
+    )
+    os.close(fdesc)
+    try:
+        if format == 'parquet':
+            table.to_parquet(temp_path, index=False)
+        elif format == 'csv':
+            table.to_csv(temp_path, index=False)
+        else:
+            table.to_json(temp_path, orient='records', lines=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _read_table(path: str, format: str) -> pd.DataFrame:
+    """Read a table written by `_write_table`."""
+    if format == 'parquet':
+        return pd.read_parquet(path)
+    if format == 'csv':
+        # Only the empty cells written for missing values are missing, so
+        # the 'None' attack type of the security mode 0 is read back as is
+        return pd.read_csv(path, keep_default_na=False, na_values=[''])
+    # The columns are typed by their schema, not guessed from their names
+    return pd.read_json(
+        path, orient='records', lines=True, dtype=False, convert_dates=False
+    )
+
+
+def _service_table(
+    table: np.ndarray, service_rtts: dict, capture: str
+) -> pd.DataFrame:
+    """The messages and RTTs of each service of the distinct packets of a capture, with the `SERVICE_SCHEMA`."""
+    packets = count_services(table['service'])
+    services = list(packets) + [
+        service for service in service_rtts if service not in packets
+    ]
+    rows = []
+    for service in services:
+        rtts = _rtt_array(service_rtts.get(service, []))[:, 2]
+        rows.append(
+            [
+                capture,
+                service,
+                packets.get(service, 0),
+                len(rtts),
+                _mean(rtts),
+                _max(rtts),
+            ]
+        )
+    return pd.DataFrame(rows, columns=list(SERVICE_SCHEMA)).astype(
+        SERVICE_SCHEMA
+    )
+
+
+def _flood_table(
+    table: np.ndarray, capture: str, bucket: float
+) -> pd.DataFrame:
+    """The sources flooding the server in the distinct packets of a capture, with the `FLOOD_SCHEMA`."""
+    floods = detect_service_flood(
+        table['time'], table['ip_src'], table['service'], bucket=bucket
+    )
+    return pd.DataFrame(
+        [
+            [capture, start, int_to_ip(source), requests]
+            for start, source, requests in floods
+        ],
+        columns=list(FLOOD_SCHEMA),
+    ).astype(FLOOD_SCHEMA)
+
+
+def _rtt_array(rtts: list) -> np.ndarray:
+    """The RTTs as an array of [index, relative time, rtt] rows."""
+    if not len(rtts):
+        return np.empty((0, 3))
+    return np.asarray(rtts, dtype=np.float64)
+
+
+def _mean(values) -> float:
+    """The mean of the values, NaN without values."""
+    return float(values.mean()) if len(values) else float('nan')
+
+
+def _max(values) -> float:
+    """The largest of the values, NaN without values."""
+    return float(values.max()) if len(values) else float('nan')
@@ -2,7 +2,14 @@
 Provides functions for handling PCAPNG files and extracting information from this.
 """
 
-import scapy.all as scapy
+from __future__ import annotations
+
+import struct
+from typing import Iterator
+
+from lazy import scapy
+from preprocessing.decoder import PacketRecord, decode_frame
+from preprocessing.pcapng import BLOCK_SHB, iter_block_records
 
 
 def open_pcapng_file(file_path: str) -> scapy.PacketList:
@@ -15,9 +22,8 @@ def open_pcapng_file(file_path: str) -> scapy.PacketList:
         The PCAPNG file opened by scapy package.
 
     Raises:
-        AttributeError: If `file_path` is **None**.
         FileNotFoundError: If the file does not exist.
-        ValueError: If `file_path` is an empty string or the if the file has no content.
+        ValueError: If `file_path` is **None** or an empty string, or if the file has no content.
 
     Examples:
         >>> open_pcapng_file('tests/assets/example.pcapng')
@@ -55,6 +61,155 @@ def open_pcapng_file(file_path: str) -> scapy.PacketList:
         raise ValueError(f'The file "{file_path}" has no content.')
 
 
+def iter_pcapng_file(file_path: str) -> Iterator[scapy.Packet]:
+    """Stream the packets of a PCAPNG file one at a time.
+
+    Unlike `open_pcapng_file`, the packets are never gathered in a
+    `scapy.PacketList`: each one is dissected when it is requested and can be
+    released right after, so memory use does not depend on the size of the
+    capture. The file is opened eagerly, so invalid paths fail on the call and
+    not on the first iteration.
+
+    Args:
+        file_path: The PCAPNG file to stream.
+
+    Returns:
+        A generator of the packets of the file, in capture order.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If `file_path` is **None**, an empty string or if the file has no content.
+
+    Examples:
+        >>> sum(1 for _ in iter_pcapng_file('tests/assets/example.pcapng'))
+        6129
+
+        >>> iter_pcapng_file('path/non_existent_example.pcapng')
+        Traceback (most recent call last):
+        ...
+        FileNotFoundError: No such file or directory: "path/non_existent_example.pcapng".
+
+        >>> iter_pcapng_file('tests/assets/null_example.pcapng')
+        Traceback (most recent call last):
+        ...
+        ValueError: The file "tests/assets/null_example.pcapng" has no content.
+    """
+    if not file_path:
+        raise ValueError('`file_path` must not be None or an empty string.')
+
+    try:
+        reader = scapy.PcapNgReader(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+    except scapy.Scapy_Exception:
+        raise ValueError(f'The file "{file_path}" has no content.')
+
+    return _stream_packets(reader)
+
+
+def _stream_packets(reader: scapy.PcapNgReader) -> Iterator[scapy.Packet]:
+    """Yield the packets of an opened reader and close it when exhausted."""
+    with reader:
+        yield from reader
+
+
+def iter_pcapng_records(file_path: str) -> Iterator[PacketRecord]:
+    """Stream the packets of a PCAPNG file as decoded header records.
+
+    The frames are read with `scapy.RawPcapNgReader` and decoded by
+    `decode_frame`, so no scapy layer is ever dissected.
+
+    Args:
+        file_path: The PCAPNG file to stream.
+
+    Returns:
+        A generator of the records of the file, in capture order.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If `file_path` is **None**, an empty string or if the file has no content.
+
+    Examples:
+        >>> records = iter_pcapng_records('tests/assets/0-dos_attack_example.pcapng')
+        >>> sum(1 for record in records if record.is_tcp)
+        7939
+
+        >>> iter_pcapng_records('tests/assets/null_example.pcapng')
+        Traceback (most recent call last):
+        ...
+        ValueError: The file "tests/assets/null_example.pcapng" has no content.
+    """
+    if not file_path:
+        raise ValueError('`file_path` must not be None or an empty string.')
+
+    try:
+        reader = scapy.RawPcapNgReader(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+    except scapy.Scapy_Exception:
+        raise ValueError(f'The file "{file_path}" has no content.')
+
+    return _stream_records(reader)
+
+
+def map_pcapng_file(file_path: str) -> Iterator[PacketRecord]:
+    """Stream the packets of a PCAPNG file as decoded header records, without scapy.
+
+    The file is memory-mapped and its blocks are walked directly (see
+    `pcapng.iter_frames`): the `frame` of each record is a `memoryview` slice
+    of the map, so no frame is ever copied. The records may replace the
+    packets of `open_pcapng_file` in the functions of `operations`, and
+    `list(map_pcapng_file(file_path))` its packet list. The file is checked
+    eagerly, so invalid paths fail on the call and not on the first iteration.
+
+    Args:
+        file_path: The PCAPNG file to stream.
+
+    Returns:
+        A generator of the records of the file, in capture order.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If `file_path` is **None**, an empty string or if the file has no content.
+
+    Examples:
+        >>> records = list(map_pcapng_file('tests/assets/example.pcapng'))
+        >>> len(records), type(records[0].frame).__name__
+        (6129, 'memoryview')
+
+        >>> map_pcapng_file('tests/assets/null_example.pcapng')
+        Traceback (most recent call last):
+        ...
+        ValueError: The file "tests/assets/null_example.pcapng" has no content.
+    """
+    if not file_path:
+        raise ValueError('`file_path` must not be None or an empty string.')
+
+    try:
+        with open(file_path, 'rb') as fdesc:
+            header = fdesc.read(12)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+    # The type of the Section Header Block reads the same in both byte orders
+    if len(header) < 12 or struct.unpack_from('<I', header)[0] != BLOCK_SHB:
+        raise ValueError(f'The file "{file_path}" has no content.')
+
+    return iter_block_records(file_path)
+
+
+def _stream_records(reader: scapy.RawPcapNgReader) -> Iterator[PacketRecord]:
+    """Decode the frames of an opened raw reader and close it when exhausted."""
+    # The readers of scapy 2.5 are not context managers
+    try:
+        for frame, metadata in reader:
+            time = (
+                (metadata.tshigh << 32) + metadata.tslow
+            ) / metadata.tsresol
+            yield decode_frame(frame, time, metadata.linktype)
+    finally:
+        reader.close()
+
+
 def extract_attack_name(file_path: str) -> dict:
     """Extract the name of the attack from the file name.
     The file name must be in the format `{attack_type}-{attack_name}.pcapng`.
@@ -0,0 +1,331 @@
+"""
+Provides the packet-time index of a PCAPNG capture: a sidecar file mapping
+the timestamp, and optionally the flow, of each packet to the offset of its
+Enhanced Packet Block. It is built once per capture, rebuilt whenever the
+capture changes, and lets a reader jump straight to a time window or a flow
+instead of walking the file from its first block.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from typing import Iterator, NamedTuple
+
+import numpy as np
+from preprocessing.decoder import PacketRecord, decode_frame
+from preprocessing.pcapng import (
+    Interface,
+    ReaderState,
+    iter_block_records,
+    iter_packet_blocks,
+    map_file,
+    packet_frame,
+)
+
+INDEX_SUFFIX = '.index.npz'
+INDEX_VERSION = 1
+
+INDEX_DTYPE = np.dtype(
+    [
+        ('time', np.float64),
+        ('offset', np.uint64),
+        ('context', np.uint32),
+        ('flow', np.uint64),
+    ]
+)
+
+_FLOW = struct.Struct('<IHIHB')
+
+
+class PacketIndex(NamedTuple):
+    """The packet-time index of a capture.
+
+    `packets` has one row per packet, in capture order, with the `INDEX_DTYPE`
+    dtype: its timestamp, the offset of its block, its reader context and its
+    flow (0 if the flows were not indexed). `contexts` are the distinct byte
+    orders and interfaces a reader must know to resume at a block, see
+    `ReaderState`.
+    """
+
+    packets: np.ndarray
+    contexts: tuple
+
+    def state(self, row: int) -> ReaderState:
+        """The reader state at the block of a packet.
+
+        Args:
+            row: The index of the packet in the capture.
+
+        Returns:
+            Where to start reading, for `iter_block_records`.
+        """
+        endian, interfaces = self.contexts[int(self.packets['context'][row])]
+        return ReaderState(
+            int(self.packets['offset'][row]), endian, interfaces
+        )
+
+    def seek(self, start: float) -> tuple[ReaderState | None, int]:
+        """Find the first packet at or after a time offset, as `seek_time`.
+
+        Args:
+            start: The time offset from the first packet of the capture, in seconds.
+
+        Returns:
+            The reader state at the packet found (**None** if no packet is that late) and its index in the capture.
+        """
+        times = self.packets['time']
+        if not len(times):
+            return None, 0
+        rows = np.flatnonzero(times - times[0] >= start)
+        if not len(rows):
+            return None, 0
+        return self.state(rows[0]), int(rows[0])
+
+    def flow_rows(self, flow: int) -> np.ndarray:
+        """Find the packets of a flow.
+
+        Args:
+            flow: The flow, see `flow_id`.
+
+        Returns:
+            The indexes of its packets in the capture.
+        """
+        return np.flatnonzero(self.packets['flow'] == flow)
+
+
+def flow_id(
+    ip_src: int, sport: int, ip_dst: int, dport: int, proto: int
+) -> int:
+    """Identify the flow of a packet, whatever its direction.
+
+    Args:
+        ip_src: The source IP address, as an integer.
+        sport: The source port.
+        ip_dst: The destination IP address, as an integer.
+        dport: The destination port.
+        proto: The IP protocol.
+
+    Returns:
+        A 64-bit identifier, the same for both directions of a flow, and never 0.
+
+    Examples:
+        >>> flow_id(1, 50000, 2, 4840, 6) == flow_id(2, 4840, 1, 50000, 6)
+        True
+        >>> flow_id(1, 50000, 2, 4840, 6) == flow_id(1, 50001, 2, 4840, 6)
+        False
+    """
+    first, second = sorted(((ip_src, sport), (ip_dst, dport)))
+    digest = hashlib.blake2b(
+        _FLOW.pack(*first, *second, proto), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+def record_flow_id(record: PacketRecord) -> int:
+    """Identify the flow of a decoded packet record, see `flow_id`.
+
+    Args:
+        record: The record of the packet.
+
+    Returns:
+        The identifier of its flow, 0 if it is not an IPv4 packet.
+    """
+    if not record.is_ipv4:
+        return 0
+    return flow_id(
+        record.ip_src, record.sport, record.ip_dst, record.dport, record.proto
+    )
+
+
+def build_index(file_path: str, *, flows: bool = False) -> PacketIndex:
+    """Build the packet-time index of a capture.
+
+    The timestamps are read from the block headers only. Indexing the flows
+    decodes the headers of every packet.
+
+    Args:
+        file_path: The PCAPNG file to index.
+        flows: Whether to index the flow of each packet.
+
+    Returns:
+        The index of the capture.
+
+    Examples:
+        >>> index = build_index('tests/assets/example.pcapng')
+        >>> len(index.packets), index.contexts
+        (6129, (('<', (Interface(linktype=1, tsresol=1000000),)),))
+    """
+    contexts = {}
+    times, offsets, context_ids = [], [], []
+    for state, time in iter_packet_blocks(file_path):
+        context = (state.endian, state.interfaces)
+        times.append(time)
+        offsets.append(state.offset)
+        context_ids.append(contexts.setdefault(context, len(contexts)))
+
+    packets = np.zeros(len(times), dtype=INDEX_DTYPE)
+    packets['time'] = times
+    packets['offset'] = offsets
+    packets['context'] = context_ids
+    if flows:
+        packets['flow'] = np.fromiter(
+            (
+                record_flow_id(record)
+                for record in iter_block_records(file_path)
+            ),
+            dtype=np.uint64,
+            count=len(packets),
+        )
+    return PacketIndex(packets, tuple(contexts))
+
+
+def index_path(file_path: str, index_dir: str | None = None) -> str:
+    """Find the sidecar file of the index of a capture.
+
+    Args:
+        file_path: The PCAPNG file.
+        index_dir: The directory of the sidecar files. **None** keeps the sidecar next to the capture.
+
+    Returns:
+        The path of the sidecar file.
+
+    Examples:
+        >>> index_path('tests/assets/example.pcapng')
+        'tests/assets/example.pcapng.index.npz'
+    """
+    if index_dir is None:
+        return file_path + INDEX_SUFFIX
+    # Captures of different directories may share their name
+    digest = hashlib.sha256(os.path.abspath(file_path).encode()).hexdigest()
+    name = f'{os.path.basename(file_path)}-{digest[:16]}{INDEX_SUFFIX}'
+    return os.path.join(index_dir, name)
+
+
+def load_index(
+    file_path: str, *, index_dir: str | None = None, flows: bool = False
+) -> PacketIndex:
+    """Load the index of a capture from its sidecar file, building it first if needed.
+
+    The sidecar records the size and modification time of the capture, and is
+    rebuilt when they change or when it lacks the requested flows. A sidecar
+    that cannot be written is skipped: the index is then rebuilt every time.
+
+    Args:
+        file_path: The PCAPNG file.
+        index_dir: The directory of the sidecar files. **None** keeps the sidecar next to the capture.
+        flows: Whether the flows of the packets must be indexed.
+
+    Returns:
+        The index of the capture.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+    identity = {
+        'version': INDEX_VERSION,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+    }
+
+    path = index_path(file_path, index_dir)
+    index = _read_index(path, identity, flows)
+    if index is not None:
+        if index_dir is not None:
+            # Mark the sidecar as recently used for the eviction of the cache
+            _touch(path)
+        return index
+
+    index = build_index(file_path, flows=flows)
+    try:
+        _write_index(path, index, {**identity, 'flows': flows})
+    except OSError:
+        pass
+    return index
+
+
+def iter_index_records(
+    file_path: str, index: PacketIndex, rows: np.ndarray
+) -> Iterator[PacketRecord]:
+    """Decode some packets of a capture, reading only their blocks.
+
+    The file is memory-mapped, so the blocks are read straight from the page
+    cache, and the blocks between the packets are never touched.
+
+    Args:
+        file_path: The PCAPNG file.
+        index: The index of the capture.
+        rows: The indexes of the packets in the capture, such as the ones of `PacketIndex.flow_rows`.
+
+    Yields:
+        The record of each packet, in the order of `rows`.
+
+    Examples:
+        >>> index = build_index('tests/assets/example.pcapng', flows=True)
+        >>> records = list(iter_index_records('tests/assets/example.pcapng', index, index.flow_rows(index.packets['flow'][100])))
+        >>> len(records), len({record_flow_id(record) for record in records})
+        (5117, 1)
+    """
+    with map_file(file_path) as buffer:
+        for row in rows:
+            offset = int(index.packets['offset'][row])
+            endian, interfaces = index.contexts[
+                int(index.packets['context'][row])
+            ]
+            (length,) = struct.unpack_from(endian + 'I', buffer, offset + 4)
+            yield decode_frame(
+                *packet_frame(
+                    buffer[offset + 8 : offset + length - 4],
+                    endian,
+                    interfaces,
+                )
+            )
+
+
+def _read_index(path: str, identity: dict, flows: bool) -> PacketIndex | None:
+    """Read a sidecar file, **None** if it is missing, stale or lacks the flows."""
+    try:
+        with np.load(path) as content:
+            meta = json.loads(str(content['meta']))
+            packets = content['packets']
+    except (OSError, KeyError, ValueError):
+        return None
+    if any(meta.get(key) != value for key, value in identity.items()):
+        return None
+    if flows and not meta.get('flows'):
+        return None
+    if packets.dtype != INDEX_DTYPE:
+        return None
+    contexts = tuple(
+        (endian, tuple(Interface(*interface) for interface in interfaces))
+        for endian, interfaces in meta['contexts']
+    )
+    return PacketIndex(packets, contexts)
+
+
+def _touch(path: str) -> None:
+    """Update the modification time of a file, if it can be."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _write_index(path: str, index: PacketIndex, identity: dict) -> None:
+    """Write a sidecar file atomically, so readers never see it half written."""
+    meta = json.dumps({**identity, 'contexts': index.contexts})
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fdesc, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fdesc, 'wb') as temp:
+            np.savez(temp, packets=index.packets, meta=np.array(meta))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,361 @@
+"""
+Provides the live monitoring of OPC UA traffic: packet sources following a
+growing capture file or a network interface, and a monitor keeping the
+throughput, packet rate, RTT and attack signal of a sliding window up to date.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import time
+from collections import deque
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+import numpy as np
+from lazy import scapy
+from preprocessing.decoder import PacketRecord, decode_frame
+from preprocessing.operations import (
+    RedundancyFilter,
+    calculate_package_time_difference,
+    classify_record,
+    ip_set,
+)
+from preprocessing.packet_table import COMM_TYPES, RTT_FLOWS
+from preprocessing.pcapng import decode_block, iter_blocks
+from preprocessing.rtt import DEFAULT_RTT_TIMEOUT, RttMatcher
+
+ATTACK_TYPE = COMM_TYPES.index('Attacker to Server')
+
+
+class LiveSnapshot(NamedTuple):
+    """The state of the sliding window of a `LiveMonitor`.
+
+    The bucket series go from the oldest to the current bucket, which may be
+    partial, and the RTTs are lists of `[relative time, RTT]`, in milliseconds.
+    """
+
+    time: float
+    throughput_kbps: np.ndarray
+    opcua_packets_per_second: np.ndarray
+    attack_packets: np.ndarray
+    rtts: dict
+    attack_start: tuple | None
+
+    @property
+    def under_attack(self) -> bool:
+        """True if an attack packet was seen in the window."""
+        return bool(self.attack_packets.any())
+
+
+def follow_pcapng_records(
+    file_path: str,
+    *,
+    poll_interval: float = 0.5,
+    idle_timeout: float | None = None,
+) -> Iterator[PacketRecord | None]:
+    """Follow a PCAPNG file while it is being written, as `tail -f` does.
+
+    Args:
+        file_path: The PCAPNG file to follow.
+        poll_interval: The time to wait for new blocks when the end of the file is reached, in seconds.
+        idle_timeout: Stop once no packet was written for this many seconds. **None** follows the file forever.
+
+    Yields:
+        The record of each packet, as soon as its block is complete, and **None** each time the end of the file is reached.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+
+    offset, endian, interfaces = 0, '<', []
+    last_packet = time.monotonic()
+    with open(file_path, 'rb') as fdesc:
+        while True:
+            fdesc.seek(offset)
+            for block_offset, block_type, body, endian in iter_blocks(
+                fdesc, endian
+            ):
+                # Resume after the last complete block, not after a block
+                # that was still being written
+                offset = block_offset + len(body) + 12
+                record = decode_block(block_type, body, endian, interfaces)
+                if record is not None:
+                    last_packet = time.monotonic()
+                    yield record
+
+            yield None
+            if (
+                idle_timeout is not None
+                and time.monotonic() - last_packet > idle_timeout
+            ):
+                return
+            time.sleep(poll_interval)
+
+
+def sniff_records(
+    iface: str | None = None,
+    *,
+    bpf_filter: str | None = None,
+    queue_size: int = 65536,
+    poll_interval: float = 0.5,
+) -> Iterator[PacketRecord | None]:
+    """Capture the packets of a network interface with a `scapy.AsyncSniffer`.
+
+    The sniffer thread decodes the packets into a bounded queue. When the
+    consumer falls behind and the queue is full, new packets are dropped
+    rather than buffered.
+
+    Args:
+        iface: The interface to capture. **None** captures the default interface of scapy.
+        bpf_filter: A BPF filter restricting the captured packets.
+        queue_size: The maximum number of packets waiting to be consumed.
+        poll_interval: The time to wait for a packet before yielding **None**, in seconds.
+
+    Yields:
+        The record of each captured packet, and **None** when no packet arrived during `poll_interval`.
+    """
+    records = queue.Queue(maxsize=queue_size)
+
+    def enqueue(packet):
+        try:
+            records.put_nowait(decode_frame(bytes(packet), float(packet.time)))
+        except queue.Full:
+            pass
+
+    sniffer = scapy.AsyncSniffer(
+        iface=iface, filter=bpf_filter, prn=enqueue, store=False
+    )
+    sniffer.start()
+    try:
+        while True:
+            try:
+                yield records.get(timeout=poll_interval)
+            except queue.Empty:
+                yield None
+    finally:
+        if sniffer.running:
+            sniffer.stop()
+
+
+class LiveMonitor:
+    """Keep the traffic statistics of a sliding window of the latest packets.
+
+    The buckets of the window are a ring buffer, the redundancy keys and RTTs
+    older than the window are dropped as packets arrive and the requests are
+    paired by a `RttMatcher`, which forgets the stale ones, so the memory
+    and the cost of a snapshot only depend on the window, not on the length
+    of the stream. The statistics are the ones of the offline analysis:
+    throughput of the distinct packets, OPC UA packets per bucket, RTTs of the
+    flows of `RTT_FLOWS` and attack packets.
+
+    Args:
+        server_ip: The IP address of the OPCUA server, or a list of them.
+        clients_ip: List of clients IP addresses.
+        ports: List of OPC UA ports.
+        window: The duration of the window, in seconds.
+        bucket: The width of the buckets, in seconds.
+        redundancy_key: The key identifying redundant packets, see `RedundancyFilter`.
+        rtt_timeout: The longest time a request waits for its response, in seconds, see `RttMatcher`.
+
+    Examples:
+        >>> from preprocessing.pcapng import iter_block_records
+        >>> monitor = LiveMonitor('192.168.164.101', ['192.168.164.102'], [4840], window=10)
+        >>> for record in iter_block_records('tests/assets/0-dos_attack_example.pcapng'):
+        ...     monitor.add(record)
+        >>> snapshot = monitor.snapshot()
+        >>> len(snapshot.throughput_kbps), snapshot.attack_start, snapshot.under_attack
+        (10, (32.341966, 1966), False)
+        >>> snapshot.opcua_packets_per_second
+        array([ 98., 105., 104.,  93., 107.,  91., 101., 107.,  95.,  50.])
+    """
+
+    def __init__(
+        self,
+        server_ip: str | list,
+        clients_ip: list,
+        ports: list,
+        *,
+        window: float = 60.0,
+        bucket: float = 1.0,
+        redundancy_key: str = 'time',
+        rtt_timeout: float = DEFAULT_RTT_TIMEOUT,
+    ):
+        self.server_ip = server_ip
+        self.clients_ip = clients_ip
+        # The addresses are parsed once, not for every packet
+        self._servers = ip_set(server_ip)
+        self._clients = ip_set(clients_ip)
+        self.ports = set(ports)
+        self.window = window
+        self.bucket = bucket
+        self._redundancy = RedundancyFilter(redundancy_key)
+
+        slots = max(1, int(np.ceil(round(window / bucket, 9))))
+        self._bytes = np.zeros(slots)
+        self._opcua = np.zeros(slots, dtype=np.int64)
+        self._attacks = np.zeros(slots, dtype=np.int64)
+        self._head = None
+
+        self._first = None
+        self._index = 0
+        self.now = 0.0
+        self.attack_start = None
+        self._recent_keys = {}
+        self._key_times = deque()
+        self._matcher = RttMatcher(ports, timeout=rtt_timeout)
+        self._request_flows = {
+            request: flow for flow, (request, _) in RTT_FLOWS.items()
+        }
+        self._rtts = {flow: deque() for flow in RTT_FLOWS}
+
+    def add(self, record: PacketRecord) -> None:
+        """Add a packet to the window.
+
+        Args:
+            record: The record of the packet, in capture order.
+        """
+        if self._first is None:
+            self._first = record
+        index = self._index
+        relative_time = calculate_package_time_difference(record, self._first)
+        comm_type = classify_record(record, self._servers, self._clients)
+        self._index += 1
+        self.now = max(self.now, relative_time)
+        self._expire()
+
+        if self._is_redundant(record, relative_time):
+            return
+
+        if comm_type == ATTACK_TYPE and self.attack_start is None:
+            self.attack_start = (relative_time, index)
+
+        slot = self._slot(relative_time)
+        if slot is not None:
+            self._bytes[slot] += record.length
+            self._opcua[slot] += (
+                record.sport in self.ports or record.dport in self.ports
+            )
+            self._attacks[slot] += comm_type == ATTACK_TYPE
+
+        # Pair on the relative times, as the offline analysis
+        matched = self._matcher.add_record(
+            record._replace(time=relative_time),
+            tag=self._request_flows.get(comm_type),
+        )
+        if matched is not None and matched[0] is not None:
+            self._rtts[matched[0]].append([relative_time, matched[2]])
+
+    def snapshot(self) -> LiveSnapshot:
+        """Take the statistics of the current window.
+
+        Returns:
+            The snapshot of the window.
+        """
+        slots = len(self._bytes)
+        head = self._head if self._head is not None else slots - 1
+        order = np.arange(head + 1, head + 1 + slots) % slots
+        return LiveSnapshot(
+            self.now,
+            self._bytes[order] / 1024 / self.bucket,
+            self._opcua[order] / self.bucket,
+            self._attacks[order].copy(),
+            {flow: list(rtts) for flow, rtts in self._rtts.items()},
+            self.attack_start,
+        )
+
+    def _bucket(self, relative_time: float) -> int:
+        """Find the bucket of a relative time, as `sum_buckets`."""
+        return int(np.floor(round(relative_time / self.bucket, 9)))
+
+    def _slot(self, relative_time: float) -> int | None:
+        """Find the ring slot of a relative time, moving the window forward if needed."""
+        slots = len(self._bytes)
+        bucket = self._bucket(relative_time)
+        if self._head is None:
+            self._head = bucket - 1
+        if bucket > self._head:
+            # Clear the buckets that leave the window
+            cleared = np.arange(self._head + 1, bucket + 1)[-slots:] % slots
+            self._bytes[cleared] = 0
+            self._opcua[cleared] = 0
+            self._attacks[cleared] = 0
+            self._head = bucket
+        elif bucket <= self._head - slots:
+            return None
+        return bucket % slots
+
+    def _is_redundant(
+        self, record: PacketRecord, relative_time: float
+    ) -> bool:
+        """Check if a packet repeats the key of a packet of the window."""
+        key = self._redundancy.packet_key(record)
+        if key in self._recent_keys:
+            return True
+        self._recent_keys[key] = relative_time
+        self._key_times.append((relative_time, key))
+        return False
+
+    def _expire(self) -> None:
+        """Forget the redundancy keys and RTTs older than the window."""
+        start = self.now - self.window
+        while self._key_times and self._key_times[0][0] < start:
+            _, key = self._key_times.popleft()
+            self._recent_keys.pop(key, None)
+        for rtts in self._rtts.values():
+            while rtts and rtts[0][0] < start:
+                rtts.popleft()
+
+
+def run_live(
+    source: Iterable[PacketRecord | None],
+    monitor: LiveMonitor,
+    on_tick: Callable[[LiveSnapshot], object],
+    *,
+    tick: float = 1.0,
+) -> int:
+    """Feed a live source to a monitor and report its window on every tick.
+
+    A tick happens each time the capture time moves `tick` seconds forward,
+    and, while the source is idle, each time `tick` seconds pass on the clock.
+    A last tick reports the window when the source ends.
+
+    Args:
+        source: The packet records, with **None** when no packet is available, as yielded by `follow_pcapng_records` and `sniff_records`. Any iterable of records, such as a replay of a capture file, works.
+        monitor: The monitor of the window.
+        on_tick: Called with the snapshot of the window on each tick. Returning a truthy value stops the monitoring.
+        tick: The interval between ticks, in seconds.
+
+    Returns:
+        The number of ticks.
+
+    Examples:
+        >>> from preprocessing.pcapng import iter_block_records
+        >>> monitor = LiveMonitor('192.168.164.101', ['192.168.164.102'], [4840], window=5)
+        >>> attacks = []
+        >>> run_live(iter_block_records('tests/assets/0-dos_attack_example.pcapng'), monitor, lambda snapshot: attacks.append(snapshot.under_attack))
+        46
+        >>> attacks.index(True), sum(attacks)
+        (16, 4)
+    """
+    ticks = 0
+    next_tick = tick
+    last_tick = time.monotonic()
+    for record in source:
+        if record is not None:
+            monitor.add(record)
+            due = monitor.now >= next_tick
+            if due:
+                next_tick = (monitor.now // tick + 1) * tick
+        else:
+            due = time.monotonic() - last_tick >= tick
+        if due:
+            ticks += 1
+            last_tick = time.monotonic()
+            if on_tick(monitor.snapshot()):
+                return ticks
+
+    on_tick(monitor.snapshot())
+    return ticks + 1
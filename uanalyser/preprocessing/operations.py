@@ -1,14 +1,158 @@
-import scapy.all as scapy
+from __future__ import annotations
+
+import functools
+import hashlib
+from typing import Hashable
+
+import numpy as np
+from lazy import scapy
+from preprocessing.decoder import PROTO_TCP, PacketRecord, ip_to_int
+from preprocessing.uatcp import SERVICES
+
+REDUNDANCY_KEYS = ('time', 'flow', 'payload')
+COMM_TYPES = (
+    'Unknown',
+    'Client to Server',
+    'Server to Client',
+    'Attacker to Server',
+    'Server to Attacker',
+)
+# The requests opening a secure channel or a session, which allocate resources
+# on the server and are the usual target of a flood
+FLOOD_SERVICES = (446, 461, 467)
+
+
+class RedundancyFilter:
+    """Flag redundant packets with constant-time lookups on a set of keys.
+
+    The filter remembers the key of every packet it has seen in a hash table,
+    so a packet is redundant when an earlier one had the same key. The keys
+    are:
+
+        - time: the capture timestamp.
+        - flow: the capture timestamp and the IP 5-tuple.
+        - payload: a hash of the frame content.
+
+    Args:
+        key: The key identifying redundant packets. Defaults to 'time'.
+
+    Raises:
+        ValueError: If an unacceptable key is provided.
+
+    Examples:
+        >>> redundancy = RedundancyFilter('time')
+        >>> [redundancy.seen(time) for time in [0.5, 1.0, 0.5]]
+        [False, False, True]
+        >>> redundancy.keys
+        [0.5, 1.0]
+
+        >>> RedundancyFilter('size')
+        Traceback (most recent call last):
+        ...
+        ValueError: Invalid redundancy key: 'size'. Acceptable values are: ['time', 'flow', 'payload']
+    """
+
+    def __init__(self, key: str = 'time'):
+        if key not in REDUNDANCY_KEYS:
+            raise ValueError(
+                f"Invalid redundancy key: '{key}'. Acceptable values are: {list(REDUNDANCY_KEYS)}"
+            )
+        self.key = key
+        self._seen = {}
+
+    @property
+    def keys(self) -> list:
+        """The distinct keys seen so far, in the order they were first seen."""
+        return list(self._seen)
+
+    def seen(self, key: Hashable) -> bool:
+        """Check if a key was seen before, and remember it.
+
+        Args:
+            key: The key of a packet.
+
+        Returns:
+            True if the key was already seen, False otherwise.
+        """
+        if key in self._seen:
+            return True
+        self._seen[key] = None
+        return False
+
+    def packet_key(self, packet: scapy.Packet | PacketRecord) -> Hashable:
+        """Build the key of a packet.
+
+        Args:
+            packet: The packet to be analysed, as a scapy packet or a decoded record.
+
+        Returns:
+            The key of the packet, according to the key of the filter.
+        """
+        # Scapy timestamps are decimals, which are not hashable in every
+        # scapy version
+        if self.key == 'time':
+            return float(packet.time)
+        if self.key == 'flow':
+            return float(packet.time), _five_tuple(packet)
+        if isinstance(packet, PacketRecord):
+            frame = packet.frame
+        else:
+            frame = getattr(packet, 'original', None) or bytes(packet)
+        return hashlib.blake2b(frame, digest_size=16).digest()
+
+    def is_redundant(self, packet: scapy.Packet | PacketRecord) -> bool:
+        """Check if a packet is redundant, and remember it.
+
+        Args:
+            packet: The packet to be analysed, as a scapy packet or a decoded record.
+
+        Returns:
+            True if an earlier packet had the same key, False otherwise.
+        """
+        return self.seen(self.packet_key(packet))
+
+
+def _five_tuple(packet: scapy.Packet | PacketRecord) -> tuple | None:
+    """Return the IP 5-tuple of a packet, or None if it is not an IP packet."""
+    if isinstance(packet, PacketRecord):
+        if not packet.is_ipv4:
+            return None
+        return (
+            packet.ip_src,
+            packet.ip_dst,
+            packet.proto,
+            packet.sport,
+            packet.dport,
+        )
+    if not packet.haslayer(scapy.IP):
+        return None
+    sport = dport = 0
+    if packet.haslayer(scapy.TCP):
+        sport, dport = packet[scapy.TCP].sport, packet[scapy.TCP].dport
+    elif packet.haslayer(scapy.UDP):
+        sport, dport = packet[scapy.UDP].sport, packet[scapy.UDP].dport
+    return (
+        packet[scapy.IP].src,
+        packet[scapy.IP].dst,
+        packet[scapy.IP].proto,
+        sport,
+        dport,
+    )
 
 
 def calculate_throughput_and_packets(
-    capture: scapy.PacketList, chronology_packets: list, period: float
+    capture: scapy.PacketList | list | dict,
+    chronology_packets: list,
+    period: float,
 ) -> list:
     """
     Calculates the throughput in kilobits per second (kbps) and the amount of packets per second for a given capture and chronology.
+    The per-second buckets are computed by `bin_traffic`.
+
+    This is the reference implementation over the `chronology_packets` list, which the pipeline no longer builds: `analyse_capture` sums the packet table into time buckets with `sum_buckets`.
 
     Args:
-        capture (scapy.PacketList): The captured packets.
+        capture (scapy.PacketList | list | dict): The captured packets or their records (see `map_pcapng_file`), or a mapping of packet index to frame length in bytes when the capture was streamed.
         chronology_packets (list): The list of packet chronologically organized and filtered.
         period (float): The duration of the capture period in seconds.
 
@@ -29,23 +173,217 @@ def calculate_throughput_and_packets(
 
         >>> calculate_throughput_and_packets(capture, chronology_packets, 15)
         ([0.0, 0.23828125, 0.1962890625, 0.064453125, 0.064453125, 1.404296875, 0.7880859375, 0.0, 0.0, 0.216796875, 0.15234375, 0.1552734375, 0.0, 0.0, 0.0], [0, 3, 2, 1, 1, 3, 2, 0, 0, 2, 1, 1, 0, 0, 0])
+
+        The frame lengths may also be given directly, so the packets themselves do not need to be kept in memory:
+
+        >>> frame_lengths = {elem[0]: len(capture[elem[0]]) for elem in chronology_packets}
+        >>> calculate_throughput_and_packets(frame_lengths, chronology_packets, 15)[1]
+        [0, 3, 2, 1, 1, 3, 2, 0, 0, 2, 1, 1, 0, 0, 0]
+
+        And so may the records of the packets:
+
+        >>> from preprocessing.file_handling import map_pcapng_file
+        >>> records = list(map_pcapng_file('tests/assets/example.pcapng'))
+        >>> calculate_throughput_and_packets(records, chronology_packets, 15)[0][:3]
+        [0.0, 0.23828125, 0.1962890625]
+    """
+    lengths = []
+    for elem in chronology_packets:
+        frame = capture[elem[0]]
+        if isinstance(frame, PacketRecord):
+            frame = frame.length
+        lengths.append(frame if isinstance(frame, int) else len(frame))
+    throughput_persecond, opcua_packets_persecond = bin_traffic(
+        [elem[1] for elem in chronology_packets],
+        lengths,
+        [elem[5] for elem in chronology_packets],
+        period,
+    )
+    return (
+        throughput_persecond.tolist(),
+        opcua_packets_persecond.astype(int).tolist(),
+    )
+
+
+def bin_traffic(
+    times: np.ndarray,
+    lengths: np.ndarray,
+    opcua_flags: np.ndarray,
+    period: float,
+    *,
+    bucket: float = 1.0,
+) -> tuple:
+    """Calculate the throughput and the OPC UA packet rate over fixed-width time buckets.
+
+    Every packet is assigned to its bucket at once and the buckets are summed
+    with `np.bincount`, so the cost is linear in the number of packets whatever
+    the length of the capture or the width of the buckets.
+
+    Args:
+        times (np.ndarray): The relative time of each packet, in seconds.
+        lengths (np.ndarray): The frame length of each packet, in bytes.
+        opcua_flags (np.ndarray): The OPC UA flag of each packet.
+        period (float): The duration of the capture period in seconds. Packets after the last whole bucket are ignored.
+        bucket (float, optional): The width of the buckets in seconds. Defaults to 1.0.
+
+    Returns:
+        throughput: The throughput in kilobits per second (kbps) of each bucket.
+        opcua_packets: The amount of OPC UA packets per second of each bucket.
+
+    Examples:
+        >>> kbps, packets = bin_traffic([0.05, 0.12, 0.18, 1.5], [100, 200, 300, 1024], [True, True, False, True], 2, bucket=0.5)
+        >>> kbps.tolist()
+        [1.171875, 0.0, 0.0, 2.0]
+        >>> packets.tolist()
+        [4.0, 0.0, 0.0, 2.0]
     """
-    segment_duration = 1
-    opcua_packets_persecond = []
-    throughput_persecond = []
-    for second in range(int(period)):
-        len_bytes = 0
-        packets = 0
-        for elem in chronology_packets:
-            if int(elem[1]) == second * segment_duration:
-                len_bytes += len(capture[elem[0]])
-                if elem[5]:
-                    packets += 1
-            if int(elem[1]) > second * segment_duration:
-                break
-        throughput_persecond.append(len_bytes)
-        opcua_packets_persecond.append(packets)
-    return [value / 1024 for value in throughput_persecond], opcua_packets_persecond
+    len_bytes, packets = sum_buckets(
+        times,
+        lengths,
+        opcua_flags,
+        count_buckets(period, bucket),
+        bucket=bucket,
+    )
+    return len_bytes / 1024 / bucket, packets / bucket
+
+
+def count_buckets(period: float, bucket: float = 1.0) -> int:
+    """Count the whole time buckets in a period.
+
+    Args:
+        period (float): The duration of the period in seconds.
+        bucket (float, optional): The width of the buckets in seconds. Defaults to 1.0.
+
+    Returns:
+        int: The number of whole buckets.
+
+    Examples:
+        >>> count_buckets(15.9), count_buckets(0.3, 0.1)
+        (15, 3)
+    """
+    return int(np.floor(round(period / bucket, 9)))
+
+
+def sum_buckets(
+    times: np.ndarray,
+    lengths: np.ndarray,
+    opcua_flags: np.ndarray,
+    buckets: int,
+    *,
+    bucket: float = 1.0,
+) -> tuple:
+    """Sum the bytes and count the OPC UA packets of each time bucket.
+
+    The sums are exact integers, so partial sums over slices of a capture add
+    up to the sums over the whole capture.
+
+    Args:
+        times (np.ndarray): The relative time of each packet, in seconds.
+        lengths (np.ndarray): The frame length of each packet, in bytes.
+        opcua_flags (np.ndarray): The OPC UA flag of each packet.
+        buckets (int): The number of buckets. Packets after the last one are ignored.
+        bucket (float, optional): The width of the buckets in seconds. Defaults to 1.0.
+
+    Returns:
+        len_bytes: The amount of bytes of each bucket.
+        opcua_packets: The amount of OPC UA packets of each bucket.
+
+    Examples:
+        >>> len_bytes, packets = sum_buckets([0.05, 0.12, 0.18, 1.5], [100, 200, 300, 1024], [True, True, False, True], 2)
+        >>> len_bytes.tolist(), packets.tolist()
+        ([600.0, 1024.0], [2, 1])
+    """
+    # Round before flooring, so e.g. 0.3 s falls in the 100 ms bucket 3, not 2
+    times = np.asarray(times, dtype=np.float64)
+    index = np.floor(np.round(times / bucket, 9)).astype(np.int64)
+    inside = (index >= 0) & (index < buckets)
+    index = index[inside]
+
+    len_bytes = np.bincount(
+        index,
+        weights=np.asarray(lengths, dtype=np.float64)[inside],
+        minlength=buckets,
+    )
+    packets = np.bincount(
+        index[np.asarray(opcua_flags, dtype=bool)[inside]], minlength=buckets
+    )
+    return len_bytes, packets
+
+
+def count_services(services: np.ndarray) -> dict:
+    """Count the messages of each OPC UA service.
+
+    The services are only known in the None and Sign security modes, see
+    `uatcp.decode_message`: the encrypted messages are not counted.
+
+    Args:
+        services (np.ndarray): The service of each message or packet, as the `service` column of a packet table (see `uatcp.SERVICES`). The packets without a known service are ignored.
+
+    Returns:
+        The number of messages of each service, by service name, from the most to the least frequent.
+
+    Examples:
+        >>> count_services([631, 634, 631, 0, 673])
+        {'ReadRequest': 2, 'ReadResponse': 1, 'WriteRequest': 1}
+    """
+    codes, counts = np.unique(np.asarray(services), return_counts=True)
+    known = np.isin(codes, list(SERVICES))
+    order = np.argsort(-counts[known], kind='stable')
+    return {
+        SERVICES[code]: count
+        for code, count in zip(
+            codes[known][order].tolist(), counts[known][order].tolist()
+        )
+    }
+
+
+def detect_service_flood(
+    times: np.ndarray,
+    sources: np.ndarray,
+    services: np.ndarray,
+    *,
+    threshold: int = 10,
+    bucket: float = 1.0,
+    flood_services: tuple = FLOOD_SERVICES,
+) -> list:
+    """Find the sources flooding the server with channel or session requests.
+
+    Opening secure channels or sessions costs the server far more than a
+    Read, and a client opens a handful of them, so a source sending more than
+    `threshold` of these requests in one time bucket is flagged.
+
+    Args:
+        times (np.ndarray): The relative time of each packet, in seconds.
+        sources (np.ndarray): The source IP address of each packet, as an integer.
+        services (np.ndarray): The service of each packet, see `uatcp.SERVICES`.
+        threshold (int, optional): The largest number of requests per source and bucket seen as legitimate. Defaults to 10.
+        bucket (float, optional): The width of the buckets in seconds. Defaults to 1.0.
+        flood_services (tuple, optional): The services counted. Defaults to the OpenSecureChannel, CreateSession and ActivateSession requests.
+
+    Returns:
+        A list of `[bucket start time, source, requests]` of the flooding sources, in time order.
+
+    Examples:
+        >>> detect_service_flood([0.1, 0.2, 0.3, 1.5], [7, 7, 8, 7], [461, 446, 461, 461], threshold=1)
+        [[0.0, 7, 2]]
+    """
+    services = np.asarray(services)
+    flood = np.isin(services, flood_services)
+    times = np.asarray(times, dtype=np.float64)[flood]
+    sources = np.asarray(sources, dtype=np.int64)[flood]
+    index = np.floor(np.round(times / bucket, 9)).astype(np.int64)
+
+    # One key per bucket and source: IPv4 addresses fit in 32 bits
+    keys, counts = np.unique((index << 32) | sources, return_counts=True)
+    flooding = counts > threshold
+    return [
+        [start * bucket, source, count]
+        for start, source, count in zip(
+            (keys[flooding] >> 32).tolist(),
+            (keys[flooding] & 0xFFFFFFFF).tolist(),
+            counts[flooding].tolist(),
+        )
+    ]
 
 
 def calculate_package_time_difference(
@@ -82,6 +420,8 @@ def calculate_round_trip_time(
 ) -> list:
     """Calculate the round trip time (RTT) for a given chronology and communication flow in milliseconds.
 
+    This is the reference implementation over the `chronology_packets` list, which the pipeline no longer builds: `analyse_capture` pairs the packet table with `match_round_trip_times`, or with `partial_round_trip_time` for the 'mac' key.
+
     Args:
         chronology_packets (list): The list of packet indices, timestamps, source and destination addresses, communication type and the is_opcua flag.
         flow (str, optional): The flow of communication. Defaults to 'C-S'. Acceptable values are: 'C-S' (request: Client to Server; response: Server to Client) and 'A-S' (request: Attacker to Server; response: Server to Attacker)
@@ -142,11 +482,14 @@ def calculate_round_trip_time(
     return rtts
 
 
-def clear_redundant_data(capture: scapy.PacketList) -> scapy.PacketList:
+def clear_redundant_data(
+    capture: scapy.PacketList, key: str = 'time'
+) -> scapy.PacketList:
     """Clear the redundant data from a packet capture.
 
     Args:
         capture: The packet capture.
+        key: The key identifying redundant packets, see `RedundancyFilter`. Defaults to 'time'.
 
     Returns:
         The packet capture without redundant data.
@@ -161,22 +504,26 @@ def clear_redundant_data(capture: scapy.PacketList) -> scapy.PacketList:
 
         >>> clear_redundant_data(capture)
         <PacketList: TCP:3212 UDP:110 ICMP:0 Other:7>
+
+        >>> len(clear_redundant_data(capture, 'payload'))
+        3322
     """
-    unique_packets = []
-    for packet in capture:
-        if packet.time not in [p.time for p in unique_packets]:
-            unique_packets.append(packet)
-    return scapy.PacketList(unique_packets)
+    redundancy = RedundancyFilter(key)
+    return scapy.PacketList(
+        [packet for packet in capture if not redundancy.is_redundant(packet)]
+    )
 
 
 def define_communication_type(
-    packet: scapy.Packet, server_ip: str, clients_ip: list
+    packet: scapy.Packet | PacketRecord,
+    server_ip: str | list,
+    clients_ip: list,
 ) -> str:
     """Define the communication type of a packet. If the packet is from the server to the client, the flow type is 'Server to Client'. If the packet is from the client to the server, the flow type is 'Client to Server'. If the packet is from the attacker to the server, the flow type is 'Attacker to Server'. If the packet is from the server to the attacker, the flow type is 'Server to Attacker'. If the packet is not from any of these flows, the flow type is 'Unknown'.
 
     Args:
-        packet: The packet to be analysed.
-        server_ip: The IP address of the OPCUA server.
+        packet: The packet to be analysed, as a scapy packet or a record of the raw decoder.
+        server_ip: The IP address of the OPCUA server, or a list of them.
         clients_ip: List of clients IP addresses.
 
     Returns:
@@ -204,36 +551,197 @@ def define_communication_type(
 
         >>> define_communication_type(capture[1978], '192.168.164.101', ['192.168.164.192'])
         'Server to Attacker'
+
+        Records of the raw decoder are classified without dissecting the packet:
+
+        >>> from preprocessing.decoder import decode_frame
+        >>> define_communication_type(decode_frame(bytes(capture[1973]), 0), '192.168.164.101', ['192.168.164.102'])
+        'Attacker to Server'
     """
+    if isinstance(packet, PacketRecord):
+        return COMM_TYPES[
+            classify_record(packet, ip_set(server_ip), ip_set(clients_ip))
+        ]
+    servers = [server_ip] if isinstance(server_ip, str) else server_ip
     if packet.haslayer(scapy.TCP):
         if (
-            packet[scapy.IP].src == server_ip
+            packet[scapy.IP].src in servers
             and packet[scapy.IP].dst in clients_ip
         ):
             return 'Server to Client'
         if (
-            packet[scapy.IP].dst == server_ip
+            packet[scapy.IP].dst in servers
             and packet[scapy.IP].src in clients_ip
         ):
             return 'Client to Server'
         if detect_opcua_attack(packet, server_ip, clients_ip):
             return 'Attacker to Server'
         if (
-            packet[scapy.IP].src in server_ip
+            packet[scapy.IP].src in servers
             and packet[scapy.IP].dst not in clients_ip
         ):
             return 'Server to Attacker'
     return 'Unknown'
 
 
+def classify_record(
+    record: PacketRecord, servers: frozenset, clients: frozenset
+) -> int:
+    """Define the communication type of a record of the raw decoder, as `classify_communication` does for many packets.
+
+    Args:
+        record: The record of the packet.
+        servers: The IP addresses of the OPCUA servers, parsed by `ip_set`.
+        clients: The IP addresses of the clients, parsed by `ip_set`.
+
+    Returns:
+        The communication type of the packet, as a code into `COMM_TYPES`.
+
+    Examples:
+        >>> from preprocessing.file_handling import iter_pcapng_records
+        >>> records = list(iter_pcapng_records('tests/assets/0-dos_attack_example.pcapng'))
+        >>> COMM_TYPES[classify_record(records[1973], ip_set('192.168.164.101'), ip_set(['192.168.164.102']))]
+        'Attacker to Server'
+    """
+    if record.is_tcp:
+        if record.ip_src in servers and record.ip_dst in clients:
+            return COMM_TYPES.index('Server to Client')
+        if record.ip_dst in servers:
+            if record.ip_src in clients:
+                return COMM_TYPES.index('Client to Server')
+            return COMM_TYPES.index('Attacker to Server')
+        if record.ip_src in servers:
+            return COMM_TYPES.index('Server to Attacker')
+    return COMM_TYPES.index('Unknown')
+
+
+def ip_array(ips: str | int | list) -> np.ndarray:
+    """Convert IPv4 addresses to an array of their integer representations.
+
+    Args:
+        ips: An IPv4 address or a list of them, in dotted notation or as integers.
+
+    Returns:
+        The IPv4 addresses as a `np.uint32` array.
+
+    Examples:
+        >>> ip_array('192.168.164.101')
+        array([3232277605], dtype=uint32)
+        >>> ip_array(['192.168.164.102', 3232277605]).tolist()
+        [3232277606, 3232277605]
+    """
+    if isinstance(ips, (str, int)):
+        ips = [ips]
+    return np.array(
+        [ip_to_int(ip) if isinstance(ip, str) else ip for ip in ips],
+        dtype=np.uint32,
+    )
+
+
+def ip_set(ips: str | int | list) -> frozenset:
+    """Convert IPv4 addresses to a set of their integer representations, see `ip_array`.
+
+    The sets are cached, so the classifiers of single packets do not parse
+    the same addresses again for every packet.
+
+    Args:
+        ips: An IPv4 address or a list of them, in dotted notation or as integers.
+
+    Returns:
+        The IPv4 addresses as a frozenset of integers.
+
+    Examples:
+        >>> sorted(ip_set(['192.168.164.102', '192.168.164.101']))
+        [3232277605, 3232277606]
+        >>> ip_set('192.168.164.101') is ip_set(['192.168.164.101'])
+        True
+    """
+    if isinstance(ips, (str, int)):
+        ips = [ips]
+    return _ip_set(tuple(ips))
+
+
+@functools.lru_cache(maxsize=64)
+def _ip_set(ips: tuple) -> frozenset:
+    """Parse the addresses of `ip_set`, once for each tuple of them."""
+    return frozenset(ip_array(list(ips)).tolist())
+
+
+def classify_communication(
+    ip_src: np.ndarray,
+    ip_dst: np.ndarray,
+    protos: np.ndarray,
+    servers_ip: str | list,
+    clients_ip: list,
+) -> np.ndarray:
+    """Define the communication type of many packets at once, as `define_communication_type`.
+
+    The addresses are looked up with `np.isin`, so the cost stays linear in
+    the number of packets whatever the number of servers and clients.
+
+    Args:
+        ip_src (np.ndarray): The source IPv4 address of each packet, as an integer.
+        ip_dst (np.ndarray): The destination IPv4 address of each packet, as an integer.
+        protos (np.ndarray): The IP protocol of each packet, 0 if it is not an IPv4 packet.
+        servers_ip (str | list): The IP address of the OPCUA server, or a list of them.
+        clients_ip (list): List of clients IP addresses.
+
+    Returns:
+        The communication type of each packet, as a code into `COMM_TYPES`.
+
+    Examples:
+        >>> server, client, attacker = ip_array(['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        >>> codes = classify_communication(
+        ...     [client, server, attacker, server, client],
+        ...     [server, client, server, attacker, attacker],
+        ...     [6, 6, 6, 6, 6],
+        ...     '10.0.0.1',
+        ...     ['10.0.0.2'],
+        ... )
+        >>> [COMM_TYPES[code] for code in codes]
+        ['Client to Server', 'Server to Client', 'Attacker to Server', 'Server to Attacker', 'Unknown']
+
+        The packets `detect_opcua_attack` flags are the 'Attacker to Server' ones:
+
+        >>> (codes == COMM_TYPES.index('Attacker to Server')).tolist()
+        [False, False, True, False, False]
+    """
+    ip_src, ip_dst = np.asarray(ip_src), np.asarray(ip_dst)
+    tcp = np.asarray(protos) == PROTO_TCP
+    servers, clients = ip_array(servers_ip), ip_array(clients_ip)
+    from_server = tcp & np.isin(ip_src, servers)
+    to_server = tcp & np.isin(ip_dst, servers)
+    from_client = np.isin(ip_src, clients)
+    to_client = np.isin(ip_dst, clients)
+
+    # In the order of the checks of `define_communication_type`
+    return np.select(
+        [
+            from_server & to_client,
+            to_server & from_client,
+            to_server,
+            from_server,
+        ],
+        [
+            COMM_TYPES.index('Server to Client'),
+            COMM_TYPES.index('Client to Server'),
+            COMM_TYPES.index('Attacker to Server'),
+            COMM_TYPES.index('Server to Attacker'),
+        ],
+        COMM_TYPES.index('Unknown'),
+    ).astype(np.uint8)
+
+
 def detect_opcua_attack(
-    packet: scapy.Packet, server_ip: str, clients_ip: list[str]
+    packet: scapy.Packet | PacketRecord,
+    server_ip: str | list,
+    clients_ip: list[str],
 ) -> bool:
     """Detect if a packet is part of an OPCUA attack.
 
     Args:
-        packet: The packet to be analysed.
-        server_ip: The IP address of the OPCUA server.
+        packet: The packet to be analysed, as a scapy packet or a record of the raw decoder.
+        server_ip: The IP address of the OPCUA server, or a list of them.
         clients_ip: List of clients IP addresses.
 
     Returns:
@@ -253,20 +761,36 @@ def detect_opcua_attack(
         >>> detect_opcua_attack(capture[1966], '192.168.164.101', ['192.168.164.102'])
         True
     """
+    if isinstance(packet, PacketRecord):
+        return _detect_record_attack(
+            packet, ip_set(server_ip), ip_set(clients_ip)
+        )
+    servers = [server_ip] if isinstance(server_ip, str) else server_ip
     if packet.haslayer(scapy.TCP):
         if (
-            packet[scapy.IP].dst == server_ip
+            packet[scapy.IP].dst in servers
             and packet[scapy.IP].src not in clients_ip
         ):
             return True
     return False
 
 
-def is_opcua_packet(packet: scapy.Packet, ports: list) -> bool:
+def _detect_record_attack(
+    record: PacketRecord, servers: frozenset, clients: frozenset
+) -> bool:
+    """Detect if a record of the raw decoder may be part of an attack, with the addresses parsed by `ip_set`."""
+    return (
+        record.is_tcp
+        and record.ip_dst in servers
+        and record.ip_src not in clients
+    )
+
+
+def is_opcua_packet(packet: scapy.Packet | PacketRecord, ports: list) -> bool:
     """Check if a packet is an OPC UA packet.
 
     Args:
-        packet: The packet to be analysed.
+        packet: The packet to be analysed, as a scapy packet or a record of the raw decoder.
         ports: List of OPC UA ports.
 
     Returns:
@@ -289,6 +813,10 @@ def is_opcua_packet(packet: scapy.Packet, ports: list) -> bool:
         >>> is_opcua_packet(capture[733], [4840])
         True
     """
+    if isinstance(packet, PacketRecord):
+        return packet.is_ipv4 and (
+            packet.dport in ports or packet.sport in ports
+        )
     if packet.haslayer(scapy.IP):
         if packet[scapy.IP].dport in ports or packet[scapy.IP].sport in ports:
             return True
@@ -0,0 +1,503 @@
+"""
+Provides the columnar packet table, the compact representation of a capture
+on which the analysis operations run as vectorized NumPy expressions.
+
+Each row of the table is one packet. MAC addresses are stored as 48-bit
+integers, IPv4 addresses as 32-bit integers and the communication type as a
+categorical code into `COMM_TYPES`, so a whole capture fits in a single
+structured array built once, in one pass over the packets.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+
+import numpy as np
+from lazy import scapy
+from preprocessing.decoder import (
+    PacketRecord,
+    ip_to_int,
+    mac_to_int,
+)
+from preprocessing.operations import (
+    COMM_TYPES,
+    RedundancyFilter,
+    calculate_package_time_difference,
+    classify_communication,
+)
+from preprocessing.uatcp import MessageReassembler, decode_message
+
+PACKET_DTYPE = np.dtype(
+    [
+        ('index', np.int64),
+        ('time', np.float64),
+        ('length', np.uint32),
+        ('mac_src', np.uint64),
+        ('mac_dst', np.uint64),
+        ('ip_src', np.uint32),
+        ('ip_dst', np.uint32),
+        ('sport', np.uint16),
+        ('dport', np.uint16),
+        ('proto', np.uint8),
+        ('tcp_flags', np.uint8),
+        ('seq', np.uint32),
+        ('ack', np.uint32),
+        ('payload_length', np.uint16),
+        ('request_id', np.int64),
+        ('service', np.uint32),
+        ('comm_type', np.uint8),
+        ('opcua', np.bool_),
+        ('redundant', np.bool_),
+    ]
+)
+
+UNKNOWN_TYPE = COMM_TYPES.index('Unknown')
+RTT_FLOWS = {
+    'C-S': (
+        COMM_TYPES.index('Client to Server'),
+        COMM_TYPES.index('Server to Client'),
+    ),
+    'A-S': (
+        COMM_TYPES.index('Attacker to Server'),
+        COMM_TYPES.index('Server to Attacker'),
+    ),
+}
+
+
+def packet_to_row(
+    index: int,
+    packet: scapy.Packet,
+    first_packet: scapy.Packet,
+) -> tuple:
+    """Extract the columns of the packet table from a scapy packet.
+
+    Args:
+        index: The index of the packet in the capture.
+        packet: The packet to be converted.
+        first_packet: The first packet of the capture.
+
+    Returns:
+        A tuple with the fields of `PACKET_DTYPE`, in order. The communication type is left as 'Unknown' and the OPC UA and redundancy flags as **False**; `build_packet_table` fills them for the whole table at once.
+    """
+    mac_src = mac_dst = ip_src = ip_dst = sport = dport = proto = flags = 0
+    seq = ack = payload_length = 0
+    request_id = -1
+    service = 0
+    if packet.haslayer(scapy.Ether):
+        mac_src = mac_to_int(packet[scapy.Ether].src)
+        mac_dst = mac_to_int(packet[scapy.Ether].dst)
+    if packet.haslayer(scapy.IP):
+        ip_src = ip_to_int(packet[scapy.IP].src)
+        ip_dst = ip_to_int(packet[scapy.IP].dst)
+        proto = packet[scapy.IP].proto
+        if packet.haslayer(scapy.TCP):
+            tcp = packet[scapy.TCP]
+            sport, dport = tcp.sport, tcp.dport
+            flags = int(tcp.flags) & 0xFF
+            seq, ack = tcp.seq, tcp.ack
+            # As the raw decoder, trust the IPv4 length over the captured
+            # bytes, which may include the Ethernet padding
+            payload_length = max(
+                0,
+                packet[scapy.IP].len
+                - packet[scapy.IP].ihl * 4
+                - tcp.dataofs * 4,
+            )
+            message = payload_length and decode_message(
+                bytes(tcp.payload)[:payload_length]
+            )
+            if message:
+                request_id, service = message.request_id, message.service
+        elif packet.haslayer(scapy.UDP):
+            sport, dport = packet[scapy.UDP].sport, packet[scapy.UDP].dport
+    return (
+        index,
+        calculate_package_time_difference(packet, first_packet),
+        len(packet),
+        mac_src,
+        mac_dst,
+        ip_src,
+        ip_dst,
+        sport,
+        dport,
+        proto,
+        flags,
+        seq,
+        ack,
+        payload_length,
+        request_id,
+        service,
+        UNKNOWN_TYPE,
+        False,
+        False,
+    )
+
+
+def record_to_row(
+    index: int,
+    record: PacketRecord,
+    first_record: PacketRecord,
+) -> tuple:
+    """Extract the columns of the packet table from a decoded packet record.
+
+    Args:
+        index: The index of the packet in the capture.
+        record: The record to be converted.
+        first_record: The record of the first packet of the capture.
+
+    Returns:
+        A tuple with the fields of `PACKET_DTYPE`, in order, as `packet_to_row`.
+    """
+    return (
+        index,
+        calculate_package_time_difference(record, first_record),
+        record.length,
+        record.mac_src,
+        record.mac_dst,
+        record.ip_src,
+        record.ip_dst,
+        record.sport,
+        record.dport,
+        record.proto,
+        record.tcp_flags,
+        record.seq,
+        record.ack,
+        record.payload_length,
+        record.request_id,
+        record.service,
+        UNKNOWN_TYPE,
+        False,
+        False,
+    )
+
+
+def build_packet_table(
+    packets: Iterable[scapy.Packet | PacketRecord],
+    server_ip: str | list,
+    clients_ip: list,
+    ports: list,
+    *,
+    max_duration: float | None = 60,
+    redundancy: RedundancyFilter | None = None,
+    first_packet: scapy.Packet | PacketRecord | None = None,
+    first_index: int = 0,
+    chunk_size: int = 65536,
+) -> np.ndarray:
+    """Build the packet table of a capture in a single pass.
+
+    The rows are written in fixed-size chunks, so the packets can come from a
+    stream (see `iter_pcapng_file` and `iter_pcapng_records`) and are never
+    held in memory together.
+
+    The TCP segments to and from the OPC UA ports are fed to a
+    `MessageReassembler` per flow, and the request identifier and service of
+    each row are the ones of the first UA TCP chunk starting in its segment,
+    wherever it starts in the segment. The segments holding no chunk start,
+    such as the continuations of a chunk split over several segments, have
+    none, and the segments retransmitted in full, such as mirrored copies, are
+    decoded on their own. A table started in the middle of a stream, as the
+    shards of `analyse_shard`, follows it from its first segment starting with
+    a chunk, as after a gap.
+
+    Args:
+        packets: The packets of the capture, in capture order, as scapy packets or decoded records.
+        server_ip: The IP address of the OPCUA server, or a list of them.
+        clients_ip: List of clients IP addresses.
+        ports: List of OPC UA ports.
+        max_duration: Stop reading once a packet is more than this many seconds after the first one. **None** reads the whole capture.
+        redundancy: The filter flagging the redundant packets in the `redundant` column. **None** flags none of them.
+        first_packet: The first packet of the capture, when `packets` starts in the middle of it. Defaults to the first of `packets`.
+        first_index: The index in the capture of the first of `packets`.
+        chunk_size: The number of rows allocated at a time.
+
+    Returns:
+        A structured array with the `PACKET_DTYPE` dtype and one row per packet.
+
+    Examples:
+        >>> from preprocessing.file_handling import iter_pcapng_file
+        >>> packets = iter_pcapng_file('tests/assets/0-dos_attack_example.pcapng')
+        >>> table = build_packet_table(packets, '192.168.164.101', ['192.168.164.102'], [4840])
+        >>> len(table)
+        7704
+        >>> COMM_TYPES[table[1966]['comm_type']]
+        'Attacker to Server'
+
+        Redundant packets are kept in the table, so they can still be classified, and flagged:
+
+        >>> from preprocessing.operations import RedundancyFilter
+        >>> packets = iter_pcapng_file('tests/assets/0-dos_attack_example.pcapng')
+        >>> table = build_packet_table(packets, '192.168.164.101', ['192.168.164.102'], [4840], redundancy=RedundancyFilter('time'))
+        >>> int((~table['redundant']).sum())
+        3821
+
+        The records of the raw decoder build the same table, without dissecting the packets:
+
+        >>> from preprocessing.file_handling import iter_pcapng_records
+        >>> records = iter_pcapng_records('tests/assets/0-dos_attack_example.pcapng')
+        >>> raw_table = build_packet_table(records, '192.168.164.101', ['192.168.164.102'], [4840], redundancy=RedundancyFilter('time'))
+        >>> bool((raw_table == table).all())
+        True
+    """
+    chunks = []
+    chunk = np.empty(chunk_size, dtype=PACKET_DTYPE)
+    filled = 0
+    reassembler = MessageReassembler()
+    opcua_ports = frozenset(ports)
+
+    for index, packet in enumerate(packets, start=first_index):
+        if first_packet is None:
+            first_packet = packet
+        if (
+            max_duration is not None
+            and packet.time - first_packet.time > max_duration
+        ):
+            break
+
+        to_row = (
+            record_to_row
+            if isinstance(packet, PacketRecord)
+            else packet_to_row
+        )
+        chunk[filled] = to_row(index, packet, first_packet)
+        segment = _tcp_segment(packet)
+        if segment is not None and _is_opcua_stream(segment[0], opcua_ports):
+            _, message = reassembler.feed_segment(*segment)
+            chunk['request_id'][filled], chunk['service'][filled] = (
+                (message.request_id, message.service)
+                if message is not None
+                else (-1, 0)
+            )
+        if redundancy is not None:
+            chunk['redundant'][filled] = redundancy.is_redundant(packet)
+        filled += 1
+        if filled == chunk_size:
+            chunks.append(chunk)
+            chunk = np.empty(chunk_size, dtype=PACKET_DTYPE)
+            filled = 0
+    chunks.append(chunk[:filled])
+
+    table = np.concatenate(chunks)
+    table['comm_type'] = classify_communication(
+        table['ip_src'], table['ip_dst'], table['proto'], server_ip, clients_ip
+    )
+    table['opcua'] = np.isin(table['sport'], ports) | np.isin(
+        table['dport'], ports
+    )
+    return table
+
+
+def _tcp_segment(packet: scapy.Packet | PacketRecord) -> tuple | None:
+    """The stream, sequence number and payload of a TCP segment, **None** if the packet carries none."""
+    if isinstance(packet, PacketRecord):
+        if not packet.is_tcp or not packet.payload_length:
+            return None
+        start = packet.payload_offset
+        payload = memoryview(packet.frame)[
+            start : start + packet.payload_length
+        ]
+        stream = (packet.ip_src, packet.sport, packet.ip_dst, packet.dport)
+        return stream, packet.seq, payload
+    if not packet.haslayer(scapy.IP) or not packet.haslayer(scapy.TCP):
+        return None
+    ip, tcp = packet[scapy.IP], packet[scapy.TCP]
+    payload_length = max(0, ip.len - ip.ihl * 4 - tcp.dataofs * 4)
+    if not payload_length:
+        return None
+    stream = (ip_to_int(ip.src), tcp.sport, ip_to_int(ip.dst), tcp.dport)
+    return stream, tcp.seq, bytes(tcp.payload)[:payload_length]
+
+
+def _is_opcua_stream(stream: tuple, ports: frozenset) -> bool:
+    """Whether a TCP stream goes to or comes from one of the OPC UA ports."""
+    _, sport, _, dport = stream
+    return sport in ports or dport in ports
+
+
+def find_attack_start(table: np.ndarray) -> tuple | None:
+    """Find the first packet flagged as an attack to the server.
+
+    Args:
+        table: The packet table.
+
+    Returns:
+        A tuple with the relative time and the index of the first attack packet, or **None** if there is no attack.
+
+    Examples:
+        >>> table = np.zeros(3, dtype=PACKET_DTYPE)
+        >>> table['index'] = [0, 1, 2]
+        >>> table['time'] = [0.0, 0.25, 0.5]
+        >>> table['comm_type'] = [1, 3, 3]
+        >>> find_attack_start(table)
+        (0.25, 1)
+    """
+    attacks = np.flatnonzero(
+        table['comm_type'] == COMM_TYPES.index('Attacker to Server')
+    )
+    if not len(attacks):
+        return None
+    row = table[attacks[0]]
+    return float(row['time']), int(row['index'])
+
+
+def partial_round_trip_time(table: np.ndarray, flow: str = 'C-S') -> dict:
+    """Calculate the round trip time (RTT) over a slice of a packet table, keeping what is left open at its edges.
+
+    Besides the RTTs paired inside the slice, the result holds, for each MAC
+    pair, the response that opens the slice before any request (it may answer
+    a request of an earlier slice) and the request still pending at its end.
+    `merge_round_trip_times` joins consecutive slices.
+
+    Args:
+        table: The slice of the packet table, without redundant rows.
+        flow: The flow of communication. Acceptable values are: 'C-S' and 'A-S'.
+
+    Returns:
+        A dictionary with the RTTs, the open responses and requests by MAC pair and all the MAC pairs of the slice.
+
+    Raises:
+        ValueError: If an unacceptable flow of communication is provided.
+
+    Examples:
+        >>> table = np.zeros(4, dtype=PACKET_DTYPE)
+        >>> table['index'] = [10, 11, 12, 13]
+        >>> table['time'] = [1.0, 1.5, 1.75, 2.0]
+        >>> table['mac_src'] = [2, 1, 2, 1]
+        >>> table['mac_dst'] = [1, 2, 1, 2]
+        >>> table['comm_type'] = [2, 1, 2, 1]
+        >>> partial = partial_round_trip_time(table, 'C-S')
+        >>> partial['RTTs'], partial['Open responses'], partial['Open requests']
+        ([[12, 1.75, 250.0]], {(1, 2): (10, 1.0)}, {(1, 2): 2.0})
+    """
+    pair_src, pair_dst, requests, events = _sorted_rtt_events(table, flow)
+
+    first_of_pair = np.ones(len(events), dtype=bool)
+    first_of_pair[1:] = (pair_src[1:] != pair_src[:-1]) | (
+        pair_dst[1:] != pair_dst[:-1]
+    )
+    last_of_pair = np.ones(len(events), dtype=bool)
+    last_of_pair[:-1] = first_of_pair[1:]
+
+    times, indexes = table['time'], table['index']
+    opening = first_of_pair & ~requests
+    closing = last_of_pair & requests
+    return {
+        'RTTs': _matched_round_trip_times(
+            table, pair_src, pair_dst, requests, events
+        ),
+        'Open responses': {
+            (src, dst): (index, time)
+            for src, dst, index, time in zip(
+                pair_src[opening].tolist(),
+                pair_dst[opening].tolist(),
+                indexes[events[opening]].tolist(),
+                times[events[opening]].tolist(),
+            )
+        },
+        'Open requests': {
+            (src, dst): time
+            for src, dst, time in zip(
+                pair_src[closing].tolist(),
+                pair_dst[closing].tolist(),
+                times[events[closing]].tolist(),
+            )
+        },
+        'Pairs': set(
+            zip(
+                pair_src[first_of_pair].tolist(),
+                pair_dst[first_of_pair].tolist(),
+            )
+        ),
+    }
+
+
+def merge_round_trip_times(partials: list) -> list:
+    """Join the round trip times of consecutive slices of a packet table.
+
+    The requests left pending at the end of a slice are paired with the
+    responses opening the following slices, as if the whole table had been
+    processed at once by `calculate_round_trip_time`.
+
+    Args:
+        partials: The results of `partial_round_trip_time` for each slice, in capture order.
+
+    Returns:
+        A list of `[index, relative time, rtt]` entries, in chronological order.
+
+    Examples:
+        >>> table = np.zeros(4, dtype=PACKET_DTYPE)
+        >>> table['index'] = [10, 11, 12, 13]
+        >>> table['time'] = [1.0, 1.5, 1.75, 2.0]
+        >>> table['mac_src'] = [1, 2, 1, 2]
+        >>> table['mac_dst'] = [2, 1, 2, 1]
+        >>> table['comm_type'] = [1, 2, 1, 2]
+        >>> merge_round_trip_times([partial_round_trip_time(table[:1]), partial_round_trip_time(table[1:])])
+        [[11, 1.5, 500.0], [13, 2.0, 250.0]]
+    """
+    pending = {}
+    rtts = []
+    for partial in partials:
+        for pair, (index, time) in partial['Open responses'].items():
+            request_time = pending.get(pair)
+            if request_time is not None:
+                rtts.append([index, time, (time - request_time) * 1000])
+        for pair in partial['Pairs']:
+            pending.pop(pair, None)
+        pending.update(partial['Open requests'])
+        rtts.extend(partial['RTTs'])
+    rtts.sort(key=lambda entry: entry[0])
+    return rtts
+
+
+def _sorted_rtt_events(table: np.ndarray, flow: str) -> tuple:
+    """Sort the requests and responses of a flow by MAC pair, then by position.
+
+    Both directions are keyed by the (request source, request destination)
+    pair, so a response follows the requests it may answer.
+    """
+    if flow not in RTT_FLOWS:
+        raise ValueError(
+            f"Invalid flow of communication: '{flow}'. Acceptable values are: {list(RTT_FLOWS.keys())}"
+        )
+    request_code, response_code = RTT_FLOWS[flow]
+
+    is_request = table['comm_type'] == request_code
+    events = np.flatnonzero(is_request | (table['comm_type'] == response_code))
+    requests = is_request[events]
+
+    src, dst = table['mac_src'][events], table['mac_dst'][events]
+    pair_src = np.where(requests, src, dst)
+    pair_dst = np.where(requests, dst, src)
+    order = np.lexsort((events, pair_dst, pair_src))
+    return pair_src[order], pair_dst[order], requests[order], events[order]
+
+
+def _matched_round_trip_times(
+    table: np.ndarray,
+    pair_src: np.ndarray,
+    pair_dst: np.ndarray,
+    requests: np.ndarray,
+    events: np.ndarray,
+) -> list:
+    """Pair each response with the request right before it in its MAC pair."""
+    matched = (
+        (pair_src[1:] == pair_src[:-1])
+        & (pair_dst[1:] == pair_dst[:-1])
+        & requests[:-1]
+        & ~requests[1:]
+    )
+    response_rows = events[1:][matched]
+    request_rows = events[:-1][matched]
+    chronological = np.argsort(response_rows, kind='stable')
+    response_rows = response_rows[chronological]
+    request_rows = request_rows[chronological]
+
+    times = table['time']
+    rtts = (times[response_rows] - times[request_rows]) * 1000
+    return [
+        [index, time, rtt]
+        for index, time, rtt in zip(
+            table['index'][response_rows].tolist(),
+            times[response_rows].tolist(),
+            rtts.tolist(),
+        )
+    ]
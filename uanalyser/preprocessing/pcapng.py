@@ -0,0 +1,432 @@
+"""
+Provides a minimal reader of the PCAPNG block structure, able to start reading
+a capture at any block boundary instead of from its first byte. The files are
+memory-mapped, so the frames are slices of the map and are never copied.
+"""
+
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, NamedTuple
+
+from preprocessing.decoder import PacketRecord, decode_frame
+
+BLOCK_SHB = 0x0A0D0D0A
+BLOCK_IDB = 0x00000001
+BLOCK_EPB = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+OPTION_END = 0
+OPTION_IF_TSRESOL = 9
+DEFAULT_TSRESOL = 1000000
+
+
+class Interface(NamedTuple):
+    """The link type and timestamp resolution of a capture interface.
+
+    `tsresol` is the number of timestamp units per second.
+    """
+
+    linktype: int
+    tsresol: int
+
+
+class ReaderState(NamedTuple):
+    """What a reader must know to decode the blocks following an offset.
+
+    `endian` is the `struct` byte order of the current section and
+    `interfaces` the interfaces it has described so far.
+    """
+
+    offset: int
+    endian: str
+    interfaces: tuple
+
+
+def parse_interface(body: bytes, endian: str) -> Interface:
+    """Parse the body of an Interface Description Block.
+
+    Args:
+        body: The block body, between the block length fields.
+        endian: The `struct` byte order of the section.
+
+    Returns:
+        The interface described by the block.
+
+    Examples:
+        >>> parse_interface(bytes.fromhex('01000000ffff0000' '09000100' '09000000' '00000000'), '<')
+        Interface(linktype=1, tsresol=1000000000)
+    """
+    linktype, _ = struct.unpack_from(endian + 'HxxI', body)
+    tsresol = DEFAULT_TSRESOL
+    offset = 8
+    while offset + 4 <= len(body):
+        code, length = struct.unpack_from(endian + 'HH', body, offset)
+        if code == OPTION_END:
+            break
+        if code == OPTION_IF_TSRESOL and length == 1:
+            value = body[offset + 4]
+            tsresol = (2 if value & 0x80 else 10) ** (value & 0x7F)
+        offset += 4 + (length + 3) // 4 * 4
+    return Interface(linktype, tsresol)
+
+
+def section_endian(header: bytes) -> str:
+    """Find the byte order of a section from the first 12 bytes of its header block.
+
+    Args:
+        header: The block type, block length and byte-order magic of a Section Header Block.
+
+    Returns:
+        The `struct` byte order of the section.
+
+    Raises:
+        ValueError: If the byte-order magic is invalid.
+
+    Examples:
+        >>> section_endian(bytes.fromhex('0a0d0d0a1c0000004d3c2b1a'))
+        '<'
+    """
+    if struct.unpack_from('<I', header, 8)[0] == BYTE_ORDER_MAGIC:
+        return '<'
+    if struct.unpack_from('>I', header, 8)[0] == BYTE_ORDER_MAGIC:
+        return '>'
+    raise ValueError('Invalid PCAPNG byte-order magic.')
+
+
+def iter_blocks(
+    fdesc: BinaryIO, endian: str = '<', end: int | None = None
+) -> Iterator[tuple]:
+    """Read the blocks of a PCAPNG file from its current position.
+
+    Args:
+        fdesc: The file, opened in binary mode and positioned at a block boundary.
+        endian: The `struct` byte order of the section the position belongs to.
+        end: Stop before the block starting at this offset. **None** reads to the end of the file.
+
+    Yields:
+        A tuple with the offset, type and body of each block, and the byte order of its section. A truncated last block is ignored.
+
+    Raises:
+        ValueError: If a block length is invalid.
+    """
+    while end is None or fdesc.tell() < end:
+        offset = fdesc.tell()
+        header = fdesc.read(12)
+        if len(header) < 12:
+            return
+        (block_type,) = struct.unpack_from(endian + 'I', header)
+        if block_type == BLOCK_SHB:
+            endian = section_endian(header)
+        (length,) = struct.unpack_from(endian + 'I', header, 4)
+        if length < 12 or length % 4:
+            raise ValueError(
+                f'Invalid PCAPNG block length at offset {offset}.'
+            )
+        body = header[8:] + fdesc.read(length - 12)
+        if len(body) < length - 8:
+            return
+        yield offset, block_type, body[:-4], endian
+
+
+def iter_buffer_blocks(
+    buffer: bytes | memoryview | mmap.mmap,
+    offset: int = 0,
+    endian: str = '<',
+    end: int | None = None,
+) -> Iterator[tuple]:
+    """Walk the blocks of a PCAPNG file held in memory, such as the map of `map_file`.
+
+    It is `iter_blocks` without the reads: the bodies are `memoryview` slices
+    of `buffer`, not copies.
+
+    Args:
+        buffer: The content of the file.
+        offset: The block boundary to start at.
+        endian: The `struct` byte order of the section the offset belongs to.
+        end: Stop before the block starting at this offset. **None** walks to the end of the buffer.
+
+    Yields:
+        A tuple with the offset, type and body of each block, and the byte order of its section. A truncated last block is ignored.
+
+    Raises:
+        ValueError: If a block length is invalid.
+
+    Examples:
+        >>> from itertools import islice
+        >>> with map_file('tests/assets/example.pcapng') as buffer:
+        ...     [block[:2] for block in islice(iter_buffer_blocks(buffer), 3)]
+        [(0, 168627466), (192, 1), (332, 6)]
+    """
+    view = memoryview(buffer)
+    size = len(view)
+    limit = size if end is None else min(end, size)
+    unpack = struct.unpack_from
+    while offset < limit and offset + 12 <= size:
+        (block_type,) = unpack(endian + 'I', view, offset)
+        if block_type == BLOCK_SHB:
+            endian = section_endian(view[offset : offset + 12])
+        (length,) = unpack(endian + 'I', view, offset + 4)
+        if length < 12 or length % 4:
+            raise ValueError(
+                f'Invalid PCAPNG block length at offset {offset}.'
+            )
+        if offset + length > size:
+            return
+        yield offset, block_type, view[
+            offset + 8 : offset + length - 4
+        ], endian
+        offset += length
+
+
+def iter_frames(
+    buffer: bytes | memoryview | mmap.mmap,
+    state: ReaderState | None = None,
+    end: int | None = None,
+) -> Iterator[tuple]:
+    """Walk the packets of a PCAPNG file held in memory, without decoding them.
+
+    The interfaces of each section are tracked, so the timestamps follow the
+    `if_tsresol` option of the interface of each packet, and a file may chain
+    sections of either byte order.
+
+    Args:
+        buffer: The content of the file.
+        state: Where to start reading, as given by `scan_reader_states`. **None** starts at the beginning of the buffer.
+        end: Stop before the block starting at this offset. **None** walks to the end of the buffer.
+
+    Yields:
+        A tuple with the frame of each packet, as a `memoryview` slice of `buffer`, its timestamp in seconds and the link type of its interface, in capture order.
+
+    Examples:
+        >>> with map_file('tests/assets/example.pcapng') as buffer:
+        ...     frame, time, linktype = next(iter_frames(buffer))
+        ...     len(frame), time, linktype
+        (118, 1708604341.759345, 1)
+    """
+    state = state or ReaderState(0, '<', ())
+    interfaces = list(state.interfaces)
+    for _, block_type, body, endian in iter_buffer_blocks(
+        buffer, state.offset, state.endian, end
+    ):
+        if block_type == BLOCK_EPB:
+            yield packet_frame(body, endian, interfaces)
+        elif block_type in (BLOCK_SHB, BLOCK_IDB):
+            decode_block(block_type, body, endian, interfaces)
+
+
+@contextmanager
+def map_file(file_path: str) -> Iterator[memoryview]:
+    """Map a file in memory, read only.
+
+    The views taken from the map keep it alive: it is unmapped when the last
+    of them is released, so the frames of `iter_frames` may outlive the
+    context.
+
+    Args:
+        file_path: The file to map.
+
+    Yields:
+        The content of the file, empty if the file is.
+    """
+    with open(file_path, 'rb') as fdesc:
+        if not os.fstat(fdesc.fileno()).st_size:
+            yield memoryview(b'')
+            return
+        mapped = mmap.mmap(fdesc.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        try:
+            mapped.close()
+        except BufferError:
+            pass
+
+
+def iter_block_records(
+    file_path: str, state: ReaderState | None = None, end: int | None = None
+) -> Iterator[PacketRecord]:
+    """Decode the Enhanced Packet Blocks of a PCAPNG file, from any block boundary.
+
+    The file is memory-mapped and the `frame` of each record is a slice of
+    the map, see `iter_frames`.
+
+    Args:
+        file_path: The PCAPNG file to read.
+        state: Where to start reading, as given by `scan_reader_states`. **None** starts at the beginning of the file.
+        end: Stop before the block starting at this offset. **None** reads to the end of the file.
+
+    Yields:
+        The record of each packet, in capture order.
+
+    Examples:
+        >>> sum(1 for _ in iter_block_records('tests/assets/example.pcapng'))
+        6129
+    """
+    with map_file(file_path) as buffer:
+        for frame, time, linktype in iter_frames(buffer, state, end):
+            yield decode_frame(frame, time, linktype)
+
+
+def decode_block(
+    block_type: int, body: bytes, endian: str, interfaces: list
+) -> PacketRecord | None:
+    """Decode a block read by `iter_blocks`.
+
+    The section and interface blocks update `interfaces` in place, so it
+    always describes the interfaces of the current section.
+
+    Args:
+        block_type: The type of the block.
+        body: The body of the block.
+        endian: The `struct` byte order of the section of the block.
+        interfaces: The interfaces described so far in the section.
+
+    Returns:
+        The record of the packet of an Enhanced Packet Block, **None** for the other blocks.
+    """
+    if block_type == BLOCK_SHB:
+        interfaces.clear()
+    elif block_type == BLOCK_IDB:
+        interfaces.append(parse_interface(body, endian))
+    elif block_type == BLOCK_EPB:
+        return decode_frame(*packet_frame(body, endian, interfaces))
+    return None
+
+
+def packet_frame(
+    body: bytes | memoryview, endian: str, interfaces: list
+) -> tuple:
+    """Read the frame of the body of an Enhanced Packet Block.
+
+    Args:
+        body: The body of the block.
+        endian: The `struct` byte order of the section of the block.
+        interfaces: The interfaces described so far in the section.
+
+    Returns:
+        The frame, a slice of `body`, its timestamp in seconds and the link type of its interface.
+    """
+    interface, high, low, caplen = struct.unpack_from(endian + 'IIII', body)
+    linktype, tsresol = interfaces[interface]
+    return body[20 : 20 + caplen], ((high << 32) + low) / tsresol, linktype
+
+
+def iter_packet_blocks(file_path: str) -> Iterator[tuple]:
+    """Walk the block headers of a PCAPNG file, reading the timestamps of its packets.
+
+    Only the headers of the packet blocks are read, the file is seeked past
+    their content, so no packet is decoded.
+
+    Args:
+        file_path: The PCAPNG file to scan.
+
+    Yields:
+        The reader state at each Enhanced Packet Block and the timestamp of its packet, in capture order.
+
+    Examples:
+        >>> state, time = next(iter_packet_blocks('tests/assets/example.pcapng'))
+        >>> state.offset, time
+        (332, 1708604341.759345)
+    """
+    interfaces = []
+    endian = '<'
+    with open(file_path, 'rb') as fdesc:
+        while True:
+            offset = fdesc.tell()
+            header = fdesc.read(20)
+            if len(header) < 12:
+                return
+            (block_type,) = struct.unpack_from(endian + 'I', header)
+            if block_type == BLOCK_SHB:
+                endian = section_endian(header)
+                interfaces = []
+            (length,) = struct.unpack_from(endian + 'I', header, 4)
+            if length < 12 or length % 4:
+                raise ValueError(
+                    f'Invalid PCAPNG block length at offset {offset}.'
+                )
+
+            if block_type == BLOCK_IDB:
+                fdesc.seek(offset + 8)
+                body = fdesc.read(length - 12)
+                interfaces.append(parse_interface(body, endian))
+            elif block_type == BLOCK_EPB:
+                if len(header) < 20:
+                    return
+                interface, high, low = struct.unpack_from(
+                    endian + 'III', header, 8
+                )
+                yield ReaderState(offset, endian, tuple(interfaces)), (
+                    (high << 32) + low
+                ) / interfaces[interface].tsresol
+            fdesc.seek(offset + length)
+
+
+def seek_time(
+    file_path: str, start: float
+) -> tuple[ReaderState | None, int, float | None]:
+    """Find the first packet of a PCAPNG file at or after a time offset, without decoding the packets before it.
+
+    Args:
+        file_path: The PCAPNG file to scan.
+        start: The time offset from the first packet of the capture, in seconds.
+
+    Returns:
+        The reader state at the packet block found (**None** if no packet is that late), the number of packets before it, and the timestamp of the first packet of the capture (**None** if there is none).
+
+    Examples:
+        >>> state, first_index, first_time = seek_time('tests/assets/0-dos_attack_example.pcapng', 30)
+        >>> first_index
+        1492
+        >>> next(iter_block_records('tests/assets/0-dos_attack_example.pcapng', state)).time - first_time >= 30
+        True
+    """
+    first_time = None
+    for index, (state, time) in enumerate(iter_packet_blocks(file_path)):
+        if first_time is None:
+            first_time = time
+        if time - first_time >= start:
+            return state, index, first_time
+    return None, 0, first_time
+
+
+def scan_reader_states(
+    file_path: str, offsets: list[int]
+) -> tuple[list[ReaderState], list[int], float | None]:
+    """Walk the block headers of a PCAPNG file to find where to resume reading.
+
+    Only the headers of the packet blocks are read, the file is seeked past
+    their content.
+
+    Args:
+        file_path: The PCAPNG file to scan.
+        offsets: Increasing byte offsets. Each one is moved forward to the next Enhanced Packet Block.
+
+    Returns:
+        The reader state at each packet block found, the number of packets before each of them, and the timestamp of the first packet (**None** if there is none). Offsets past the last packet block are dropped.
+
+    Examples:
+        >>> states, first_indexes, first_time = scan_reader_states('tests/assets/example.pcapng', [0, 500000])
+        >>> first_indexes[0], states[0].endian, states[0].interfaces
+        (0, '<', (Interface(linktype=1, tsresol=1000000),))
+    """
+    states, first_indexes = [], []
+    first_time = None
+    targets = iter(offsets)
+    target = next(targets, None)
+
+    for index, (state, time) in enumerate(iter_packet_blocks(file_path)):
+        if first_time is None:
+            first_time = time
+        if target is None:
+            break
+        if target <= state.offset:
+            states.append(state)
+            first_indexes.append(index)
+        while target is not None and target <= state.offset:
+            target = next(targets, None)
+
+    return states, first_indexes, first_time
@@ -0,0 +1,220 @@
+"""
+Provides the analysis profile: the network topology, the OPC UA ports and
+the time window of an analysis, loaded from a TOML or YAML file and
+overridden from the command line, instead of being written in the code.
+"""
+
+import math
+import os
+import tomllib
+from typing import NamedTuple
+
+from preprocessing.operations import REDUNDANCY_KEYS
+
+PROFILE_SECTIONS = {
+    'topology': ('servers', 'clients', 'ports'),
+    'window': ('start', 'end', 'duration', 'bucket'),
+    'redundancy': ('key',),
+}
+
+
+class AnalysisProfile(NamedTuple):
+    """What an analysis needs to know about a plant cell and its capture.
+
+    The window starts `start` seconds after the first packet of the capture
+    and lasts `duration` seconds, **None** lasting up to the end of the
+    capture. The defaults are the ones of the reference test bench.
+    """
+
+    servers_ip: tuple = ('192.168.164.101',)
+    clients_ip: tuple = ('192.168.164.102',)
+    ports: tuple = (
+        4840,
+        4841,
+        49320,
+        62541,
+        4897,
+        53530,
+        48050,
+        4885,
+        4855,
+        26543,
+    )
+    start: float = 0.0
+    duration: float | None = 60.0
+    bucket: float = 1.0
+    redundancy_key: str = 'time'
+
+    @property
+    def end(self) -> float | None:
+        """The end of the window, in seconds after the first packet, **None** if it lasts up to the end of the capture."""
+        if self.duration is None:
+            return None
+        return self.start + self.duration
+
+
+def make_profile(
+    profile: AnalysisProfile | None = None,
+    *,
+    servers_ip: list | None = None,
+    clients_ip: list | None = None,
+    ports: list | None = None,
+    start: float | None = None,
+    end: float | None = None,
+    duration: float | None = None,
+    bucket: float | None = None,
+    redundancy_key: str | None = None,
+) -> AnalysisProfile:
+    """Build a profile from another one, overriding the given fields, such as the options of the command line.
+
+    Args:
+        profile: The profile to start from. Defaults to `AnalysisProfile()`.
+        servers_ip: List of the IP addresses of the OPCUA servers.
+        clients_ip: List of clients IP addresses.
+        ports: List of OPC UA ports.
+        start: The start of the window, in seconds after the first packet.
+        end: The end of the window, in seconds after the first packet. An infinite end lasts up to the end of the capture.
+        duration: The duration of the window, in seconds, instead of its end. An infinite duration lasts up to the end of the capture.
+        bucket: The width of the time buckets, in seconds.
+        redundancy_key: The key identifying redundant packets, see `RedundancyFilter`.
+
+    Returns:
+        The profile, with the fields left to **None** taken from `profile`. Moving the start of the window keeps its duration.
+
+    Raises:
+        ValueError: If both the end and the duration are given, if the window is empty or if an unacceptable redundancy key is provided.
+
+    Examples:
+        >>> profile = make_profile(servers_ip=['10.0.0.1'], start=30, end=90)
+        >>> profile.servers_ip, profile.start, profile.duration
+        (('10.0.0.1',), 30.0, 60.0)
+        >>> make_profile(profile, duration=float('inf')).end is None
+        True
+    """
+    profile = profile or AnalysisProfile()
+    if end is not None and duration is not None:
+        raise ValueError('Give either the end or the duration of the window.')
+    if redundancy_key is not None and redundancy_key not in REDUNDANCY_KEYS:
+        raise ValueError(
+            f"Invalid redundancy key: '{redundancy_key}'. Acceptable values are: {list(REDUNDANCY_KEYS)}"
+        )
+
+    changes = {
+        'servers_ip': servers_ip,
+        'clients_ip': clients_ip,
+        'ports': ports,
+        'start': start,
+        'bucket': bucket,
+        'redundancy_key': redundancy_key,
+    }
+    changes = {
+        name: tuple(value) if isinstance(value, (list, tuple)) else value
+        for name, value in changes.items()
+        if value is not None
+    }
+    if 'start' in changes:
+        changes['start'] = float(changes['start'])
+    new_start = changes.get('start', profile.start)
+    if end is not None:
+        duration = end - new_start
+    if duration is not None:
+        changes['duration'] = None if math.isinf(duration) else float(duration)
+
+    profile = profile._replace(**changes)
+    if profile.duration is not None and profile.duration <= 0:
+        raise ValueError(
+            f'The window must end after its start ({profile.start} s).'
+        )
+    if profile.bucket <= 0:
+        raise ValueError('The bucket width must be positive.')
+    return profile
+
+
+def load_profile(file_path: str | None = None, **overrides) -> AnalysisProfile:
+    """Load an analysis profile from a TOML or YAML file.
+
+    The file has up to three sections, all optional:
+
+    ```toml
+    [topology]
+    servers = ['192.168.164.101']
+    clients = ['192.168.164.102']
+    ports = [4840]
+
+    [window]
+    start = 30      # seconds after the first packet
+    end = 90        # or duration = 60, inf for the whole capture
+    bucket = 1.0
+
+    [redundancy]
+    key = 'time'
+    ```
+
+    Reading YAML files requires PyYAML, the `yaml` extra.
+
+    Args:
+        file_path: The profile file, read as YAML if it ends with `.yaml` or `.yml` and as TOML otherwise. **None** starts from the defaults.
+        overrides: Fields overriding the ones of the file, see `make_profile`. The ones set to **None** are ignored.
+
+    Returns:
+        The profile.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the file has an unknown section or key, or an invalid window, see `make_profile`.
+
+    Examples:
+        >>> profile = load_profile(start=10)
+        >>> profile.start, profile.end, profile.servers_ip
+        (10.0, 70.0, ('192.168.164.101',))
+    """
+    fields = {}
+    if file_path is not None:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(
+                f'No such file or directory: "{file_path}".'
+            )
+        fields = _read_profile_file(file_path)
+    fields.update(
+        {name: value for name, value in overrides.items() if value is not None}
+    )
+    if 'end' in overrides and overrides['end'] is not None:
+        fields.pop('duration', None)
+    elif 'duration' in overrides and overrides['duration'] is not None:
+        fields.pop('end', None)
+    return make_profile(**fields)
+
+
+def _read_profile_file(file_path: str) -> dict:
+    """Read the sections of a profile file into the keyword arguments of `make_profile`."""
+    if file_path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError(
+                'Reading YAML profiles requires PyYAML: install the yaml extra.'
+            )
+        with open(file_path) as fdesc:
+            content = yaml.safe_load(fdesc) or {}
+    else:
+        with open(file_path, 'rb') as fdesc:
+            content = tomllib.load(fdesc)
+
+    fields = {}
+    for section, values in content.items():
+        if section not in PROFILE_SECTIONS:
+            raise ValueError(
+                f"Invalid profile section: '{section}'. Acceptable values are: {list(PROFILE_SECTIONS)}"
+            )
+        for key, value in values.items():
+            if key not in PROFILE_SECTIONS[section]:
+                raise ValueError(
+                    f"Invalid key in the '{section}' section: '{key}'. Acceptable values are: {list(PROFILE_SECTIONS[section])}"
+                )
+            name = {
+                'servers': 'servers_ip',
+                'clients': 'clients_ip',
+                'key': 'redundancy_key',
+            }.get(key, key)
+            fields[name] = value
+    return fields
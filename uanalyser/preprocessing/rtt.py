@@ -0,0 +1,730 @@
+"""
+Provides a streaming round trip time (RTT) engine. Requests and responses are
+paired per TCP connection with the request identifier of the OPC UA messages,
+or with the TCP sequence and acknowledgement numbers when there is none or
+the identifiers do not match, as when the messages are encrypted, so
+pipelined requests each get their own RTT, and the memory is bounded by the
+number of requests still waiting for a response.
+"""
+
+from collections import deque
+from typing import Iterator, NamedTuple
+
+import numpy as np
+from preprocessing.decoder import PROTO_TCP, PacketRecord
+from preprocessing.packet_table import RTT_FLOWS
+from preprocessing.uatcp import service_name
+
+RTT_KEYS = ('tcp', 'mac')
+DEFAULT_RTT_TIMEOUT = 10.0
+TCP_PSH = 0x08
+# The responses in a row whose identifier answers no request after which a
+# connection is paired with the sequence numbers again
+MAX_KEYED_MISSES = 8
+
+_SEGMENT_COLUMNS = (
+    'index',
+    'time',
+    'ip_src',
+    'sport',
+    'ip_dst',
+    'dport',
+    'seq',
+    'ack',
+    'payload_length',
+    'tcp_flags',
+    'request_id',
+)
+
+_SEQ_MODULO = 1 << 32
+_SEQ_HALF = 1 << 31
+
+
+def seq_before_or_equal(first: int, second: int) -> bool:
+    """Compare two TCP sequence numbers, allowing them to wrap around.
+
+    Args:
+        first: A sequence number.
+        second: Another sequence number.
+
+    Returns:
+        True if `first` is not after `second`.
+
+    Examples:
+        >>> seq_before_or_equal(10, 20), seq_before_or_equal(20, 10)
+        (True, False)
+        >>> seq_before_or_equal(4294967290, 5)
+        True
+    """
+    return (second - first) % _SEQ_MODULO < _SEQ_HALF
+
+
+class _Connection:
+    """The requests of a TCP connection waiting for a response."""
+
+    __slots__ = (
+        'requests',
+        'identified',
+        'keyed',
+        'misses',
+        'acked',
+        'response_end',
+        'response_open',
+        'last_seen',
+    )
+
+    def __init__(self, time: float):
+        # Each request is a list of its end sequence number, time, tag and
+        # whether its last segment was pushed
+        self.requests = deque()
+        # The requests with an OPC UA request identifier, by identifier, with
+        # their time and tag
+        self.identified = {}
+        # Whether the responses are paired with the identifiers, once one of
+        # them answered a request
+        self.keyed = False
+        self.misses = 0
+        self.acked = None
+        self.response_end = None
+        self.response_open = False
+        self.last_seen = time
+
+    def state(self) -> tuple:
+        """Everything the pairing of the next segments of the connection depends on."""
+        return (
+            [tuple(request) for request in self.requests],
+            list(self.identified.items()),
+            self.keyed,
+            self.misses,
+            self.acked,
+            self.response_end,
+            self.response_open,
+            self.last_seen,
+        )
+
+
+class RttMatcher:
+    """Pair OPC UA requests and responses as packets arrive, one at a time.
+
+    A request is a TCP segment with a payload sent to one of the OPC UA
+    ports, and a response a segment with a payload sent from one of them.
+
+    When the segments carry the request identifier of their OPC UA message
+    (see `uatcp.decode_message`), a response answers the request of the same
+    connection with the same identifier, so responses sent out of order, such
+    as the ones to Publish requests, are paired right. A connection is paired
+    with the identifiers once the identifier of a response answers one of its
+    requests, and the segments without an identifier are then the
+    continuations of a message, and are skipped. After `MAX_KEYED_MISSES`
+    responses in a row whose identifier answers no request, the connection is
+    paired with the sequence numbers again.
+
+    Otherwise, as when the messages are encrypted and their identifiers do not
+    match, the requests of each connection wait in order, and a response
+    answers the oldest request it acknowledges in full. Requests split over
+    several segments are merged until a segment is pushed, the continuation
+    segments of a response are skipped, and retransmitted segments are
+    ignored.
+
+    Requests are dropped once they waited more than `timeout` seconds or when
+    more than `max_pending` of them wait on a connection, and idle connections
+    are forgotten, so the memory stays bounded on unbounded streams. A
+    connection is expired as its segments arrive, so its pairs only depend on
+    its own segments, whatever the other connections of the stream.
+
+    Args:
+        ports: List of OPC UA ports.
+        timeout: The longest time a request waits for its response, in seconds.
+        max_pending: The maximum number of requests waiting on a connection.
+
+    Examples:
+        Two pipelined requests, answered in order:
+
+        >>> matcher = RttMatcher([4840])
+        >>> matcher.add(0.000, 1, 50000, 2, 4840, 100, 7, 20, TCP_PSH, tag='first')
+        >>> matcher.add(0.001, 1, 50000, 2, 4840, 120, 7, 30, TCP_PSH, tag='second')
+        >>> matcher.add(0.004, 2, 4840, 1, 50000, 7, 150, 60, TCP_PSH)
+        ('first', 0.0, 4.0)
+        >>> matcher.add(0.006, 2, 4840, 1, 50000, 67, 150, 60, TCP_PSH)
+        ('second', 0.001, 5.0)
+        >>> matcher.pending
+        0
+
+        With request identifiers, the responses may come back in any order:
+
+        >>> matcher.add(2.0, 1, 50000, 2, 4840, 150, 127, 20, TCP_PSH, 1, tag='publish')
+        >>> matcher.add(2.25, 1, 50000, 2, 4840, 170, 127, 20, TCP_PSH, 2, tag='read')
+        >>> matcher.add(2.5, 2, 4840, 1, 50000, 127, 190, 40, TCP_PSH, 2)
+        ('read', 2.25, 250.0)
+    """
+
+    def __init__(
+        self,
+        ports: list,
+        *,
+        timeout: float = DEFAULT_RTT_TIMEOUT,
+        max_pending: int = 256,
+    ):
+        self.ports = frozenset(ports)
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._connections = {}
+        self._next_sweep = None
+
+    @property
+    def pending(self) -> int:
+        """The number of requests waiting for a response."""
+        return sum(
+            len(
+                connection.identified
+                if connection.keyed
+                else connection.requests
+            )
+            for connection in self._connections.values()
+        )
+
+    def add(
+        self,
+        time: float,
+        ip_src: int,
+        sport: int,
+        ip_dst: int,
+        dport: int,
+        seq: int,
+        ack: int,
+        payload_length: int,
+        tcp_flags: int,
+        request_id: int = -1,
+        *,
+        tag: object = None,
+    ) -> tuple | None:
+        """Add a TCP segment.
+
+        Args:
+            time: The time of the segment, in seconds.
+            ip_src: The source IP address.
+            sport: The source port.
+            ip_dst: The destination IP address.
+            dport: The destination port.
+            seq: The sequence number.
+            ack: The acknowledgement number.
+            payload_length: The length of the TCP payload.
+            tcp_flags: The TCP flags.
+            request_id: The request identifier of the OPC UA message starting the payload, -1 if there is none.
+            tag: Any value identifying a request, given back with its RTT.
+
+        Returns:
+            When the segment answers a request, a tuple with the tag and time of the request and the RTT in milliseconds, **None** otherwise.
+        """
+        if self._next_sweep is None or time >= self._next_sweep:
+            self.expire(time)
+            self._next_sweep = time + self.timeout
+        if not payload_length:
+            return None
+        pushed = bool(tcp_flags & TCP_PSH)
+        end = (seq + payload_length) % _SEQ_MODULO
+
+        if dport in self.ports:
+            key = (ip_src, sport, ip_dst, dport)
+            connection = self._live_connection(key, time)
+            if connection is None:
+                connection = self._connections[key] = _Connection(time)
+            connection.last_seen = time
+            if request_id >= 0:
+                self._add_identified_request(connection, request_id, time, tag)
+            if not connection.keyed:
+                self._add_request(connection, seq, end, time, tag, pushed)
+            return None
+
+        if sport in self.ports:
+            connection = self._live_connection(
+                (ip_dst, dport, ip_src, sport), time
+            )
+            if connection is None:
+                return None
+            connection.last_seen = time
+            if request_id >= 0:
+                request = connection.identified.pop(request_id, None)
+                if request is not None:
+                    if not connection.keyed:
+                        connection.keyed = True
+                        connection.requests.clear()
+                    connection.misses = 0
+                    request_time, tag = request
+                    return tag, request_time, (time - request_time) * 1000
+                if connection.keyed:
+                    connection.misses += 1
+                    if connection.misses < MAX_KEYED_MISSES:
+                        return None
+                    # The identifiers stopped matching
+                    connection.keyed = False
+                    connection.misses = 0
+                    connection.identified.clear()
+            if connection.keyed:
+                return None
+            return self._add_response(connection, seq, end, ack, time, pushed)
+        return None
+
+    def add_record(
+        self, record: PacketRecord, tag: object = None
+    ) -> tuple | None:
+        """Add the segment of a decoded packet record, see `add`.
+
+        Args:
+            record: The record of the packet.
+            tag: Any value identifying a request, given back with its RTT.
+
+        Returns:
+            The tag and time of the answered request and the RTT in milliseconds, or **None**.
+        """
+        if not record.is_tcp:
+            return None
+        return self.add(
+            record.time,
+            record.ip_src,
+            record.sport,
+            record.ip_dst,
+            record.dport,
+            record.seq,
+            record.ack,
+            record.payload_length,
+            record.tcp_flags,
+            record.request_id,
+            tag=tag,
+        )
+
+    def expire(self, now: float) -> int:
+        """Drop the requests that waited too long and forget the idle connections.
+
+        Args:
+            now: The current time, in seconds.
+
+        Returns:
+            The number of dropped requests.
+        """
+        dropped = 0
+        for key, connection in list(self._connections.items()):
+            expired, idle = self._expire_connection(connection, now)
+            dropped += expired
+            if idle:
+                del self._connections[key]
+        return dropped
+
+    def _live_connection(self, key: tuple, time: float) -> _Connection | None:
+        """Expire a connection, **None** if it is unknown or was forgotten as idle."""
+        connection = self._connections.get(key)
+        if (
+            connection is not None
+            and self._expire_connection(connection, time)[1]
+        ):
+            del self._connections[key]
+            return None
+        return connection
+
+    def _expire_connection(self, connection: _Connection, now: float) -> tuple:
+        """Drop the requests of a connection that waited too long, giving their number and whether the connection is idle.
+
+        Only the requests the connection is paired with are counted, as the
+        ones with an identifier are also followed before it is keyed.
+        """
+        dropped = {False: 0, True: 0}
+        requests = connection.requests
+        while requests and now - requests[0][1] > self.timeout:
+            requests.popleft()
+            dropped[False] += 1
+        identified = connection.identified
+        while identified:
+            request_id, (request_time, _) = next(iter(identified.items()))
+            if now - request_time <= self.timeout:
+                break
+            del identified[request_id]
+            dropped[True] += 1
+        idle = (
+            not requests
+            and not identified
+            and now - connection.last_seen > self.timeout
+        )
+        return dropped[connection.keyed], idle
+
+    def _add_identified_request(
+        self,
+        connection: _Connection,
+        request_id: int,
+        time: float,
+        tag: object,
+    ) -> None:
+        """Remember a request by its identifier, keeping the time of its first chunk."""
+        identified = connection.identified
+        if request_id in identified:
+            return
+        identified[request_id] = (time, tag)
+        if len(identified) > self.max_pending:
+            del identified[next(iter(identified))]
+
+    def _add_request(
+        self,
+        connection: _Connection,
+        seq: int,
+        end: int,
+        time: float,
+        tag: object,
+        pushed: bool,
+    ) -> None:
+        """Queue a request segment, merging it with the unfinished request it continues."""
+        requests = connection.requests
+        if requests:
+            last = requests[-1]
+            if seq_before_or_equal(end, last[0]):
+                return
+            if seq == last[0] and not last[3]:
+                last[0], last[3] = end, pushed
+                return
+        if connection.acked is not None and seq_before_or_equal(
+            end, connection.acked
+        ):
+            # Retransmission of a request the server already received
+            return
+        requests.append([end, time, tag, pushed])
+        if len(requests) > self.max_pending:
+            requests.popleft()
+
+    def _add_response(
+        self,
+        connection: _Connection,
+        seq: int,
+        end: int,
+        ack: int,
+        time: float,
+        pushed: bool,
+    ) -> tuple | None:
+        """Pair a response segment with the oldest request it acknowledges."""
+        if connection.response_end is not None:
+            if seq_before_or_equal(end, connection.response_end):
+                return None
+            if connection.response_open and seq == connection.response_end:
+                connection.response_end = end
+                connection.response_open = not pushed
+                return None
+        connection.response_end = end
+        connection.response_open = not pushed
+        if connection.acked is None or seq_before_or_equal(
+            connection.acked, ack
+        ):
+            connection.acked = ack
+
+        requests = connection.requests
+        while requests and time - requests[0][1] > self.timeout:
+            requests.popleft()
+        if requests and seq_before_or_equal(requests[0][0], ack):
+            _, request_time, tag, _ = requests.popleft()
+            return tag, request_time, (time - request_time) * 1000
+        return None
+
+
+def match_round_trip_times(
+    table: np.ndarray,
+    ports: list,
+    *,
+    timeout: float = DEFAULT_RTT_TIMEOUT,
+    max_pending: int = 256,
+) -> dict:
+    """Calculate the round trip times (RTT) of the flows of a packet table with a `RttMatcher`.
+
+    Args:
+        table: A packet table, see `build_packet_table`, without its redundant packets.
+        ports: List of OPC UA ports.
+        timeout: The longest time a request waits for its response, in seconds.
+        max_pending: The maximum number of requests waiting on a connection.
+
+    Returns:
+        For each flow of `RTT_FLOWS`, a list of `[index, relative time, RTT]` of the responses, as `merge_round_trip_times`.
+
+    Examples:
+        >>> from preprocessing.file_handling import iter_pcapng_records
+        >>> from preprocessing.operations import RedundancyFilter
+        >>> from preprocessing.packet_table import build_packet_table
+        >>> records = iter_pcapng_records('tests/assets/0-dos_attack_example.pcapng')
+        >>> table = build_packet_table(records, '192.168.164.101', ['192.168.164.102'], [4840], redundancy=RedundancyFilter('time'))
+        >>> rtts = match_round_trip_times(table[~table['redundant']], [4840])
+        >>> rtts['C-S'][0]
+        [29, 23.035194, 2.124000000002013]
+    """
+    matcher = RttMatcher(ports, timeout=timeout, max_pending=max_pending)
+    rtts = {flow: [] for flow in RTT_FLOWS}
+    for _, _, flow, index, time, rtt in _match_table(
+        matcher, table, _flow_tags(table)
+    ):
+        rtts[flow].append([index, time, rtt])
+    return rtts
+
+
+class PartialRoundTripTimes(NamedTuple):
+    """The round trip times paired in a part of a packet table, see `partial_match_round_trip_times`.
+
+    `rtts` holds the row in the part, connection, flow and service of the
+    request, index, relative time and RTT of each response, and `matcher` the
+    connections at the end of the part, with the requests still waiting for a
+    response.
+    """
+
+    rtts: list
+    matcher: RttMatcher
+
+
+def partial_match_round_trip_times(
+    table: np.ndarray,
+    ports: list,
+    *,
+    timeout: float = DEFAULT_RTT_TIMEOUT,
+    max_pending: int = 256,
+) -> PartialRoundTripTimes:
+    """Pair the requests and responses of a part of a packet table with a `RttMatcher`, to be merged with `merge_matched_round_trip_times`.
+
+    Args:
+        table: A part of a packet table, see `build_packet_table`, whose redundant packets are skipped.
+        ports: List of OPC UA ports.
+        timeout: The longest time a request waits for its response, in seconds.
+        max_pending: The maximum number of requests waiting on a connection.
+
+    Returns:
+        The RTTs of the responses of the part, and the state of its connections.
+    """
+    matcher = RttMatcher(ports, timeout=timeout, max_pending=max_pending)
+    rtts = list(
+        _match_table(
+            matcher,
+            table,
+            _request_tags(table),
+            np.flatnonzero(~table['redundant']),
+        )
+    )
+    return PartialRoundTripTimes(rtts, matcher)
+
+
+class MatchedRoundTripTimes(NamedTuple):
+    """The round trip times merged by `merge_matched_round_trip_times`.
+
+    `flows` holds the RTTs of each flow of `RTT_FLOWS`, as
+    `match_round_trip_times`, and `services` the ones of each service request,
+    as `match_service_round_trip_times`.
+    """
+
+    flows: dict
+    services: dict
+
+
+def merge_matched_round_trip_times(
+    tables: list, partials: list
+) -> MatchedRoundTripTimes:
+    """Merge the round trip times paired in consecutive parts of a packet table.
+
+    The connections of a part are carried into the next one: their segments
+    are paired again from the carried state until it meets the state the part
+    was paired from, usually a single exchange later, so the RTTs are exactly
+    the ones of `match_round_trip_times` and `match_service_round_trip_times`
+    over the whole table.
+
+    Args:
+        tables: The parts of the packet table, in table order.
+        partials: The results of `partial_match_round_trip_times` for each part.
+
+    Returns:
+        The RTTs of each flow and of each service request, as lists of `[index, relative time, RTT]` of the responses.
+
+    Examples:
+        >>> from preprocessing.file_handling import iter_pcapng_records
+        >>> from preprocessing.operations import RedundancyFilter
+        >>> from preprocessing.packet_table import build_packet_table
+        >>> records = iter_pcapng_records('tests/assets/0-dos_attack_example.pcapng')
+        >>> table = build_packet_table(records, '192.168.164.101', ['192.168.164.102'], [4840], redundancy=RedundancyFilter('time'))
+        >>> parts = [table[:2500], table[2500:]]
+        >>> rtts = merge_matched_round_trip_times(parts, [partial_match_round_trip_times(part, [4840]) for part in parts])
+        >>> distinct = table[~table['redundant']]
+        >>> rtts.flows == match_round_trip_times(distinct, [4840])
+        True
+        >>> rtts.services == match_service_round_trip_times(distinct, [4840])
+        True
+    """
+    flows = {flow: [] for flow in RTT_FLOWS}
+    services = {}
+    carried = None
+    for table, partial in zip(tables, partials):
+        matched = partial.rtts
+        if carried is not None:
+            matched = _carry_connections(carried, table, partial)
+        for _, _, (flow, service), index, time, rtt in matched:
+            if flow is not None:
+                flows[flow].append([index, time, rtt])
+            if service is not None:
+                services.setdefault(service, []).append([index, time, rtt])
+        carried = partial.matcher
+    return MatchedRoundTripTimes(flows, services)
+
+
+def match_service_round_trip_times(
+    table: np.ndarray,
+    ports: list,
+    *,
+    timeout: float = DEFAULT_RTT_TIMEOUT,
+    max_pending: int = 256,
+) -> dict:
+    """Calculate the round trip times (RTT) of each OPC UA service of a packet table.
+
+    Args:
+        table: A packet table, see `build_packet_table`, without its redundant packets.
+        ports: List of OPC UA ports.
+        timeout: The longest time a request waits for its response, in seconds.
+        max_pending: The maximum number of requests waiting on a connection.
+
+    Returns:
+        For each service request answered in the table, by name (see `uatcp.SERVICES`), a list of `[index, relative time, RTT]` of the responses.
+
+    Examples:
+        >>> from preprocessing.file_handling import iter_pcapng_records
+        >>> from preprocessing.operations import RedundancyFilter
+        >>> from preprocessing.packet_table import build_packet_table
+        >>> records = iter_pcapng_records('tests/assets/0-dos_attack_example.pcapng')
+        >>> table = build_packet_table(records, '192.168.164.101', ['192.168.164.102'], [4840], redundancy=RedundancyFilter('payload'))
+        >>> rtts = match_service_round_trip_times(table[~table['redundant']], [4840])
+        >>> len(rtts['ReadRequest']), rtts['CreateSessionRequest']
+        (670, [[43, 23.052675, 4.754000000001923]])
+    """
+    matcher = RttMatcher(ports, timeout=timeout, max_pending=max_pending)
+    rtts = {}
+    tags = [service_name(service) for service in table['service'].tolist()]
+    for _, _, service, index, time, rtt in _match_table(matcher, table, tags):
+        rtts.setdefault(service, []).append([index, time, rtt])
+    return rtts
+
+
+def _flow_tags(table: np.ndarray) -> list:
+    """The flow of `RTT_FLOWS` each packet of a table requests, **None** if it is not a request."""
+    requests = {request: flow for flow, (request, _) in RTT_FLOWS.items()}
+    return [requests.get(comm_type) for comm_type in table['comm_type']]
+
+
+def _request_tags(table: np.ndarray) -> list:
+    """The flow of `RTT_FLOWS` and the service name each packet of a table requests, **None** if it has neither."""
+    services = [service_name(service) for service in table['service'].tolist()]
+    return [
+        None if flow is None and service is None else (flow, service)
+        for flow, service in zip(_flow_tags(table), services)
+    ]
+
+
+def _table_segments(table: np.ndarray, rows: np.ndarray) -> Iterator[tuple]:
+    """The row and the columns of `RttMatcher.add` of the TCP segments among some rows of a table, with their index."""
+    rows = rows[table['proto'][rows] == PROTO_TCP]
+    columns = [table[name][rows].tolist() for name in _SEGMENT_COLUMNS]
+    return zip(rows.tolist(), *columns)
+
+
+def _match_table(
+    matcher: RttMatcher,
+    table: np.ndarray,
+    tags: list,
+    rows: np.ndarray | None = None,
+) -> Iterator[tuple]:
+    """Feed the TCP packets of a table to a `RttMatcher`, yielding the row, connection, tag, index and time of each response with a tagged request, and its RTT."""
+    if rows is None:
+        rows = np.arange(len(table))
+    for row, index, time, *segment in _table_segments(table, rows):
+        matched = matcher.add(time, *segment, tag=tags[row])
+        if matched is not None and matched[0] is not None:
+            ip_src, sport, ip_dst, dport = segment[:4]
+            yield (
+                row,
+                (ip_dst, dport, ip_src, sport),
+                matched[0],
+                index,
+                time,
+                matched[2],
+            )
+
+
+def _carry_connections(
+    carried: RttMatcher, table: np.ndarray, partial: PartialRoundTripTimes
+) -> list:
+    """Pair the segments of the connections carried into a part again, see `merge_matched_round_trip_times`.
+
+    The matcher of the part is updated with the connections that did not meet
+    their carried state, and the RTTs of the part are returned in row order.
+    """
+    matcher = partial.matcher
+    distinct = ~table['redundant']
+    if distinct.any():
+        # The connections idle for longer than the timeout start afresh
+        carried.expire(float(table['time'][distinct][0]))
+    pending = set(carried._connections)
+    if not pending:
+        return partial.rtts
+
+    fresh = RttMatcher(
+        matcher.ports, timeout=matcher.timeout, max_pending=matcher.max_pending
+    )
+    tags = _request_tags(table)
+    rows = _connection_rows(table, pending, matcher.ports)
+    replaced, rtts = {}, []
+    for row, index, time, *segment in _table_segments(table, rows):
+        key = _connection_key(*segment[:4], matcher.ports)
+        if key not in pending:
+            continue
+        matched = carried.add(time, *segment, tag=tags[row])
+        fresh.add(time, *segment, tag=tags[row])
+        if matched is not None and matched[0] is not None:
+            rtts.append((row, key, matched[0], index, time, matched[2]))
+        if _connection_state(carried, key) == _connection_state(fresh, key):
+            # The part was paired from the same state from here on
+            pending.discard(key)
+            replaced[key] = row
+            if not pending:
+                break
+
+    for key in pending:
+        replaced[key] = len(table)
+        connection = carried._connections.get(key)
+        if connection is None:
+            matcher._connections.pop(key, None)
+        else:
+            matcher._connections[key] = connection
+    rtts.extend(
+        rtt
+        for rtt in partial.rtts
+        if rtt[1] not in replaced or rtt[0] > replaced[rtt[1]]
+    )
+    return sorted(rtts, key=lambda rtt: rtt[0])
+
+
+def _connection_key(
+    ip_src: int, sport: int, ip_dst: int, dport: int, ports: frozenset
+) -> tuple | None:
+    """The connection of a segment, as `RttMatcher.add` keys it."""
+    if dport in ports:
+        return ip_src, sport, ip_dst, dport
+    if sport in ports:
+        return ip_dst, dport, ip_src, sport
+    return None
+
+
+def _connection_rows(
+    table: np.ndarray, keys: set, ports: frozenset
+) -> np.ndarray:
+    """The distinct rows of a table with a payload which may belong to some connections, by the address and port of their client."""
+    to_server = np.isin(table['dport'], list(ports))
+    client_ip = np.where(to_server, table['ip_src'], table['ip_dst'])
+    client_port = np.where(to_server, table['sport'], table['dport'])
+    clients = (client_ip.astype(np.uint64) << 16) | client_port
+    wanted = np.array(
+        [(key[0] << 16) | key[1] for key in keys], dtype=np.uint64
+    )
+    return np.flatnonzero(
+        np.isin(clients, wanted)
+        & ~table['redundant']
+        & (table['payload_length'] > 0)
+    )
+
+
+def _connection_state(matcher: RttMatcher, key: tuple) -> tuple | None:
+    """The state of a connection of a matcher, **None** if it has none."""
+    connection = matcher._connections.get(key)
+    return None if connection is None else connection.state()
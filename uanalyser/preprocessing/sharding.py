@@ -0,0 +1,501 @@
+"""
+Provides the analysis of a capture split in shards of consecutive packet
+blocks. Each shard is classified, cleared of redundant data, binned and paired
+for RTT in its own worker process, and the partial results are merged into
+exactly what a sequential run over the whole capture gives.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+from preprocessing.cache import (
+    DEFAULT_CACHE_SIZE,
+    cache_key,
+    load_table,
+    store_table,
+)
+from preprocessing.decoder import PacketRecord
+from preprocessing.index import PacketIndex, load_index
+from preprocessing.operations import (
+    RedundancyFilter,
+    count_buckets,
+    sum_buckets,
+)
+from preprocessing.packet_table import (
+    RTT_FLOWS,
+    build_packet_table,
+    find_attack_start,
+    merge_round_trip_times,
+    partial_round_trip_time,
+)
+from preprocessing.pcapng import (
+    ReaderState,
+    iter_block_records,
+    scan_reader_states,
+    seek_time,
+)
+from preprocessing.rtt import (
+    DEFAULT_RTT_TIMEOUT,
+    RTT_KEYS,
+    merge_matched_round_trip_times,
+    partial_match_round_trip_times,
+)
+
+
+class CaptureAnalysis(NamedTuple):
+    """The results of the analysis of a capture.
+
+    `table` is the packet table, redundant rows included, `attack_start` the
+    relative time and index of the first attack packet (**None** if there is no
+    attack), `rtts` the round trip times of each flow of `RTT_FLOWS` and
+    `service_rtts` the ones of each OPC UA service request, by name, which only
+    the 'tcp' RTT key pairs, and only in the None and Sign security modes.
+    """
+
+    table: np.ndarray
+    attack_start: tuple | None
+    throughput_kbps: np.ndarray
+    opcua_packets_per_second: np.ndarray
+    rtts: dict
+    service_rtts: dict = {}
+
+
+def analyse_shard(
+    file_path: str,
+    state: ReaderState | None,
+    end: int | None,
+    first_index: int,
+    first_time: float | None,
+    server_ip: str | list,
+    clients_ip: list,
+    ports: list,
+    *,
+    max_duration: float | None = 60,
+    redundancy_key: str = 'time',
+    bucket: float = 1.0,
+    rtt_key: str = 'tcp',
+    rtt_timeout: float = DEFAULT_RTT_TIMEOUT,
+) -> dict:
+    """Analyse the packet blocks of a capture between two offsets.
+
+    Args:
+        file_path: The PCAPNG file to analyse.
+        state: Where the shard starts, as given by `scan_reader_states`. **None** starts at the beginning of the file.
+        end: The offset where the next shard starts. **None** reads to the end of the file.
+        first_index: The index in the capture of the first packet of the shard.
+        first_time: The timestamp the relative times are measured from, the first packet of the capture or the start of the window. **None** if the shard starts the capture.
+        server_ip: The IP address of the OPCUA server, or a list of them.
+        clients_ip: List of clients IP addresses.
+        ports: List of OPC UA ports.
+        max_duration: The duration of the capture to analyse, in seconds. **None** analyses all of it.
+        redundancy_key: The key identifying redundant packets, see `RedundancyFilter`.
+        bucket: The width of the throughput buckets in seconds.
+        rtt_key: How requests and responses are paired, see `analyse_capture`.
+        rtt_timeout: The longest time a request waits for its response with the 'tcp' key, in seconds.
+
+    Returns:
+        A dictionary with the packet table of the shard, the keys of its distinct packets, the time-bucket sums, the partial RTTs and the start of the attack.
+    """
+    redundancy = RedundancyFilter(redundancy_key)
+    first_packet = None
+    if first_time is not None:
+        first_packet = PacketRecord(first_time, *[0] * 10, b'')
+
+    table = build_packet_table(
+        iter_block_records(file_path, state, end),
+        server_ip,
+        clients_ip,
+        ports,
+        max_duration=max_duration,
+        redundancy=redundancy,
+        first_packet=first_packet,
+        first_index=first_index,
+    )
+    return {
+        'Table': table,
+        'Keys': redundancy.keys,
+        'Attack start': find_attack_start(table),
+        **_summarise_shard(
+            table,
+            bucket,
+            ports=ports,
+            rtt_key=rtt_key,
+            rtt_timeout=rtt_timeout,
+        ),
+    }
+
+
+def _summarise_shard(
+    table: np.ndarray,
+    bucket: float,
+    *,
+    ports: list,
+    rtt_key: str,
+    rtt_timeout: float,
+) -> dict:
+    """Sum the time buckets and pair the RTTs of the distinct packets of a shard."""
+    distinct = table[~table['redundant']]
+    buckets = (
+        count_buckets(float(distinct['time'].max()), bucket) + 1
+        if len(distinct)
+        else 0
+    )
+    len_bytes, packets = sum_buckets(
+        distinct['time'],
+        distinct['length'],
+        distinct['opcua'],
+        buckets,
+        bucket=bucket,
+    )
+    if rtt_key == 'mac':
+        rtts = {
+            flow: partial_round_trip_time(distinct, flow) for flow in RTT_FLOWS
+        }
+    else:
+        rtts = partial_match_round_trip_times(
+            table, ports, timeout=rtt_timeout
+        )
+    return {'Bytes': len_bytes, 'Packets': packets, 'RTT': rtts}
+
+
+def _summarise_cached_rows(
+    key: str, cache_dir: str, start: int, stop: int, bucket: float, **options
+) -> dict:
+    """Summarise some rows of a cached packet table, memory-mapped in the worker process."""
+    table = load_table(key, cache_dir)
+    if table is None:
+        raise ValueError(f'The packet table "{key}" left the cache.')
+    rows = table[start:stop]
+    return {
+        'Attack start': find_attack_start(rows),
+        **_summarise_shard(rows, bucket, **options),
+    }
+
+
+def merge_shards(
+    parts: list,
+    *,
+    bucket: float = 1.0,
+    ports: list = (),
+    rtt_key: str = 'tcp',
+    rtt_timeout: float = DEFAULT_RTT_TIMEOUT,
+    table: np.ndarray | None = None,
+) -> CaptureAnalysis:
+    """Merge the analyses of consecutive shards of a capture.
+
+    The shards after the one where the capture was cut are dropped, the packets
+    whose key was already seen in an earlier shard are flagged as redundant,
+    and the bucket sums and RTTs are joined across the shard edges.
+
+    Args:
+        parts: The results of `analyse_shard` for each shard, in capture order, with a `Complete` flag set to **False** for a shard cut by the duration limit.
+        bucket: The width of the throughput buckets in seconds.
+        ports: List of OPC UA ports.
+        rtt_key: How the RTTs of the shards were paired, see `analyse_capture`.
+        rtt_timeout: The longest time a request waits for its response with the 'tcp' key, in seconds.
+        table: The whole packet table, when the shards are consecutive slices of it, so it is not copied.
+
+    Returns:
+        The analysis of the whole capture.
+    """
+    options = {'ports': ports, 'rtt_key': rtt_key, 'rtt_timeout': rtt_timeout}
+    kept = []
+    for part in parts:
+        kept.append(part)
+        if not part['Complete']:
+            break
+
+    seen = set()
+    for part in kept:
+        duplicated = seen.intersection(part['Keys'])
+        if duplicated:
+            rows = part['Table']
+            distinct_rows = np.flatnonzero(~rows['redundant'])
+            rows['redundant'][
+                distinct_rows[[key in duplicated for key in part['Keys']]]
+            ] = True
+            part.update(_summarise_shard(rows, bucket, **options))
+        seen.update(part['Keys'])
+
+    if table is None:
+        table = (
+            kept[0]['Table']
+            if len(kept) == 1
+            else np.concatenate([part['Table'] for part in kept])
+        )
+    distinct_times = table['time'][~table['redundant']]
+    buckets = (
+        count_buckets(float(distinct_times[-1]), bucket)
+        if len(distinct_times)
+        else 0
+    )
+    len_bytes = np.zeros(buckets)
+    packets = np.zeros(buckets, dtype=np.int64)
+    for part in kept:
+        size = min(buckets, len(part['Bytes']))
+        len_bytes[:size] += part['Bytes'][:size]
+        packets[:size] += part['Packets'][:size]
+
+    attack_starts = [
+        part['Attack start']
+        for part in kept
+        if part['Attack start'] is not None
+    ]
+    if rtt_key == 'mac':
+        rtts = {
+            flow: merge_round_trip_times([part['RTT'][flow] for part in kept])
+            for flow in RTT_FLOWS
+        }
+        service_rtts = {}
+    else:
+        rtts, service_rtts = merge_matched_round_trip_times(
+            [part['Table'] for part in kept], [part['RTT'] for part in kept]
+        )
+    return CaptureAnalysis(
+        table,
+        attack_starts[0] if attack_starts else None,
+        len_bytes / 1024 / bucket,
+        packets / bucket,
+        rtts,
+        service_rtts,
+    )
+
+
+def analyse_capture(
+    file_path: str,
+    server_ip: str | list,
+    clients_ip: list,
+    ports: list,
+    *,
+    shards: int = 1,
+    workers: int | None = None,
+    start: float = 0.0,
+    max_duration: float | None = 60,
+    redundancy_key: str = 'time',
+    bucket: float = 1.0,
+    cache_dir: str | None = None,
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    cached_only: bool = False,
+    use_index: bool = False,
+    index_dir: str | None = None,
+    rtt_key: str = 'tcp',
+    rtt_timeout: float = DEFAULT_RTT_TIMEOUT,
+) -> CaptureAnalysis:
+    """Analyse a capture, split in shards processed in parallel.
+
+    The file is cut at block boundaries into shards of about the same size.
+    With a single shard the analysis runs in the calling process. When a
+    cache is given, the packet table is only built the first time and later
+    analyses start from the cached table, split in as many ranges of rows,
+    which the worker processes bin and pair from the memory-mapped file.
+
+    A window starting after the first packet is reached by reading the packet
+    timestamps of the block headers only, or straight from the packet-time
+    index of the capture, and the relative times of its packets are measured
+    from the start of the window.
+
+    Args:
+        file_path: The PCAPNG file to analyse.
+        server_ip: The IP address of the OPCUA server, or a list of them.
+        clients_ip: List of clients IP addresses.
+        ports: List of OPC UA ports.
+        shards: The number of shards. Defaults to 1.
+        workers: The number of worker processes. Defaults to the number of shards.
+        start: The start of the window to analyse, in seconds after the first packet.
+        max_duration: The duration of the window to analyse, in seconds. **None** analyses the capture up to its end.
+        redundancy_key: The key identifying redundant packets, see `RedundancyFilter`.
+        bucket: The width of the throughput buckets in seconds.
+        cache_dir: The directory of the packet table cache. **None** disables the cache.
+        cache_size: The maximum size of the cache, in bytes.
+        cached_only: Whether to only start from the cached table, without decoding the capture, such as to plot it again.
+        use_index: Whether to find the window and the shards with the packet-time index of the capture, see `load_index`. The index is built the first time.
+        index_dir: The directory of the index sidecar files. **None** keeps them next to the captures.
+        rtt_key: How requests and responses are paired. 'tcp' pairs them per TCP connection with a `RttMatcher` in each shard, the connections being carried across the shard edges; 'mac' pairs the last request of each pair of MAC addresses with the next response, as `calculate_round_trip_time`.
+        rtt_timeout: The longest time a request waits for its response with the 'tcp' key, in seconds.
+
+    Returns:
+        The analysis of the capture, identical whatever the number of shards.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If `file_path` is **None**, an empty string, if the file has no packets in the window, if an unacceptable RTT key is provided or if `cached_only` is set and the table is not cached.
+
+    Examples:
+        >>> analysis = analyse_capture('tests/assets/0-dos_attack_example.pcapng', '192.168.164.101', ['192.168.164.102'], [4840], shards=3)
+        >>> analysis.attack_start
+        (32.341966, 1966)
+        >>> sequential = analyse_capture('tests/assets/0-dos_attack_example.pcapng', '192.168.164.101', ['192.168.164.102'], [4840])
+        >>> bool((analysis.table == sequential.table).all()), analysis.rtts == sequential.rtts
+        (True, True)
+        >>> len(analysis.service_rtts['ReadRequest']), analysis.service_rtts == sequential.service_rtts
+        (650, True)
+    """
+    if not file_path:
+        raise ValueError('`file_path` must not be None or an empty string.')
+    rtt_options = {
+        'ports': ports,
+        'rtt_key': rtt_key,
+        'rtt_timeout': rtt_timeout,
+    }
+    if rtt_key not in RTT_KEYS:
+        raise ValueError(
+            f"Invalid RTT key: '{rtt_key}'. Acceptable values are: {list(RTT_KEYS)}"
+        )
+    try:
+        size = os.path.getsize(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'No such file or directory: "{file_path}".')
+
+    if cache_dir is not None:
+        key = cache_key(
+            file_path,
+            server_ip=server_ip,
+            clients_ip=clients_ip,
+            ports=ports,
+            start=start,
+            max_duration=max_duration,
+            redundancy_key=redundancy_key,
+        )
+        table = load_table(key, cache_dir)
+        if table is not None:
+            return _analyse_cached_table(
+                table, key, cache_dir, shards, workers, bucket, rtt_options
+            )
+    if cached_only:
+        raise ValueError(
+            f'The packet table of "{file_path}" is not in the cache.'
+        )
+
+    options = {
+        'max_duration': max_duration,
+        'redundancy_key': redundancy_key,
+        'bucket': bucket,
+        'rtt_key': rtt_key,
+        'rtt_timeout': rtt_timeout,
+    }
+    index = load_index(file_path, index_dir=index_dir) if use_index else None
+    if start > 0:
+        if index is not None:
+            state, first_index = index.seek(start)
+            first_time = (
+                float(index.packets['time'][0]) if state is not None else None
+            )
+        else:
+            state, first_index, first_time = seek_time(file_path, start)
+        if state is None:
+            raise ValueError(
+                f'The file "{file_path}" has no content after {start} seconds.'
+            )
+        first_time += start
+        states, first_indexes = [state], [first_index]
+    else:
+        state, states, first_indexes, first_time = None, [None], [0], None
+
+    if shards > 1:
+        origin = state.offset if state is not None else 0
+        offsets = [
+            origin + (size - origin) * shard // shards
+            for shard in range(shards)
+        ]
+        if index is not None:
+            states, first_indexes, capture_time = _index_reader_states(
+                index, offsets
+            )
+        else:
+            states, first_indexes, capture_time = scan_reader_states(
+                file_path, offsets
+            )
+        if first_time is None:
+            first_time = capture_time
+
+    ends = [state.offset for state in states[1:]] + [None]
+    arguments = [
+        (
+            file_path,
+            state,
+            end,
+            first_index,
+            first_time,
+            server_ip,
+            clients_ip,
+            ports,
+        )
+        for state, end, first_index in zip(states, ends, first_indexes)
+    ]
+    if len(arguments) > 1:
+        with ProcessPoolExecutor(max_workers=workers or shards) as executor:
+            futures = [
+                executor.submit(analyse_shard, *args, **options)
+                for args in arguments
+            ]
+            parts = [future.result() for future in futures]
+    else:
+        parts = [analyse_shard(*args, **options) for args in arguments]
+
+    for part, first_index, next_index in zip(
+        parts, first_indexes, first_indexes[1:] + [None]
+    ):
+        part['Complete'] = (
+            next_index is None
+            or len(part['Table']) == next_index - first_index
+        )
+
+    if not any(len(part['Table']) for part in parts):
+        raise ValueError(f'The file "{file_path}" has no content.')
+    analysis = merge_shards(parts, bucket=bucket, **rtt_options)
+    if cache_dir is not None:
+        store_table(key, analysis.table, cache_dir, cache_size)
+    return analysis
+
+
+def _analyse_cached_table(
+    table: np.ndarray,
+    key: str,
+    cache_dir: str,
+    shards: int,
+    workers: int | None,
+    bucket: float,
+    rtt_options: dict,
+) -> CaptureAnalysis:
+    """Analyse a cached packet table, split in ranges of rows summarised in parallel."""
+    bounds = [len(table) * shard // shards for shard in range(shards + 1)]
+    if shards > 1:
+        with ProcessPoolExecutor(max_workers=workers or shards) as executor:
+            futures = [
+                executor.submit(
+                    _summarise_cached_rows,
+                    key,
+                    cache_dir,
+                    start,
+                    stop,
+                    bucket,
+                    **rtt_options,
+                )
+                for start, stop in zip(bounds, bounds[1:])
+            ]
+            summaries = [future.result() for future in futures]
+    else:
+        summaries = [
+            {
+                'Attack start': find_attack_start(table),
+                **_summarise_shard(table, bucket, **rtt_options),
+            }
+        ]
+    parts = [
+        {'Table': table[start:stop], 'Keys': [], 'Complete': True, **summary}
+        for start, stop, summary in zip(bounds, bounds[1:], summaries)
+    ]
+    return merge_shards(parts, bucket=bucket, table=table, **rtt_options)
+
+
+def _index_reader_states(index: PacketIndex, offsets: list[int]) -> tuple:
+    """Find the reader states of `scan_reader_states` in a packet-time index."""
+    packet_offsets = index.packets['offset']
+    rows = np.unique(np.searchsorted(packet_offsets, offsets))
+    rows = rows[rows < len(packet_offsets)].tolist()
+    first_time = (
+        float(index.packets['time'][0]) if len(packet_offsets) else None
+    )
+    return [index.state(row) for row in rows], rows, first_time
@@ -0,0 +1,504 @@
+"""
+Provides a decoder of the OPC UA binary protocol over TCP (UA TCP): the
+message header, the security and sequence headers of the secure conversation
+messages and the type of the service of their body. It reads `memoryview`
+slices of the TCP payloads without copying them, and reassembles the
+messages split over several segments.
+
+The sequence header and the body are only readable in the None and Sign
+security modes: with Sign & Encrypt, and in the OPN messages of any other
+security policy than None, they are encrypted. The request identifiers and
+services, and so the counts and RTTs per service, are then unknown.
+"""
+
+import struct
+from typing import Hashable, Iterator, NamedTuple
+
+MESSAGE_TYPES = (b'HEL', b'ACK', b'ERR', b'RHE', b'OPN', b'MSG', b'CLO')
+SECURE_MESSAGE_TYPES = (b'OPN', b'MSG', b'CLO')
+CHUNK_TYPES = (b'F', b'C', b'A')
+DEFAULT_MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# The numeric identifiers of the default binary encodings of the service
+# requests and responses, in namespace 0
+SERVICES = {
+    397: 'ServiceFault',
+    422: 'FindServersRequest',
+    425: 'FindServersResponse',
+    428: 'GetEndpointsRequest',
+    431: 'GetEndpointsResponse',
+    437: 'RegisterServerRequest',
+    440: 'RegisterServerResponse',
+    446: 'OpenSecureChannelRequest',
+    449: 'OpenSecureChannelResponse',
+    452: 'CloseSecureChannelRequest',
+    455: 'CloseSecureChannelResponse',
+    461: 'CreateSessionRequest',
+    464: 'CreateSessionResponse',
+    467: 'ActivateSessionRequest',
+    470: 'ActivateSessionResponse',
+    473: 'CloseSessionRequest',
+    476: 'CloseSessionResponse',
+    479: 'CancelRequest',
+    482: 'CancelResponse',
+    488: 'AddNodesRequest',
+    491: 'AddNodesResponse',
+    494: 'AddReferencesRequest',
+    497: 'AddReferencesResponse',
+    500: 'DeleteNodesRequest',
+    503: 'DeleteNodesResponse',
+    506: 'DeleteReferencesRequest',
+    509: 'DeleteReferencesResponse',
+    527: 'BrowseRequest',
+    530: 'BrowseResponse',
+    533: 'BrowseNextRequest',
+    536: 'BrowseNextResponse',
+    554: 'TranslateBrowsePathsToNodeIdsRequest',
+    557: 'TranslateBrowsePathsToNodeIdsResponse',
+    560: 'RegisterNodesRequest',
+    563: 'RegisterNodesResponse',
+    566: 'UnregisterNodesRequest',
+    569: 'UnregisterNodesResponse',
+    615: 'QueryFirstRequest',
+    618: 'QueryFirstResponse',
+    621: 'QueryNextRequest',
+    624: 'QueryNextResponse',
+    631: 'ReadRequest',
+    634: 'ReadResponse',
+    664: 'HistoryReadRequest',
+    667: 'HistoryReadResponse',
+    673: 'WriteRequest',
+    676: 'WriteResponse',
+    700: 'HistoryUpdateRequest',
+    703: 'HistoryUpdateResponse',
+    712: 'CallRequest',
+    715: 'CallResponse',
+    751: 'CreateMonitoredItemsRequest',
+    754: 'CreateMonitoredItemsResponse',
+    763: 'ModifyMonitoredItemsRequest',
+    766: 'ModifyMonitoredItemsResponse',
+    769: 'SetMonitoringModeRequest',
+    772: 'SetMonitoringModeResponse',
+    775: 'SetTriggeringRequest',
+    778: 'SetTriggeringResponse',
+    781: 'DeleteMonitoredItemsRequest',
+    784: 'DeleteMonitoredItemsResponse',
+    787: 'CreateSubscriptionRequest',
+    790: 'CreateSubscriptionResponse',
+    793: 'ModifySubscriptionRequest',
+    796: 'ModifySubscriptionResponse',
+    799: 'SetPublishingModeRequest',
+    802: 'SetPublishingModeResponse',
+    826: 'PublishRequest',
+    829: 'PublishResponse',
+    832: 'RepublishRequest',
+    835: 'RepublishResponse',
+    841: 'TransferSubscriptionsRequest',
+    844: 'TransferSubscriptionsResponse',
+    847: 'DeleteSubscriptionsRequest',
+    850: 'DeleteSubscriptionsResponse',
+}
+
+_HEADER = struct.Struct('<3scI')
+_UINT16 = struct.Struct('<H')
+_UINT32 = struct.Struct('<I')
+_INT32 = struct.Struct('<i')
+_NUMERIC_NODE_ID = struct.Struct('<HI')
+_SEQ_MODULO = 1 << 32
+
+
+class UaMessage(NamedTuple):
+    """The headers of a UA TCP message chunk.
+
+    `request_id` is the request identifier of the sequence header, -1 for the
+    messages other than OPN, MSG and CLO and for the encrypted ones. `service`
+    is the numeric identifier of the encoding of the service of the body (see
+    `SERVICES`), 0 when it is unknown, encrypted or the chunk does not start
+    the message.
+    """
+
+    message_type: str
+    chunk_type: str
+    size: int
+    secure_channel_id: int = 0
+    request_id: int = -1
+    service: int = 0
+
+    @property
+    def service_name(self) -> str | None:
+        """The name of the service request or response, **None** if it is unknown."""
+        return SERVICES.get(self.service)
+
+
+def service_name(service: int) -> str | None:
+    """Find the name of a service request or response.
+
+    Args:
+        service: The numeric identifier of the encoding of the service.
+
+    Returns:
+        The name of the service, **None** if it is unknown.
+
+    Examples:
+        >>> service_name(631), service_name(1)
+        ('ReadRequest', None)
+    """
+    return SERVICES.get(service)
+
+
+def read_node_id(view: memoryview, offset: int) -> tuple | None:
+    """Read a numeric NodeId in the binary encoding.
+
+    Args:
+        view: The buffer holding the NodeId.
+        offset: Where the NodeId starts.
+
+    Returns:
+        A tuple with the namespace index, the numeric identifier and the offset following the NodeId, or **None** if the NodeId is not numeric or is cut short.
+
+    Examples:
+        >>> read_node_id(memoryview(bytes.fromhex('01007702')), 0)
+        (0, 631, 4)
+    """
+    size = len(view)
+    if size < offset + 1:
+        return None
+    encoding = view[offset] & 0x3F
+    if encoding == 0x00 and size >= offset + 2:
+        return 0, view[offset + 1], offset + 2
+    if encoding == 0x01 and size >= offset + 4:
+        (identifier,) = _UINT16.unpack_from(view, offset + 2)
+        return view[offset + 1], identifier, offset + 4
+    if encoding == 0x02 and size >= offset + 7:
+        namespace, identifier = _NUMERIC_NODE_ID.unpack_from(view, offset + 1)
+        return namespace, identifier, offset + 7
+    return None
+
+
+def decode_message(
+    view: bytes | memoryview, *, first_chunk: bool = True
+) -> UaMessage | None:
+    """Decode the headers of a UA TCP message chunk.
+
+    Only the headers are read: the chunk may be cut short after them, and
+    the fields that are cut short keep their default value.
+
+    The sequence header of an encrypted chunk is ciphertext, and nothing in
+    the chunk tells the security mode of its channel. The request identifier
+    of a chunk starting its message is only kept when its body starts with
+    the NodeId of a known service, which the ciphertext almost never does:
+    otherwise the chunk is taken for an encrypted one, with no request
+    identifier nor service.
+
+    Args:
+        view: The chunk, from its message header.
+        first_chunk: Whether the chunk starts its message, so its body starts with the type of the service. The request identifier of a chunk that does not is read unchecked, for the caller to look it up in the messages it follows.
+
+    Returns:
+        The headers of the chunk, or **None** if it does not start with a valid message header.
+
+    Examples:
+        >>> message = decode_message(bytes.fromhex(
+        ...     '4d534746' '30000000' '01000000' '02000000' '33000000' '07000000' '01007702'
+        ... ))
+        >>> message
+        UaMessage(message_type='MSG', chunk_type='F', size=48, secure_channel_id=1, request_id=7, service=631)
+        >>> message.service_name
+        'ReadRequest'
+        >>> decode_message(b'HELF\\x20\\x00\\x00\\x00')
+        UaMessage(message_type='HEL', chunk_type='F', size=32, secure_channel_id=0, request_id=-1, service=0)
+
+        The same chunk encrypted with Sign & Encrypt:
+
+        >>> decode_message(bytes.fromhex(
+        ...     '4d534746' '30000000' '01000000' '02000000' '9c3fe2a1' '5b7d0e44' 'c8e1f317'
+        ... ))
+        UaMessage(message_type='MSG', chunk_type='F', size=48, secure_channel_id=1, request_id=-1, service=0)
+    """
+    view = memoryview(view)
+    size = len(view)
+    if size < _HEADER.size:
+        return None
+    message_type, chunk_type, message_size = _HEADER.unpack_from(view)
+    if message_type not in MESSAGE_TYPES or chunk_type not in CHUNK_TYPES:
+        return None
+    message = UaMessage(
+        message_type.decode(), chunk_type.decode(), message_size
+    )
+    if message_type not in SECURE_MESSAGE_TYPES or size < 12:
+        return message
+
+    (secure_channel_id,) = _UINT32.unpack_from(view, 8)
+    message = message._replace(secure_channel_id=secure_channel_id)
+    offset = 12
+    if message_type == b'OPN':
+        # Skip the security policy URI, sender certificate and receiver
+        # certificate thumbprint of the asymmetric security header
+        for _ in range(3):
+            if size < offset + 4:
+                return message
+            (length,) = _INT32.unpack_from(view, offset)
+            offset += 4 + max(length, 0)
+    else:
+        # Skip the token id of the symmetric security header
+        offset += 4
+
+    # Skip the sequence number
+    offset += 4
+    if size < offset + 4:
+        return message
+    (request_id,) = _UINT32.unpack_from(view, offset)
+    if not first_chunk:
+        return message._replace(request_id=request_id)
+    if chunk_type == b'A':
+        return message
+
+    node_id = read_node_id(view, offset + 4)
+    if node_id is None or node_id[0] != 0 or node_id[1] not in SERVICES:
+        # Encrypted, or cut short before the service
+        return message
+    return message._replace(request_id=request_id, service=node_id[1])
+
+
+def iter_messages(
+    view: bytes | memoryview,
+) -> Iterator[tuple[UaMessage, memoryview]]:
+    """Split a buffer into the complete UA TCP message chunks it starts with.
+
+    Args:
+        view: The buffer, starting with a message header.
+
+    Yields:
+        The headers of each complete chunk and a view on the chunk. The iteration stops at the first chunk cut short or invalid header.
+
+    Examples:
+        >>> chunks = bytes.fromhex('48454c46' '08000000' '41434b46' '08000000' '4d5347')
+        >>> [message.message_type for message, _ in iter_messages(chunks)]
+        ['HEL', 'ACK']
+    """
+    view = memoryview(view)
+    offset = 0
+    while len(view) - offset >= _HEADER.size:
+        _, _, size = _HEADER.unpack_from(view, offset)
+        if size < _HEADER.size or len(view) - offset < size:
+            return
+        chunk = view[offset : offset + size]
+        message = decode_message(chunk)
+        if message is None:
+            return
+        yield message, chunk
+        offset += size
+
+
+class _Stream:
+    """The state of the reassembly of one direction of a TCP connection."""
+
+    __slots__ = ('next_seq', 'buffer', 'open_requests')
+
+    def __init__(self, next_seq: int):
+        self.next_seq = next_seq
+        self.buffer = bytearray()
+        # The requests with an intermediate chunk already seen, whose next
+        # chunks do not start with the type of the service
+        self.open_requests = set()
+
+
+class MessageReassembler:
+    """Reassemble the UA TCP message chunks of TCP streams from their segments.
+
+    Each direction of a connection is a stream, identified by any hashable
+    key, such as the IP 4-tuple. A stream starts at the first segment starting
+    with a message header. The chunks held entirely in a segment are decoded
+    in place, and only the chunks split over several segments are buffered.
+    Retransmitted bytes are skipped and, after a gap in the stream, the
+    reassembly resumes at the next segment starting with a message header.
+
+    Args:
+        max_message_size: The largest chunk accepted. A larger size is taken for a corrupted stream.
+        max_streams: The maximum number of streams followed at once. The oldest streams are forgotten first.
+
+    Examples:
+        >>> chunk = bytes.fromhex('4d534746' '1c000000' '01000000' '02000000' '33000000' '07000000' '01007702')
+        >>> reassembler = MessageReassembler()
+        >>> reassembler.feed('client', 1000, chunk[:10])
+        []
+        >>> reassembler.feed('client', 1010, chunk[10:])
+        [UaMessage(message_type='MSG', chunk_type='F', size=28, secure_channel_id=1, request_id=7, service=631)]
+    """
+
+    def __init__(
+        self,
+        *,
+        max_message_size: int = DEFAULT_MAX_MESSAGE_SIZE,
+        max_streams: int = 65536,
+    ):
+        self.max_message_size = max_message_size
+        self.max_streams = max_streams
+        self._streams = {}
+
+    @property
+    def buffered(self) -> int:
+        """The number of bytes waiting for the end of their chunk."""
+        return sum(len(stream.buffer) for stream in self._streams.values())
+
+    def feed(
+        self, key: Hashable, seq: int, payload: bytes | memoryview
+    ) -> list[UaMessage]:
+        """Add a TCP segment to its stream.
+
+        Args:
+            key: The identifier of the stream.
+            seq: The sequence number of the segment.
+            payload: The TCP payload of the segment.
+
+        Returns:
+            The headers of the chunks completed by the segment.
+        """
+        return self.feed_segment(key, seq, payload)[0]
+
+    def feed_segment(
+        self, key: Hashable, seq: int, payload: bytes | memoryview
+    ) -> tuple:
+        """Add a TCP segment to its stream, see `feed`, also finding the first chunk starting in it.
+
+        Args:
+            key: The identifier of the stream.
+            seq: The sequence number of the segment.
+            payload: The TCP payload of the segment.
+
+        Returns:
+            The headers of the chunks completed by the segment, and the headers of the first chunk starting in the segment, complete or not (the fields cut short keep their default value, and so does the request identifier of a chunk cut short before its service, see `decode_message`), or **None** if no chunk starts in it. The segments retransmitted in full complete no chunk, and only the chunk starting them is found.
+
+        Examples:
+            The second chunk of a segment is found even when the segment starts in the middle of a chunk:
+
+            >>> chunk = bytes.fromhex('4d534746' '1c000000' '01000000' '02000000' '33000000' '07000000' '01007702')
+            >>> reassembler = MessageReassembler()
+            >>> reassembler.feed_segment('client', 0, chunk[:24])
+            ([], UaMessage(message_type='MSG', chunk_type='F', size=28, secure_channel_id=1, request_id=-1, service=0))
+            >>> completed, started = reassembler.feed_segment('client', 24, chunk[24:] + chunk)
+            >>> completed[0].service, started.request_id
+            (631, 7)
+        """
+        payload = memoryview(payload)
+        if not payload:
+            return [], None
+        stream = self._streams.get(key)
+        if stream is not None:
+            # The position of the segment relative to the expected one
+            shift = (seq - stream.next_seq) % _SEQ_MODULO
+            if shift >= _SEQ_MODULO // 2:
+                # A retransmission, possibly carrying new bytes at its end
+                overlap = _SEQ_MODULO - shift
+                if overlap >= len(payload):
+                    # Already reassembled: the segment is decoded on its own
+                    return [], decode_message(payload)
+                payload = payload[overlap:]
+                seq = stream.next_seq
+            elif shift:
+                # A gap: the chunks in progress cannot be completed
+                del self._streams[key]
+                stream = None
+        if stream is None:
+            if decode_message(payload[: _HEADER.size]) is None:
+                return [], None
+            stream = self._start_stream(key, seq)
+
+        stream.next_seq = (seq + len(payload)) % _SEQ_MODULO
+        # The first chunk completed starts in the segment unless it was
+        # buffered, and so does the rest of the buffer once a chunk completes
+        started = 0 if not stream.buffer else 1
+        if not stream.buffer:
+            messages, consumed = self._split(stream, payload)
+            if consumed is not None:
+                stream.buffer = bytearray(payload[consumed:])
+        else:
+            stream.buffer += payload
+            with memoryview(stream.buffer) as view:
+                messages, consumed = self._split(stream, view)
+            if consumed is not None:
+                del stream.buffer[:consumed]
+        if consumed is None:
+            del self._streams[key]
+        if len(messages) > started:
+            return messages, messages[started]
+        if consumed is None or len(messages) < started:
+            return messages, None
+        return messages, self._peek(stream)
+
+    def feed_record(self, record) -> list[UaMessage]:
+        """Add the TCP segment of a `PacketRecord` of the raw decoder, see `feed`.
+
+        The stream of the segment is its IP 4-tuple, and only the captured
+        bytes of the payload are read.
+
+        Args:
+            record: The record of the packet.
+
+        Returns:
+            The headers of the chunks completed by the segment.
+        """
+        if not record.payload_length or not record.is_tcp:
+            return []
+        start = record.payload_offset
+        payload = memoryview(record.frame)[
+            start : start + record.payload_length
+        ]
+        return self.feed(
+            (record.ip_src, record.sport, record.ip_dst, record.dport),
+            record.seq,
+            payload,
+        )
+
+    def _peek(self, stream: _Stream) -> UaMessage | None:
+        """Decode the headers of the chunk waiting in the buffer of a stream, without marking it as seen."""
+        with memoryview(stream.buffer) as view:
+            message = decode_message(view, first_chunk=False)
+            request = message and (
+                message.secure_channel_id,
+                message.request_id,
+            )
+            if message and request not in stream.open_requests:
+                message = decode_message(view)
+        return message
+
+    def _start_stream(self, key: Hashable, seq: int) -> _Stream:
+        """Follow a new stream, forgetting the oldest one if there are too many."""
+        if len(self._streams) >= self.max_streams:
+            del self._streams[next(iter(self._streams))]
+        stream = self._streams[key] = _Stream(seq)
+        return stream
+
+    def _split(self, stream: _Stream, view: memoryview) -> tuple:
+        """Decode the complete chunks of a buffer, returning them with the number of bytes they use, **None** if the stream is corrupted."""
+        messages = []
+        offset = 0
+        while len(view) - offset >= _HEADER.size:
+            message_type, chunk_type, size = _HEADER.unpack_from(view, offset)
+            if (
+                message_type not in MESSAGE_TYPES
+                or chunk_type not in CHUNK_TYPES
+                or not _HEADER.size <= size <= self.max_message_size
+            ):
+                return messages, None
+            if len(view) - offset < size:
+                break
+            messages.append(self._decode(stream, view[offset : offset + size]))
+            offset += size
+        return messages, offset
+
+    @staticmethod
+    def _decode(stream: _Stream, chunk: memoryview) -> UaMessage:
+        """Decode a chunk, knowing whether it starts its message."""
+        message = decode_message(chunk, first_chunk=False)
+        request = (message.secure_channel_id, message.request_id)
+        if request not in stream.open_requests:
+            message = decode_message(chunk)
+            if message.request_id < 0:
+                # Encrypted: its next chunks cannot be told apart
+                return message
+        if message.chunk_type == 'C':
+            stream.open_requests.add(request)
+        else:
+            stream.open_requests.discard(request)
+        return message